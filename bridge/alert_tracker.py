@@ -0,0 +1,161 @@
+"""
+Cold Chain Digital Twin - Alert Tracker
+Turns per-reading anomaly detections into incident events, so an asset that
+sits above threshold for an hour produces a handful of alert records
+instead of one per reading.
+
+Each (asset_id, anomaly type) has at most one open incident. Events:
+  OPEN        first reading with the anomaly
+  ESCALATE    severity rose
+  DEESCALATE  severity fell and stayed lower for clear_seconds, so a reading
+              flapping around a severity boundary is reported once
+  ONGOING     reminder while the incident stays open, every reminder_seconds
+              (0 = no reminders)
+  RESOLVE     the anomaly has been absent for clear_seconds, or the asset
+              has sent nothing for the sweep's stale_seconds (sweep());
+              still_open lists the asset's other open incidents, most
+              severe first, for consumers keeping one alert per asset
+
+Everything else is suppressed and counted on the incident. The table holds
+one small slotted entry per open incident. update() runs on the bridge
+workers and sweep() on the poller, so both take the tracker's lock; the
+bridge shards assets over several trackers to keep it uncontended.
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+SEVERITY_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+
+
+class Incident:
+    __slots__ = ("incident_id", "asset_type", "anomaly", "opened_at", "last_seen", "severity_seen_at",
+                 "last_emitted", "peak_value", "suppressed")
+
+    def __init__(self, incident_id: str, anomaly: dict, now: float, asset_type: Optional[str] = None):
+        self.incident_id = incident_id
+        self.asset_type = asset_type
+        self.anomaly = anomaly
+        self.opened_at = now
+        self.last_seen = now
+        self.severity_seen_at = now
+        self.last_emitted = now
+        self.peak_value = anomaly.get("value")
+        self.suppressed = 0
+
+
+class AlertTracker:
+    """Open incidents per (asset_id, anomaly type)"""
+
+    def __init__(self, clear_seconds: float = 60.0, reminder_seconds: float = 900.0):
+        self.clear_seconds = clear_seconds
+        self.reminder_seconds = reminder_seconds
+        self._open = {}  # asset_id -> {anomaly type: Incident}
+        self._lock = threading.Lock()
+        self.emitted = 0
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(incidents) for incidents in self._open.values())
+
+    def update(self, asset_id: str, anomalies: List[dict], now: float,
+               asset_type: Optional[str] = None) -> List[dict]:
+        """Fold one reading's anomalies into the table; return the events to publish."""
+        with self._lock:
+            return self._update(asset_id, anomalies, now, asset_type)
+
+    def sweep(self, now: float, stale_seconds: Optional[float] = None) -> List[Tuple[str, Optional[str], dict]]:
+        """Resolve incidents of assets that have sent nothing for stale_seconds
+        (default clear_seconds); returns (asset_id, asset_type, event) tuples."""
+        stale_seconds = self.clear_seconds if stale_seconds is None else stale_seconds
+        resolved = []
+        with self._lock:
+            for asset_id, incidents in list(self._open.items()):
+                for anomaly_type, incident in list(incidents.items()):
+                    if now - incident.last_seen >= stale_seconds:
+                        del incidents[anomaly_type]
+                        resolved.append((asset_id, incident.asset_type,
+                                         self._event("RESOLVE", incident, now, stale=True,
+                                                     still_open=self._still_open(incidents))))
+                if not incidents:
+                    del self._open[asset_id]
+            self.emitted += len(resolved)
+        return resolved
+
+    def _update(self, asset_id: str, anomalies: List[dict], now: float, asset_type: Optional[str]) -> List[dict]:
+        incidents = self._open.get(asset_id)
+        if not anomalies and not incidents:
+            return []
+        if incidents is None:
+            incidents = self._open[asset_id] = {}
+
+        events = []
+        for anomaly in anomalies:
+            event = self._observe(asset_id, incidents, anomaly, now, asset_type)
+            if event:
+                events.append(event)
+
+        present = {anomaly["type"] for anomaly in anomalies}
+        for anomaly_type, incident in list(incidents.items()):
+            if anomaly_type not in present and now - incident.last_seen >= self.clear_seconds:
+                del incidents[anomaly_type]
+                events.append(self._event("RESOLVE", incident, now, still_open=self._still_open(incidents)))
+        if not incidents:
+            del self._open[asset_id]
+
+        self.emitted += len(events)
+        return events
+
+    def _observe(self, asset_id: str, incidents: dict, anomaly: dict, now: float,
+                 asset_type: Optional[str]) -> Optional[dict]:
+        incident = incidents.get(anomaly["type"])
+        if incident is None:
+            incident = Incident(f"{asset_id}-{anomaly['type']}-{now:.3f}", anomaly, now, asset_type)
+            incidents[anomaly["type"]] = incident
+            return self._event("OPEN", incident, now)
+
+        incident.last_seen = now
+        value = anomaly.get("value")
+        if value is not None and (incident.peak_value is None or value > incident.peak_value):
+            incident.peak_value = value
+
+        rank = SEVERITY_RANK.get(anomaly.get("severity"), 0)
+        current = SEVERITY_RANK.get(incident.anomaly.get("severity"), 0)
+        if rank >= current:
+            incident.severity_seen_at = now
+        if rank > current or (rank < current and now - incident.severity_seen_at >= self.clear_seconds):
+            previous = incident.anomaly.get("severity")
+            incident.anomaly = anomaly
+            incident.severity_seen_at = now
+            return self._event("ESCALATE" if rank > current else "DEESCALATE", incident, now,
+                               previous_severity=previous)
+
+        incident.anomaly = {**anomaly, "severity": incident.anomaly.get("severity")}
+        if self.reminder_seconds and now - incident.last_emitted >= self.reminder_seconds:
+            return self._event("ONGOING", incident, now)
+
+        incident.suppressed += 1
+        self.suppressed += 1
+        return None
+
+    @staticmethod
+    def _still_open(incidents: dict) -> List[dict]:
+        ranked = sorted(incidents.values(), key=lambda i: -SEVERITY_RANK.get(i.anomaly.get("severity"), 0))
+        return [{"incident_id": i.incident_id, "anomaly": i.anomaly, "opened_at": i.opened_at,
+                 "peak_value": i.peak_value} for i in ranked]
+
+    def _event(self, event: str, incident: Incident, now: float, **extra) -> dict:
+        record = {
+            "event": event,
+            "incident_id": incident.incident_id,
+            "anomaly": incident.anomaly,
+            "opened_at": incident.opened_at,
+            "duration_s": round(now - incident.opened_at, 1),
+            "peak_value": incident.peak_value,
+            "suppressed": incident.suppressed,
+            **extra,
+        }
+        incident.last_emitted = now
+        incident.suppressed = 0
+        return record
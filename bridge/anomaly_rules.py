@@ -0,0 +1,148 @@
+"""
+Cold Chain Digital Twin - Anomaly Rules
+Edge anomaly checks for the bridge, driven by the same YAML profile as the
+state engine (thresholds, asset_defaults, asset_assignments).
+
+The profile is compiled once into a table of rule closures: one closure per
+threshold type with its limits bound in, and a dict from asset ID (falling
+back to asset type) to closure. Checking a reading is one dict lookup plus a
+few comparisons; anomaly dicts are only built for readings that breach.
+
+A reading above temp_warning is a MEDIUM TEMP_BREACH, above temp_critical a
+HIGH one, matching the state engine's WARNING / CRITICAL. A door open while
+the compressor runs is a LOW DOOR_OPEN.
+
+The compiled table is swapped in whole when the profile file's mtime
+changes (reload_if_changed), so workers never see a half-built table.
+"""
+
+import os
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+NO_ANOMALIES = ()
+
+ASSET_LABELS = {"refrigerated_truck": "Truck", "cold_room": "Room"}
+
+# Fallback when the profile or pyyaml is unavailable: the state engine's defaults
+DEFAULT_PROFILE = {
+    "thresholds": {
+        "frozen_goods": {"temp_warning": -10.0, "temp_critical": -5.0},
+        "chilled_goods": {"temp_warning": 4.0, "temp_critical": 8.0},
+        "pharma": {"temp_warning": 2.0, "temp_critical": 5.0},
+    },
+    "asset_defaults": {"refrigerated_truck": "frozen_goods", "cold_room": "chilled_goods"},
+    "asset_assignments": {},
+}
+
+
+def compile_rule(threshold_type: str, warning: float, critical: float) -> Callable:
+    """Rule closure for one threshold type: payload -> anomalies."""
+
+    def check(payload: dict):
+        temp = payload.get("temperature_c")
+        door = payload.get("door_open") and payload.get("compressor_running")
+        if (temp is None or temp <= warning) and not door:
+            return NO_ANOMALIES
+
+        anomalies = []
+        if temp is not None and temp > warning:
+            limit = critical if temp > critical else warning
+            label = ASSET_LABELS.get(payload.get("asset_type"), "Asset")
+            anomalies.append({
+                "type": "TEMP_BREACH",
+                "severity": "HIGH" if temp > critical else "MEDIUM",
+                "message": f"{label} temp {temp}°C exceeds {threshold_type} limit {limit}°C",
+                "value": temp
+            })
+        if door:
+            anomalies.append({
+                "type": "DOOR_OPEN",
+                "severity": "LOW",
+                "message": "Door open while compressor running"
+            })
+        return anomalies
+
+    return check
+
+
+class RuleTable:
+    """One compiled profile; replaced as a whole, never rebound field by field"""
+    __slots__ = ("by_asset", "by_type", "fallback")
+
+    def __init__(self, by_asset: dict, by_type: dict, fallback: Callable):
+        self.by_asset = by_asset
+        self.by_type = by_type
+        self.fallback = fallback
+
+
+class AnomalyRules:
+    """Per-asset rule table compiled from the active profile"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._table = None
+        self.reload_if_changed()
+
+    def _read_profile(self) -> dict:
+        try:
+            import yaml
+            with open(self.path) as f:
+                return yaml.safe_load(f) or {}
+        except ImportError:
+            logger.warning("pyyaml not installed, using default anomaly thresholds")
+        except OSError:
+            logger.warning(f"Profile not found at {self.path}, using default anomaly thresholds")
+        except Exception as e:
+            logger.error(f"Failed to load profile for anomaly rules: {e}")
+        return DEFAULT_PROFILE
+
+    def reload_if_changed(self) -> bool:
+        """Recompile if the profile file changed since the last load."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and self._table is not None:
+            return False
+        self._mtime = mtime
+        self._compile(self._read_profile())
+        return True
+
+    def _compile(self, profile: dict):
+        thresholds = profile.get("thresholds", {}) or {}
+        rules = {
+            threshold_type: compile_rule(threshold_type,
+                                         float(values.get("temp_warning", -10.0)),
+                                         float(values.get("temp_critical", -5.0)))
+            for threshold_type, values in thresholds.items()
+        }
+        fallback = rules.get("frozen_goods") or compile_rule("frozen_goods", -10.0, -5.0)
+
+        assignments = profile.get("asset_assignments", {}) or {}
+        defaults = profile.get("asset_defaults", {}) or {}
+        by_asset = {asset_id: rules.get(threshold_type, fallback)
+                    for asset_id, threshold_type in assignments.items()}
+        by_type = {asset_type: rules.get(threshold_type, fallback)
+                   for asset_type, threshold_type in defaults.items()}
+
+        # One assignment swaps the whole table; a worker mid-lookup keeps the old one
+        self._table = RuleTable(by_asset, by_type, fallback)
+        logger.info(f"Anomaly rules compiled from profile '{profile.get('name', 'unknown')}': "
+                    f"{len(rules)} threshold types, {len(by_asset)} asset assignments")
+
+    def rule_for(self, asset_id: str, asset_type: Optional[str]) -> Callable:
+        table = self._table
+        rule = table.by_asset.get(asset_id)
+        if rule is None:
+            # Memoize the type default in the table it came from, so the next
+            # reading is a single lookup and a newer table is never touched
+            rule = table.by_asset[asset_id] = table.by_type.get(asset_type, table.fallback)
+        return rule
+
+    def check(self, asset_id: str, payload: dict):
+        """Anomalies for one reading (an empty tuple when there are none)."""
+        return self.rule_for(asset_id, payload.get("asset_type"))(payload)
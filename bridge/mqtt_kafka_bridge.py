@@ -1,28 +1,123 @@
 """
 Cold Chain Digital Twin - MQTT to Kafka Bridge
 Subscribes to MQTT topics and produces to Kafka
+
+Pipeline:
+  paho network thread  -> on_message only enqueues (topic, bytes)
+  BRIDGE_WORKERS queues -> bounded; a topic always hashes to the same
+                           worker so per-asset order is kept
+  worker threads       -> decode, anomaly checks, producer.produce()
+  poller thread        -> producer.poll() for delivery reports, stats
+  replay thread        -> drains the disk spool back into Kafka
+
+Scaling out: with MQTT_SHARE_GROUP set, the bridge subscribes over MQTT 5
+as $share/<group>/<topic>, so N replicas split the telemetry between them
+instead of each producing every message. The broker hands out shared
+messages per message, so two readings of one asset can reach different
+replicas; gateway bundles keep a site's readings together, and the state
+engine ignores readings older than the asset's current state. Replicas
+publish their rate on coldchain/bridge/stats/<replica> and each logs its
+share of the group's traffic.
+
+Backpressure is explicit: a full worker queue blocks the MQTT thread for
+up to ENQUEUE_TIMEOUT seconds and then drops the message. Queue depth,
+drops and spool state are logged every STATS_INTERVAL seconds.
+
+Kafka outages: when librdkafka's local queue is full, all brokers are down
+or a delivery fails, records are diverted to an mmap disk spool under
+SPOOL_DIR (see spool.py) instead of being dropped. While the spool holds a
+backlog, new records are appended behind it, and the replay thread feeds it
+back to Kafka at SPOOL_REPLAY_RATE records/s, so spooled telemetry goes out
+ahead of live traffic and in its original order. The replay rate must exceed
+the live rate for the backlog to drain; replay lag is the age of the oldest
+spooled record. Without SPOOL_DIR a full librdkafka queue stalls the worker
+until deliveries drain.
 """
 
 import os
 import json
+import time
+import queue
+import socket
 import logging
+import threading
 from datetime import datetime, timezone
+from typing import Optional
 
 import paho.mqtt.client as mqtt
-from confluent_kafka import Producer
+from confluent_kafka import KafkaError, KafkaException, Producer
+
+from alert_tracker import AlertTracker
+from anomaly_rules import AnomalyRules
+from spool import Spool
+
+from telemetry_codec import (
+    CONTENT_TYPE_BINARY, CONTENT_TYPE_HEADER, CONTENT_TYPE_JSON,
+    HEADER_ASSET_ID, HEADER_INGESTED_AT, HEADER_MQTT_TOPIC,
+    decode, encode, is_binary,
+)
 
 # Configuration
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 
+# Shared subscription group (MQTT 5); empty = plain subscriptions, run a single replica
+MQTT_SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP", "")
+REPLICA_ID = os.getenv("HOSTNAME") or socket.gethostname()
+
+TELEMETRY_TOPICS = ("fleet/+/telemetry", "warehouse/+/room/+/telemetry", "gateway/+/+/telemetry")
+STATS_TOPIC = "coldchain/bridge/stats"
+
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
 KAFKA_TOPIC_TRUCKS = os.getenv("KAFKA_TOPIC_TRUCKS", "coldchain.telemetry.trucks")
 KAFKA_TOPIC_ROOMS = os.getenv("KAFKA_TOPIC_ROOMS", "coldchain.telemetry.rooms")
 KAFKA_TOPIC_ALERTS = os.getenv("KAFKA_TOPIC_ALERTS", "coldchain.alerts")
 
-# Anomaly thresholds
-TEMP_THRESHOLD_FROZEN = -10.0
-TEMP_THRESHOLD_CHILLED = 8.0
+# Kafka value format for telemetry records: "json" or "binary" (see telemetry_codec.py).
+# Incoming MQTT payloads may be either; binary ones are recognised by their magic byte.
+KAFKA_FORMAT = os.getenv("KAFKA_FORMAT", "json")
+
+# Pass-through: forward the original MQTT bytes untouched, with mqtt_topic,
+# ingest time and the routing key in Kafka headers instead of the payload
+BRIDGE_PASSTHROUGH = os.getenv("BRIDGE_PASSTHROUGH", "false").lower() == "true"
+
+# Parse payloads for anomaly alerts (the only reason pass-through mode parses at all)
+ANOMALY_CHECKS = os.getenv("ANOMALY_CHECKS", "true").lower() == "true"
+
+# Seconds between throughput log lines (MQTT messages vs per-asset records)
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", 30))
+
+# Worker pool: bounded queue per worker; how long on_message may block before dropping (0 = never block)
+BRIDGE_WORKERS = int(os.getenv("BRIDGE_WORKERS", 4))
+BRIDGE_QUEUE_SIZE = int(os.getenv("BRIDGE_QUEUE_SIZE", 10000))
+ENQUEUE_TIMEOUT = float(os.getenv("ENQUEUE_TIMEOUT", 1.0))
+
+# Producer batching
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", 20))
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", 262144))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "lz4")
+
+# Disk spool for Kafka outages (empty SPOOL_DIR = no spool); replay rate in records/s
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/app/spool")
+SPOOL_SEGMENT_MB = int(os.getenv("SPOOL_SEGMENT_MB", 16))
+SPOOL_MAX_MB = int(os.getenv("SPOOL_MAX_MB", 1024))
+SPOOL_REPLAY_RATE = float(os.getenv("SPOOL_REPLAY_RATE", 5000))
+SPOOL_PROBE_INTERVAL = float(os.getenv("SPOOL_PROBE_INTERVAL", 5))
+
+# Alert suppression: one incident per asset and anomaly type, reported as
+# OPEN / ESCALATE / DEESCALATE / ONGOING / RESOLVE events (see alert_tracker.py)
+ALERT_SUPPRESSION = os.getenv("ALERT_SUPPRESSION", "true").lower() == "true"
+ALERT_CLEAR_SECONDS = float(os.getenv("ALERT_CLEAR_SECONDS", 60))
+ALERT_REMINDER_SECONDS = float(os.getenv("ALERT_REMINDER_SECONDS", 900))
+# Incidents of an asset that has sent nothing for this long are resolved by
+# the poller; kept above the sensors' 60s report-by-exception heartbeat so a
+# quiet asset that is still out of range is not resolved and reopened
+ALERT_STALE_SECONDS = float(os.getenv("ALERT_STALE_SECONDS", 180))
+ALERT_SWEEP_INTERVAL = float(os.getenv("ALERT_SWEEP_INTERVAL", 10))
+
+# Anomaly thresholds come from the same profile as the state engine, recompiled on change
+PROFILE_PATH = os.getenv("PROFILE_PATH", "/app/config/active.yaml")
+PROFILE_CHECK_INTERVAL = float(os.getenv("PROFILE_CHECK_INTERVAL", 10))
 
 # Logging
 logging.basicConfig(
@@ -31,111 +126,381 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Set while Kafka is reachable; cleared on all-brokers-down or a failed delivery
+kafka_up = threading.Event()
+kafka_up.set()
+
+
+def error_callback(err):
+    if err.code() == KafkaError._ALL_BROKERS_DOWN:
+        if kafka_up.is_set():
+            logger.error("All Kafka brokers down, spooling records to disk")
+        kafka_up.clear()
+    else:
+        logger.warning(f"Kafka error: {err}")
+
+
 # Kafka Producer
 producer = Producer({
     'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
     'client.id': 'mqtt-kafka-bridge',
     'acks': 'all',
+    'linger.ms': KAFKA_LINGER_MS,
+    'batch.size': KAFKA_BATCH_SIZE,
+    'compression.type': KAFKA_COMPRESSION,
+    'error_cb': error_callback,
 })
 
+spool = Spool(SPOOL_DIR, SPOOL_SEGMENT_MB * 1024 * 1024, SPOOL_MAX_MB * 1024 * 1024) if SPOOL_DIR else None
+
+work_queues = [queue.Queue(maxsize=BRIDGE_QUEUE_SIZE) for _ in range(BRIDGE_WORKERS)]
+
+anomaly_rules = AnomalyRules(PROFILE_PATH)
+# One tracker per worker, picked by asset, so worker updates rarely share a lock
+alert_trackers = [AlertTracker(ALERT_CLEAR_SECONDS, ALERT_REMINDER_SECONDS)
+                  for _ in range(BRIDGE_WORKERS)] if ALERT_SUPPRESSION else None
+
+mqtt_client = None
+
+# Latest msg/s reported by each replica in the share group: replica -> (rate, received_at)
+replica_rates = {}
+
+# Running totals, updated from the MQTT thread and the workers
+counters = {"messages": 0, "bundles": 0, "records": 0, "dropped": 0, "producer_stalls": 0,
+            "spooled": 0, "replayed": 0}
+counters_lock = threading.Lock()
+
+
+def count(name: str, n: int = 1):
+    with counters_lock:
+        counters[name] += n
+
+
+def produce(**kwargs):
+    """producer.produce(), or the spool while Kafka is down or the spool has a backlog.
+
+    Without a spool, waits on delivery reports while librdkafka's queue is full.
+    """
+    while True:
+        if spool is not None and (not kafka_up.is_set() or len(spool)):
+            spool_record(kwargs['topic'], kwargs['key'], kwargs['value'], kwargs['headers'])
+            return
+        try:
+            producer.produce(**kwargs)
+            return
+        except BufferError:
+            count("producer_stalls")
+            if spool is not None:
+                spool_record(kwargs['topic'], kwargs['key'], kwargs['value'], kwargs['headers'])
+                return
+            producer.poll(0.1)
+
+
+def spool_record(topic: str, key, value: bytes, headers: list):
+    try:
+        spool.append(topic, key, value, headers)
+        count("spooled")
+    except Exception as e:
+        # Also runs from delivery_callback: an error here must not reach producer.poll
+        logger.error(f"Cannot spool record for {topic}: {e}")
+        count("dropped")
+
 
 def delivery_callback(err, msg):
     if err:
-        logger.error(f"Kafka delivery failed: {err}")
-
-
-def detect_anomalies(payload: dict) -> list:
-    anomalies = []
-    temp = payload.get("temperature_c")
-    door_open = payload.get("door_open", False)
-    asset_type = payload.get("asset_type")
-
-    if asset_type == "refrigerated_truck" and temp is not None:
-        if temp > TEMP_THRESHOLD_FROZEN:
-            anomalies.append({
-                "type": "TEMP_BREACH",
-                "severity": "HIGH" if temp > 0 else "MEDIUM",
-                "message": f"Truck temp {temp}°C exceeds {TEMP_THRESHOLD_FROZEN}°C",
-                "value": temp
-            })
-
-    elif asset_type == "cold_room" and temp is not None:
-        if temp > TEMP_THRESHOLD_CHILLED:
-            anomalies.append({
-                "type": "TEMP_BREACH",
-                "severity": "HIGH" if temp > 15 else "MEDIUM",
-                "message": f"Room temp {temp}°C exceeds {TEMP_THRESHOLD_CHILLED}°C",
-                "value": temp
-            })
-
-    if door_open and payload.get("compressor_running"):
-        anomalies.append({
-            "type": "DOOR_OPEN",
-            "severity": "LOW",
-            "message": "Door open while compressor running"
-        })
-
-    return anomalies
+        if spool is None:
+            logger.error(f"Kafka delivery failed: {err}")
+            return
+        logger.error(f"Kafka delivery failed, spooling: {err}")
+        kafka_up.clear()
+        spool_record(msg.topic(), msg.key(), msg.value(), msg.headers() or [])
+
+
+def subscription(topic: str) -> str:
+    return f"$share/{MQTT_SHARE_GROUP}/{topic}" if MQTT_SHARE_GROUP else topic
 
 
 def on_connect(client, userdata, flags, rc, properties=None):
     if rc == 0:
         logger.info(f"Connected to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}")
-        client.subscribe("fleet/+/telemetry")
-        client.subscribe("warehouse/+/room/+/telemetry")
-        logger.info("Subscribed to telemetry topics")
+        for topic in TELEMETRY_TOPICS:
+            client.subscribe(subscription(topic), qos=1)
+        if MQTT_SHARE_GROUP:
+            client.subscribe(f"{STATS_TOPIC}/+")
+            logger.info(f"Subscribed to telemetry topics in share group '{MQTT_SHARE_GROUP}' as {REPLICA_ID}")
+        else:
+            logger.info("Subscribed to telemetry topics")
     else:
         logger.error(f"MQTT connection failed: {rc}")
 
 
-def on_message(client, userdata, msg):
-    try:
-        topic = msg.topic
-        payload = json.loads(msg.payload.decode('utf-8'))
-
-        payload['mqtt_topic'] = topic
-        payload['ingested_at'] = datetime.now(timezone.utc).isoformat() + 'Z'
-
-        # Route to Kafka topic
-        if topic.startswith("fleet/"):
-            kafka_topic = KAFKA_TOPIC_TRUCKS
-            key = payload.get("truck_id", "unknown")
-        elif topic.startswith("warehouse/"):
-            kafka_topic = KAFKA_TOPIC_ROOMS
-            key = payload.get("sensor_id", "unknown")
-        else:
-            return
+def route_for_topic(topic: str):
+    """(kafka_topic, key) for a per-asset MQTT topic, without parsing the payload.
 
-        # Send to Kafka
-        producer.produce(
-            topic=kafka_topic,
+    Keys match the payload IDs: truck_id for trucks, sensor_id for rooms.
+    """
+    parts = topic.split("/")
+    if topic.startswith("fleet/") and len(parts) >= 3:
+        return KAFKA_TOPIC_TRUCKS, parts[1]
+    if topic.startswith("warehouse/") and len(parts) >= 5:
+        return KAFKA_TOPIC_ROOMS, f"sensor-room-{parts[1]}-{parts[3]}"
+    return None
+
+
+def metadata_headers(content_type: str, topic: str, key: str, ingested_at: str) -> list:
+    return [
+        (CONTENT_TYPE_HEADER, content_type),
+        (HEADER_MQTT_TOPIC, topic),
+        (HEADER_INGESTED_AT, ingested_at),
+        (HEADER_ASSET_ID, key),
+    ]
+
+
+def forward_raw(topic: str, data: bytes) -> bool:
+    """Pass-through: produce the original MQTT bytes, metadata in headers only."""
+    route = route_for_topic(topic)
+    if route is None:
+        return False
+    kafka_topic, key = route
+    content_type = CONTENT_TYPE_BINARY if is_binary(data) else CONTENT_TYPE_JSON
+    ingested_at = datetime.now(timezone.utc).isoformat() + 'Z'
+
+    produce(
+        topic=kafka_topic,
+        key=key.encode('utf-8'),
+        value=data,
+        headers=metadata_headers(content_type, topic, key, ingested_at),
+        callback=delivery_callback
+    )
+
+    if ANOMALY_CHECKS:
+        raise_alerts(key, decode(data, content_type))
+    return True
+
+
+def forward_reading(topic: str, payload: dict) -> bool:
+    """Produce one per-asset reading to Kafka and raise any anomaly alerts."""
+    ingested_at = datetime.now(timezone.utc).isoformat() + 'Z'
+    payload['mqtt_topic'] = topic
+    payload['ingested_at'] = ingested_at
+
+    # Route to Kafka topic
+    if topic.startswith("fleet/"):
+        kafka_topic = KAFKA_TOPIC_TRUCKS
+        key = payload.get("truck_id", "unknown")
+    elif topic.startswith("warehouse/"):
+        kafka_topic = KAFKA_TOPIC_ROOMS
+        key = payload.get("sensor_id", "unknown")
+    else:
+        return False
+
+    # Send to Kafka
+    value, content_type = encode(payload, binary=KAFKA_FORMAT == "binary")
+    produce(
+        topic=kafka_topic,
+        key=key.encode('utf-8'),
+        value=value,
+        headers=metadata_headers(content_type, topic, key, ingested_at),
+        callback=delivery_callback
+    )
+
+    if ANOMALY_CHECKS:
+        raise_alerts(key, payload)
+    return True
+
+
+def raise_alerts(key: str, payload: dict):
+    """Produce alert records for a reading's anomalies.
+
+    With ALERT_SUPPRESSION, only incident events (open, severity change,
+    reminder, resolve) are produced rather than one alert per reading.
+    """
+    anomalies = anomaly_rules.check(key, payload)
+    if alert_trackers is None:
+        events = [{"anomaly": anomaly} for anomaly in anomalies]
+    else:
+        tracker = alert_trackers[hash(key) % len(alert_trackers)]
+        events = tracker.update(key, anomalies, time.time(), payload.get("asset_type"))
+    publish_alerts(key, payload.get("asset_type"), events)
+
+
+def publish_alerts(key: str, asset_type: Optional[str], events: list):
+    for event in events:
+        anomaly = event["anomaly"]
+        if event.get("event") == "RESOLVE":
+            anomaly = {**anomaly, "message": f"{anomaly['type']} resolved after {event['duration_s']:.0f}s"}
+        if "opened_at" in event:
+            event = {**event, "opened_at": datetime.fromtimestamp(event["opened_at"], timezone.utc).isoformat()}
+        if event.get("still_open"):
+            event["still_open"] = [
+                {**other, "opened_at": datetime.fromtimestamp(other["opened_at"], timezone.utc).isoformat()}
+                for other in event["still_open"]
+            ]
+        alert = {
+            "alert_id": f"{key}-{anomaly['type']}-{datetime.now(timezone.utc).timestamp()}",
+            "asset_id": key,
+            "asset_type": asset_type,
+            **event,
+            "anomaly": anomaly,
+            "detected_at": datetime.now(timezone.utc).isoformat() + 'Z'
+        }
+        produce(
+            topic=KAFKA_TOPIC_ALERTS,
             key=key.encode('utf-8'),
-            value=json.dumps(payload).encode('utf-8'),
+            value=json.dumps(alert).encode('utf-8'),
+            headers=[(CONTENT_TYPE_HEADER, CONTENT_TYPE_JSON)],
             callback=delivery_callback
         )
+        logger.warning(f"Alert: {event.get('event', 'RAISED')} {anomaly['type']} "
+                       f"({anomaly.get('severity')}) for {key}")
 
-        # Check for anomalies
-        anomalies = detect_anomalies(payload)
-        for anomaly in anomalies:
-            alert = {
-                "alert_id": f"{key}-{anomaly['type']}-{datetime.now(timezone.utc).timestamp()}",
-                "asset_id": key,
-                "asset_type": payload.get("asset_type"),
-                "anomaly": anomaly,
-                "detected_at": datetime.now(timezone.utc).isoformat() + 'Z'
-            }
-            producer.produce(
-                topic=KAFKA_TOPIC_ALERTS,
-                key=key.encode('utf-8'),
-                value=json.dumps(alert).encode('utf-8'),
-                callback=delivery_callback
-            )
-            logger.warning(f"Alert: {anomaly['type']} for {key}")
-
-        producer.poll(0)
 
-    except Exception as e:
-        logger.error(f"Error processing message: {e}")
+def log_stats(previous: dict, since: float) -> dict:
+    """Log throughput and backpressure since the previous snapshot; return the new one."""
+    with counters_lock:
+        snapshot = dict(counters)
+    elapsed = max(time.time() - since, 1e-9)
+    delta = {name: snapshot[name] - previous.get(name, 0) for name in snapshot}
+    depths = [q.qsize() for q in work_queues]
+    rate = delta['messages'] / elapsed
+
+    logger.info(
+        f"Throughput: {rate:.1f} MQTT msg/s "
+        f"({delta['bundles']} gateway bundles), {delta['records'] / elapsed:.1f} records/s | "
+        f"queue depth {sum(depths)} (max {max(depths)}/{BRIDGE_QUEUE_SIZE}), "
+        f"dropped {delta['dropped']}, producer stalls {delta['producer_stalls']}, "
+        f"kafka queue {len(producer)}"
+    )
+    if alert_trackers is not None:
+        logger.info(f"Alerts: {sum(t.emitted for t in alert_trackers)} incident events, "
+                    f"{sum(t.suppressed for t in alert_trackers)} suppressed, "
+                    f"{sum(len(t) for t in alert_trackers)} open incidents")
+    if spool is not None:
+        logger.info(
+            f"Spool: {len(spool)} records ({spool.pending_bytes() / 1e6:.1f} MB), "
+            f"replay lag {spool.oldest_age():.1f}s, spooled {delta['spooled']}, "
+            f"replayed {delta['replayed']}, discarded {spool.dropped} | "
+            f"kafka {'up' if kafka_up.is_set() else 'down'}"
+        )
+    if MQTT_SHARE_GROUP:
+        log_share(rate)
+    return snapshot
+
+
+def log_share(rate: float):
+    """Publish this replica's rate and log its share of the group's traffic."""
+    mqtt_client.publish(f"{STATS_TOPIC}/{REPLICA_ID}", json.dumps({"replica": REPLICA_ID, "msg_per_s": rate}))
+
+    now = time.time()
+    rates = {replica: r for replica, (r, at) in list(replica_rates.items())
+             if now - at < 3 * STATS_INTERVAL}
+    rates[REPLICA_ID] = rate
+    total = sum(rates.values())
+    share = rate / total if total else 0.0
+    logger.info(f"Share group '{MQTT_SHARE_GROUP}': {REPLICA_ID} handled {share:.0%} "
+                f"of {total:.1f} msg/s across {len(rates)} replicas")
+
+
+def on_stats(msg):
+    try:
+        report = json.loads(msg.payload)
+        replica_rates[report["replica"]] = (float(report["msg_per_s"]), time.time())
+    except (ValueError, KeyError) as e:
+        logger.error(f"Invalid bridge stats message: {e}")
+
+
+def handle_message(topic: str, data: bytes) -> int:
+    """Decode one MQTT message and produce its records. Returns the record count."""
+    if topic.startswith("gateway/"):
+        # Gateway bundle: split back into per-asset records
+        count("bundles")
+        return sum(forward_reading(reading["topic"], reading["payload"])
+                   for reading in decode(data).get("readings", []))
+    if BRIDGE_PASSTHROUGH:
+        return int(forward_raw(topic, data))
+    return int(forward_reading(topic, decode(data)))
+
+
+def worker(index: int):
+    """Drain one work queue."""
+    work = work_queues[index]
+    while True:
+        topic, data = work.get()
+        try:
+            count("records", handle_message(topic, data))
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+        finally:
+            work.task_done()
+
+
+def poll_loop():
+    """Serve delivery callbacks, log stats, resolve incidents of silent assets
+    and pick up profile changes."""
+    snapshot, since = {}, time.time()
+    profile_checked = swept = since
+    while True:
+        producer.poll(0.5)
+        if time.time() - since >= STATS_INTERVAL:
+            snapshot, since = log_stats(snapshot, since), time.time()
+        if alert_trackers is not None and time.time() - swept >= ALERT_SWEEP_INTERVAL:
+            swept = time.time()
+            for tracker in alert_trackers:
+                for key, asset_type, event in tracker.sweep(swept, ALERT_STALE_SECONDS):
+                    publish_alerts(key, asset_type, [event])
+        if ANOMALY_CHECKS and time.time() - profile_checked >= PROFILE_CHECK_INTERVAL:
+            anomaly_rules.reload_if_changed()
+            profile_checked = time.time()
+
+
+def replay_loop():
+    """Feed spooled records back to Kafka at SPOOL_REPLAY_RATE records/s."""
+    tick = 0.1
+    batch = max(1, int(SPOOL_REPLAY_RATE * tick))
+    while True:
+        if not len(spool):
+            time.sleep(tick)
+            continue
+
+        if not kafka_up.is_set():
+            try:
+                producer.list_topics(timeout=SPOOL_PROBE_INTERVAL)
+            except KafkaException:
+                time.sleep(SPOOL_PROBE_INTERVAL)
+                continue
+            logger.info(f"Kafka reachable, replaying {len(spool)} spooled records")
+            kafka_up.set()
+
+        started = time.time()
+        records, cursor = spool.peek(batch)
+        for record in records:
+            while True:
+                try:
+                    producer.produce(topic=record.topic, key=record.key, value=record.value,
+                                     headers=record.headers, callback=delivery_callback)
+                    break
+                except BufferError:
+                    producer.poll(0.1)
+        spool.commit(cursor)
+        count("replayed", len(records))
+        time.sleep(max(tick * len(records) / batch - (time.time() - started), 0))
+
+
+def on_message(client, userdata, msg):
+    """Runs on the paho network thread: hand off and return."""
+    if msg.topic.startswith(STATS_TOPIC + "/"):
+        on_stats(msg)
+        return
+
+    count("messages")
+    work = work_queues[hash(msg.topic) % BRIDGE_WORKERS]
+    try:
+        if ENQUEUE_TIMEOUT > 0:
+            work.put((msg.topic, msg.payload), timeout=ENQUEUE_TIMEOUT)
+        else:
+            work.put_nowait((msg.topic, msg.payload))
+    except queue.Full:
+        count("dropped")
 
 
 def main():
@@ -144,8 +509,24 @@ def main():
     logger.info("=" * 60)
     logger.info(f"MQTT: {MQTT_BROKER}:{MQTT_PORT}")
     logger.info(f"Kafka: {KAFKA_BOOTSTRAP_SERVERS}")
+    logger.info(f"Workers: {BRIDGE_WORKERS} x queue {BRIDGE_QUEUE_SIZE}, "
+                f"linger.ms={KAFKA_LINGER_MS}, batch.size={KAFKA_BATCH_SIZE}, compression={KAFKA_COMPRESSION}")
+
+    for index in range(BRIDGE_WORKERS):
+        threading.Thread(target=worker, args=(index,), name=f"bridge-worker-{index}", daemon=True).start()
+    threading.Thread(target=poll_loop, name="bridge-poller", daemon=True).start()
+    if spool is not None:
+        logger.info(f"Spool: {SPOOL_DIR} ({len(spool)} pending records), "
+                    f"max {SPOOL_MAX_MB} MB, replay {SPOOL_REPLAY_RATE:.0f} records/s")
+        threading.Thread(target=replay_loop, name="bridge-replay", daemon=True).start()
 
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    global mqtt_client
+    if MQTT_SHARE_GROUP:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                             client_id=f"mqtt-kafka-bridge-{REPLICA_ID}", protocol=mqtt.MQTTv5)
+    else:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    mqtt_client = client
     client.on_connect = on_connect
     client.on_message = on_message
 
@@ -155,8 +536,12 @@ def main():
     except KeyboardInterrupt:
         logger.info("Shutting down...")
     finally:
-        producer.flush()
         client.disconnect()
+        for work in work_queues:
+            work.join()
+        producer.flush()
+        if spool is not None:
+            spool.close()
 
 
 if __name__ == "__main__":
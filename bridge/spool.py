@@ -0,0 +1,244 @@
+"""
+Cold Chain Digital Twin - Bridge Spool
+Append-only, memory-mapped disk spool for Kafka records the bridge cannot
+deliver right now (Kafka unreachable, or librdkafka's local queue full).
+
+Records go into fixed-size segment files (spool-00000001.log, ...) that are
+pre-allocated and memory-mapped, so an append is a memory copy and at most
+two segments (the one being written and the one being replayed) are mapped
+at a time: memory stays bounded however large the backlog grows. A zero
+length word marks the end of the written data in a segment.
+
+The replay cursor (segment, offset) is persisted to `cursor` on every
+commit and fully replayed segments are deleted. Delivery is at-least-once:
+a crash between producing a replayed batch and committing it replays the
+batch again. Disk use is capped at max_bytes by discarding the oldest
+segment (counted in `dropped`).
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+# total length u32 | spooled_at f64 | topic len u16 | key len u16 | value len u32 | headers len u16
+_RECORD = struct.Struct("<IdHHIH")
+_LENGTH = struct.Struct("<I")
+
+
+class SpoolRecord(NamedTuple):
+    topic: str
+    key: Optional[bytes]
+    value: bytes
+    headers: list
+    spooled_at: float
+
+
+class Spool:
+    """Segmented mmap spool with a persisted replay cursor"""
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._maps = {}
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments = sorted(
+            int(name[6:14]) for name in os.listdir(directory)
+            if name.startswith("spool-") and name.endswith(".log")
+        ) or [1]
+        self._ends = {}
+        for seq in self._segments:
+            self._ends[seq] = self._scan_end(self._map(seq))
+            self._close_maps(keep=())
+
+        self._read_seq, self._read_offset = self._load_cursor()
+        self._write_seq = self._segments[-1]
+        self._records = sum(
+            self._count(seq, self._read_offset if seq == self._read_seq else 0)
+            for seq in self._segments
+        )
+
+    # -------------------------------------------------------------------------
+    # Files
+    # -------------------------------------------------------------------------
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"spool-{seq:08d}.log")
+
+    def _map(self, seq: int) -> mmap.mmap:
+        if seq not in self._maps:
+            with open(self._path(seq), "a+b") as f:
+                if os.fstat(f.fileno()).st_size < self.segment_bytes:
+                    f.truncate(self.segment_bytes)
+                self._maps[seq] = mmap.mmap(f.fileno(), self.segment_bytes)
+        return self._maps[seq]
+
+    def _close_maps(self, keep: tuple):
+        for seq in [s for s in self._maps if s not in keep]:
+            self._maps.pop(seq).close()
+
+    def _scan_end(self, m: mmap.mmap) -> int:
+        offset = 0
+        while offset + _LENGTH.size <= self.segment_bytes:
+            (length,) = _LENGTH.unpack_from(m, offset)
+            if length == 0:
+                break
+            offset += length
+        return offset
+
+    def _count(self, seq: int, offset: int) -> int:
+        opened = seq not in self._maps
+        m, records = self._map(seq), 0
+        while offset < self._ends[seq]:
+            offset += _LENGTH.unpack_from(m, offset)[0]
+            records += 1
+        if opened:
+            self._maps.pop(seq).close()
+        return records
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, "cursor")) as f:
+                seq, offset = json.load(f)
+            if seq in self._segments and offset <= self._ends[seq]:
+                return seq, offset
+        except (OSError, ValueError):
+            pass
+        return self._segments[0], 0
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, "cursor")
+        with open(path + ".tmp", "w") as f:
+            json.dump([self._read_seq, self._read_offset], f)
+        os.replace(path + ".tmp", path)
+
+    def _delete_oldest(self):
+        seq = self._segments.pop(0)
+        if seq in self._maps:
+            self._maps.pop(seq).close()
+        os.remove(self._path(seq))
+        del self._ends[seq]
+        return seq
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    def append(self, topic: str, key: Optional[bytes], value: bytes, headers: Optional[list] = None):
+        """Append one Kafka record."""
+        topic_b = topic.encode("utf-8")
+        key_b = key or b""
+        headers_b = json.dumps([
+            [k, v.decode("utf-8") if isinstance(v, bytes) else v] for k, v in headers or ()
+        ]).encode("utf-8")
+        total = _RECORD.size + len(topic_b) + len(key_b) + len(value) + len(headers_b)
+        if total + _LENGTH.size > self.segment_bytes:
+            raise ValueError(f"Record of {total} bytes exceeds spool segment size")
+
+        with self._lock:
+            offset = self._ends[self._write_seq]
+            if offset + total + _LENGTH.size > self.segment_bytes:
+                self._roll()
+                offset = 0
+
+            # Body first, header last: a record only becomes visible to a
+            # restart scan once its length word is written
+            m = self._map(self._write_seq)
+            position = offset + _RECORD.size
+            for part in (topic_b, key_b, value, headers_b):
+                m[position:position + len(part)] = part
+                position += len(part)
+            _RECORD.pack_into(m, offset, total, time.time(), len(topic_b), len(key_b), len(value), len(headers_b))
+            self._ends[self._write_seq] = position
+            self._records += 1
+
+    def _roll(self):
+        """Start a new write segment, discarding the oldest if the spool is full."""
+        if self._write_seq != self._read_seq:
+            # Not mapped yet after a restart, which unmaps every segment
+            m = self._maps.pop(self._write_seq, None)
+            if m is not None:
+                m.close()
+        self._write_seq += 1
+        self._segments.append(self._write_seq)
+        self._ends[self._write_seq] = 0
+
+        while len(self._segments) > self.max_segments:
+            lost = self._count(self._segments[0], self._read_offset if self._segments[0] == self._read_seq else 0)
+            self._delete_oldest()
+            self.dropped += lost
+            self._records -= lost
+            self._read_seq, self._read_offset = self._segments[0], 0
+            self._save_cursor()
+
+    # -------------------------------------------------------------------------
+    # Replay
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._records
+
+    def pending_bytes(self) -> int:
+        with self._lock:
+            return sum(self._ends[seq] for seq in self._segments) - self._read_offset
+
+    def oldest_age(self) -> float:
+        """Seconds since the oldest unreplayed record was spooled (the replay lag)."""
+        with self._lock:
+            if not self._records:
+                return 0.0
+            self._skip_finished_segment()
+            spooled_at = _RECORD.unpack_from(self._map(self._read_seq), self._read_offset)[1]
+            return max(time.time() - spooled_at, 0.0)
+
+    def _skip_finished_segment(self):
+        while self._read_offset >= self._ends[self._read_seq] and self._read_seq != self._write_seq:
+            self._delete_oldest()
+            self._read_seq, self._read_offset = self._segments[0], 0
+            self._save_cursor()
+
+    def peek(self, max_records: int) -> Tuple[List[SpoolRecord], tuple]:
+        """Up to max_records from the replay cursor, and the cursor to commit after them."""
+        with self._lock:
+            self._skip_finished_segment()
+            m, offset, end = self._map(self._read_seq), self._read_offset, self._ends[self._read_seq]
+            records = []
+            while offset < end and len(records) < max_records:
+                total, spooled_at, topic_len, key_len, value_len, headers_len = _RECORD.unpack_from(m, offset)
+                position = offset + _RECORD.size
+                topic = m[position:position + topic_len].decode("utf-8")
+                position += topic_len
+                key = m[position:position + key_len] or None
+                position += key_len
+                value = m[position:position + value_len]
+                position += value_len
+                headers = [tuple(h) for h in json.loads(m[position:position + headers_len])]
+                records.append(SpoolRecord(topic, key, value, headers, spooled_at))
+                offset += total
+            return records, (self._read_seq, offset, len(records))
+
+    def commit(self, cursor: tuple):
+        """Mark the records returned by peek() as replayed."""
+        seq, offset, count = cursor
+        with self._lock:
+            if seq != self._read_seq:
+                return  # segment was discarded by _roll() meanwhile
+            self._read_offset = offset
+            self._records -= count
+            self._save_cursor()
+            if self._read_seq != self._write_seq:
+                self._close_maps(keep=(self._write_seq, self._read_seq))
+
+    def close(self):
+        with self._lock:
+            for m in self._maps.values():
+                m.flush()
+            self._close_maps(keep=())
@@ -0,0 +1,318 @@
+"""
+Cold Chain Digital Twin - Telemetry Codec
+Compact binary encoding for ColdRoomTelemetry / TruckTelemetry payloads,
+with JSON as the fallback.
+
+Shared by the simulator, bridge, ingestion consumer and state engine. Each
+service is its own Docker build context, so every service directory carries
+an identical copy of this file. bridge/ holds the one to edit: copy it over
+the others, since bridge/tests/test_telemetry_codec_copies.py and the deploy
+script's image build fail while any copy differs.
+
+Format negotiation:
+  - Kafka: the "content-type" header (application/json or
+    application/x-coldchain-telemetry). The bridge also sets mqtt_topic,
+    ingested_at and asset_id headers; decode_message() folds the first two
+    back into the payload so consumers see the same dict in every mode.
+  - MQTT (3.1.1 has no message properties): binary payloads start with
+    MAGIC, which can never open a JSON document.
+
+Binary layout (little endian):
+  header   magic u8 | version u8 | schema u8 (1 = cold room, 2 = truck)
+  room     timestamp i64 µs | temp i16 (x100) | humidity i16 (x10) |
+           flags u8 | power_status u8 | compressor_cycle_count u32
+  truck    timestamp i64 µs | temp i16 (x100) | humidity i16 (x10) |
+           flags u8 | latitude i32 (x1e6) | longitude i32 (x1e6) | speed i16 (x10)
+  strings  room: sensor_id, site_id, room_id / truck: sensor_id, truck_id, fleet_id
+           (u8 length + utf-8)
+  extras   u8 count, then (u8 key length + key, u16 value length + value)
+           for extra string fields such as mqtt_topic and ingested_at
+
+Scaled integers match the simulator's rounding (2 dp temperature, 1 dp
+humidity and speed, 6 dp coordinates), so decoded values equal the JSON
+ones. Payloads that don't fit (unknown non-string fields, out-of-range
+values, non-UTC timestamps) are sent as JSON instead.
+
+Run `python telemetry_codec.py` for a bytes-per-message and CPU benchmark.
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+CONTENT_TYPE_HEADER = "content-type"
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_BINARY = "application/x-coldchain-telemetry"
+
+# Bridge metadata headers (the payload itself is forwarded untouched in pass-through mode)
+HEADER_MQTT_TOPIC = "mqtt_topic"
+HEADER_INGESTED_AT = "ingested_at"
+HEADER_ASSET_ID = "asset_id"
+METADATA_HEADERS = (HEADER_MQTT_TOPIC, HEADER_INGESTED_AT)
+
+MAGIC = 0xCB
+VERSION = 1
+SCHEMA_ROOM = 1
+SCHEMA_TRUCK = 2
+
+POWER_STATUSES = ("normal", "brownout", "backup", "outage")
+
+_HEADER = struct.Struct("<BBB")
+_ROOM = struct.Struct("<qhhBBI")
+_TRUCK = struct.Struct("<qhhBiih")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+
+_ROOM_STRINGS = ("sensor_id", "site_id", "room_id")
+_TRUCK_STRINGS = ("sensor_id", "truck_id", "fleet_id")
+_ROOM_FIELDS = frozenset(_ROOM_STRINGS + (
+    "asset_type", "timestamp", "temperature_c", "humidity_pct", "door_open",
+    "compressor_running", "compressor_cycle_count", "power_status"))
+_TRUCK_FIELDS = frozenset(_TRUCK_STRINGS + (
+    "asset_type", "timestamp", "temperature_c", "humidity_pct", "door_open",
+    "compressor_running", "latitude", "longitude", "speed_kmh", "engine_running"))
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_UTC_SUFFIX = "+00:00"
+
+
+class _Unencodable(Exception):
+    """Payload does not fit the binary schema; send it as JSON."""
+
+
+# =============================================================================
+# Encoding
+# =============================================================================
+
+def encode(payload: dict, binary: bool = True) -> Tuple[bytes, str]:
+    """Encode a telemetry payload. Returns (data, content_type).
+
+    With binary=False, or when the payload doesn't fit a binary schema,
+    the payload is encoded as JSON.
+    """
+    if binary:
+        try:
+            return _encode_binary(payload), CONTENT_TYPE_BINARY
+        except _Unencodable:
+            pass
+    return json.dumps(payload).encode("utf-8"), CONTENT_TYPE_JSON
+
+
+def _encode_binary(payload: dict) -> bytes:
+    asset_type = payload.get("asset_type")
+    try:
+        if asset_type == "cold_room":
+            known, strings = _ROOM_FIELDS, _ROOM_STRINGS
+            body = _HEADER.pack(MAGIC, VERSION, SCHEMA_ROOM) + _ROOM.pack(
+                _timestamp_us(payload["timestamp"]),
+                _scaled(payload["temperature_c"], 100),
+                _scaled(payload["humidity_pct"], 10),
+                payload["door_open"] | payload["compressor_running"] << 1,
+                POWER_STATUSES.index(payload["power_status"]),
+                payload["compressor_cycle_count"],
+            )
+        elif asset_type == "refrigerated_truck":
+            known, strings = _TRUCK_FIELDS, _TRUCK_STRINGS
+            body = _HEADER.pack(MAGIC, VERSION, SCHEMA_TRUCK) + _TRUCK.pack(
+                _timestamp_us(payload["timestamp"]),
+                _scaled(payload["temperature_c"], 100),
+                _scaled(payload["humidity_pct"], 10),
+                payload["door_open"] | payload["compressor_running"] << 1 | payload["engine_running"] << 2,
+                _scaled(payload["latitude"], 1_000_000),
+                _scaled(payload["longitude"], 1_000_000),
+                _scaled(payload["speed_kmh"], 10),
+            )
+        else:
+            raise _Unencodable(asset_type)
+
+        parts = [body]
+        for field in strings:
+            parts.append(_short_string(payload[field]))
+
+        extras = [(k, v) for k, v in payload.items() if k not in known]
+        if len(extras) > 255 or any(not isinstance(v, str) for _, v in extras):
+            raise _Unencodable("extra fields")
+        parts.append(_U8.pack(len(extras)))
+        for key, value in extras:
+            data = value.encode("utf-8")
+            parts.append(_short_string(key) + _U16.pack(len(data)) + data)
+        return b"".join(parts)
+
+    except (KeyError, TypeError, ValueError, struct.error) as e:
+        raise _Unencodable(str(e))
+
+
+def _scaled(value: float, scale: int) -> int:
+    return round(value * scale)
+
+
+def _timestamp_us(timestamp: str) -> int:
+    # Only UTC timestamps round-trip exactly through isoformat()
+    if not timestamp.endswith(_UTC_SUFFIX):
+        raise _Unencodable(timestamp)
+    return (datetime.fromisoformat(timestamp) - _EPOCH) // _MICROSECOND
+
+
+def _short_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _U8.pack(len(data)) + data
+
+
+# =============================================================================
+# Decoding
+# =============================================================================
+
+def is_binary(data: bytes) -> bool:
+    return len(data) >= _HEADER.size and data[0] == MAGIC
+
+
+def content_type_of(headers) -> Optional[str]:
+    """Content type from Kafka message headers (list of (key, bytes)), if set."""
+    return header_dict(headers).get(CONTENT_TYPE_HEADER)
+
+
+def header_dict(headers) -> dict:
+    """Kafka message headers (list of (key, bytes)) as a dict of strings."""
+    return {key: value.decode("utf-8") for key, value in headers or () if value is not None}
+
+
+def decode_message(value: bytes, headers) -> dict:
+    """Decode a Kafka record value, filling bridge metadata from its headers.
+
+    Fields already in the payload win, so records written before
+    pass-through mode existed decode the same way.
+    """
+    meta = header_dict(headers)
+    payload = decode(value, meta.get(CONTENT_TYPE_HEADER))
+    for key in METADATA_HEADERS:
+        if key in meta:
+            payload.setdefault(key, meta[key])
+    return payload
+
+
+def decode(data: bytes, content_type: Optional[str] = None) -> dict:
+    """Decode a payload encoded by encode() or plain JSON.
+
+    Without a content type, the MAGIC byte decides. Raises ValueError
+    (json.JSONDecodeError for bad JSON) on malformed input.
+    """
+    if content_type == CONTENT_TYPE_BINARY or (content_type is None and is_binary(data)):
+        try:
+            return _decode_binary(data)
+        except (IndexError, UnicodeDecodeError, struct.error) as e:
+            raise ValueError(f"Invalid binary telemetry: {e}")
+    return json.loads(data.decode("utf-8"))
+
+
+def _decode_binary(data: bytes) -> dict:
+    magic, version, schema = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported binary telemetry version {magic:#x}/{version}")
+    offset = _HEADER.size
+
+    if schema == SCHEMA_ROOM:
+        ts, temp, humidity, flags, power, cycles = _ROOM.unpack_from(data, offset)
+        offset += _ROOM.size
+        (sensor_id, site_id, room_id), offset = _read_strings(data, offset, 3)
+        payload = {
+            "sensor_id": sensor_id,
+            "site_id": site_id,
+            "room_id": room_id,
+            "asset_type": "cold_room",
+            "timestamp": _iso(ts),
+            "temperature_c": temp / 100,
+            "humidity_pct": humidity / 10,
+            "door_open": bool(flags & 1),
+            "compressor_running": bool(flags & 2),
+            "compressor_cycle_count": cycles,
+            "power_status": POWER_STATUSES[power],
+        }
+    elif schema == SCHEMA_TRUCK:
+        ts, temp, humidity, flags, lat, lon, speed = _TRUCK.unpack_from(data, offset)
+        offset += _TRUCK.size
+        (sensor_id, truck_id, fleet_id), offset = _read_strings(data, offset, 3)
+        payload = {
+            "sensor_id": sensor_id,
+            "truck_id": truck_id,
+            "fleet_id": fleet_id,
+            "asset_type": "refrigerated_truck",
+            "timestamp": _iso(ts),
+            "temperature_c": temp / 100,
+            "humidity_pct": humidity / 10,
+            "door_open": bool(flags & 1),
+            "compressor_running": bool(flags & 2),
+            "latitude": lat / 1_000_000,
+            "longitude": lon / 1_000_000,
+            "speed_kmh": speed / 10,
+            "engine_running": bool(flags & 4),
+        }
+    else:
+        raise ValueError(f"Unknown telemetry schema {schema}")
+
+    (count,) = _U8.unpack_from(data, offset)
+    offset += 1
+    for _ in range(count):
+        (key,), offset = _read_strings(data, offset, 1)
+        (length,) = _U16.unpack_from(data, offset)
+        offset += 2
+        payload[key] = data[offset:offset + length].decode("utf-8")
+        offset += length
+    return payload
+
+
+def _read_strings(data: bytes, offset: int, count: int) -> Tuple[list, int]:
+    values = []
+    for _ in range(count):
+        length = data[offset]
+        values.append(data[offset + 1:offset + 1 + length].decode("utf-8"))
+        offset += 1 + length
+    return values, offset
+
+
+def _iso(timestamp_us: int) -> str:
+    return (_EPOCH + timedelta(microseconds=timestamp_us)).isoformat()
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def _benchmark(iterations: int = 20000):
+    import timeit
+
+    now = datetime.now(timezone.utc).isoformat()
+    samples = {
+        "cold_room": {
+            "sensor_id": "sensor-room-site1-room1", "site_id": "site1", "room_id": "room1",
+            "asset_type": "cold_room", "timestamp": now, "temperature_c": -18.42,
+            "humidity_pct": 61.3, "door_open": False, "compressor_running": True,
+            "compressor_cycle_count": 1742, "power_status": "normal",
+        },
+        "refrigerated_truck": {
+            "sensor_id": "sensor-truck-truck01", "truck_id": "truck01", "fleet_id": "fleet1",
+            "asset_type": "refrigerated_truck", "timestamp": now, "temperature_c": -15.07,
+            "humidity_pct": 72.8, "door_open": False, "compressor_running": True,
+            "latitude": 34.420831, "longitude": -119.698189, "speed_kmh": 87.5,
+            "engine_running": True,
+        },
+    }
+    # As forwarded by the bridge
+    for payload in list(samples.values()):
+        samples[payload["asset_type"] + " (bridged)"] = dict(
+            payload, mqtt_topic="fleet/truck01/telemetry", ingested_at=now)
+
+    print(f"{'payload':<30} {'format':<7} {'bytes':>6} {'encode µs':>10} {'decode µs':>10}")
+    for name, payload in samples.items():
+        for binary in (False, True):
+            data, content_type = encode(payload, binary)
+            assert decode(data, content_type) == payload
+            enc = timeit.timeit(lambda: encode(payload, binary), number=iterations) / iterations
+            dec = timeit.timeit(lambda: decode(data, content_type), number=iterations) / iterations
+            label = "binary" if content_type == CONTENT_TYPE_BINARY else "json"
+            print(f"{name:<30} {label:<7} {len(data):>6} {enc * 1e6:>10.2f} {dec * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from alert_tracker import AlertTracker  # noqa: E402
+
+
+def breach(severity: str, value: float) -> list:
+    return [{"type": "TEMP_BREACH", "severity": severity, "value": value}]
+
+
+def test_severity_drop_is_reported_as_deescalate():
+    tracker = AlertTracker(clear_seconds=60, reminder_seconds=0)
+    assert [e["event"] for e in tracker.update("room1", breach("MEDIUM", 9.0), 0)] == ["OPEN"]
+    escalated = tracker.update("room1", breach("HIGH", 14.0), 10)
+    assert [(e["event"], e["previous_severity"]) for e in escalated] == [("ESCALATE", "MEDIUM")]
+
+    # Held while the lower severity has not lasted clear_seconds
+    assert tracker.update("room1", breach("MEDIUM", 9.0), 20) == []
+    dropped = tracker.update("room1", breach("MEDIUM", 9.0), 70)
+    assert [(e["event"], e["previous_severity"], e["anomaly"]["severity"]) for e in dropped] \
+        == [("DEESCALATE", "HIGH", "MEDIUM")]
+
+
+def test_resolve_lists_incidents_still_open_on_the_asset():
+    tracker = AlertTracker(clear_seconds=60, reminder_seconds=0)
+    tracker.update("room1", breach("HIGH", 14.0), 0)
+    tracker.update("room1", breach("HIGH", 14.0) + [{"type": "DOOR_OPEN", "severity": "MEDIUM"}], 5)
+
+    resolved = tracker.update("room1", breach("HIGH", 14.0), 70)
+    assert [(e["event"], e["anomaly"]["type"]) for e in resolved] == [("RESOLVE", "DOOR_OPEN")]
+    assert [other["anomaly"]["type"] for other in resolved[0]["still_open"]] == ["TEMP_BREACH"]
+
+    (_, _, stale), = tracker.sweep(500, stale_seconds=180)
+    assert stale["still_open"] == []
@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from spool import Spool  # noqa: E402
+
+TOPIC, KEY, SEGMENT = "coldchain.telemetry.trucks", b"truck01", 4096
+
+
+def test_roll_right_after_reopen(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=SEGMENT, max_bytes=1024 * 1024)
+    # Fill until the current write segment has no room for one more record,
+    # with replay sitting in an older segment
+    appended = 0
+    while True:
+        spool.append(TOPIC, KEY, b"x" * 100, [])
+        appended += 1
+        seq = spool._write_seq
+        if seq > 1 and spool._ends[seq] + (spool._ends[seq] // spool._count(seq, 0)) + 4 > SEGMENT:
+            break
+    records, cursor = spool.peek(10)
+    spool.commit(cursor)
+
+    reopened = Spool(str(tmp_path), segment_bytes=SEGMENT, max_bytes=1024 * 1024)
+    reopened.append(TOPIC, KEY, b"y" * 100, [])
+    assert reopened._write_seq == seq + 1
+
+    values = []
+    while len(reopened):
+        records, cursor = reopened.peek(100)
+        values.extend(r.value for r in records)
+        reopened.commit(cursor)
+    assert values == [b"x" * 100] * (appended - 10) + [b"y" * 100]
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+CANONICAL = os.path.join(ROOT, "bridge", "telemetry_codec.py")
+
+
+@pytest.mark.parametrize("service", ["ingestion", "sensors", "state-engine"])
+def test_service_copy_matches_bridge(service):
+    copy = os.path.join(ROOT, service, "telemetry_codec.py")
+    with open(CANONICAL, "rb") as f, open(copy, "rb") as g:
+        assert g.read() == f.read(), f"{service}/telemetry_codec.py differs from bridge/; copy bridge's over it"
@@ -0,0 +1,197 @@
+"""
+Cold Chain Digital Twin - Telemetry Cold Archive
+Moves raw telemetry older than the hot horizon out of MongoDB into Parquet
+files, so MongoDB's working set stays the last few days of readings.
+
+  python archive_telemetry.py             # archive everything older than the horizon
+  python archive_telemetry.py --dry-run   # only report what would be archived
+
+Layout under ARCHIVE_URI (a local path or s3://bucket/prefix), one directory
+per UTC day and asset:
+  telemetry/date=YYYY-MM-DD/asset_id=<asset_id>/part-<first _id>.parquet
+
+Rows are sorted by created_at and written in row groups of
+ARCHIVE_ROW_GROUP_ROWS, so a reader skips row groups by their created_at
+min/max statistics and reads only the columns it asks for. Fields outside
+ARCHIVE_SCHEMA are kept as a JSON string in `extra`.
+
+A partition is written first and deleted from MongoDB after, in batches of
+--delete-batch _ids. The file name comes from the partition's first _id, so
+a rerun after a crash before the deletes rewrites the same file instead of
+adding a duplicate; a crash part-way through the deletes can leave the
+remaining readings in two files. The state engine reads these files for the
+part of a history window older than ARCHIVE_HORIZON_HOURS; keep the
+horizon below TELEMETRY_TTL_SECONDS (or set the TTL to 0) so readings are
+archived before MongoDB expires them.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from datetime import datetime, timezone, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+from pymongo import MongoClient
+
+from telemetry_collection import TELEMETRY_COLLECTION, META_FIELD
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
+MONGO_DB = os.getenv("MONGO_DB", "coldchain")
+
+ARCHIVE_URI = os.getenv("ARCHIVE_URI", "")
+# Readings older than this many hours leave MongoDB
+ARCHIVE_HORIZON_HOURS = int(os.getenv("ARCHIVE_HORIZON_HOURS", 72))
+ARCHIVE_ROW_GROUP_ROWS = int(os.getenv("ARCHIVE_ROW_GROUP_ROWS", 4096))
+
+UNKNOWN_ASSET = "_unknown"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("asset_id", pa.string()),
+    ("asset_type", pa.string()),
+    ("created_at", pa.timestamp("ms", tz="UTC")),
+    ("timestamp", pa.string()),
+    ("truck_id", pa.string()),
+    ("sensor_id", pa.string()),
+    ("temperature_c", pa.float64()),
+    ("humidity_pct", pa.float64()),
+    ("door_open", pa.bool_()),
+    ("compressor_running", pa.bool_()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("speed_kmh", pa.float64()),
+    ("extra", pa.string()),
+])
+
+
+def to_table(docs: list) -> pa.Table:
+    """Parquet table for telemetry docs; unknown fields go to `extra` as JSON."""
+    columns = {name: [] for name in ARCHIVE_SCHEMA.names}
+    for doc in docs:
+        extra = {k: v for k, v in doc.items()
+                 if k not in columns and k not in ("_id", META_FIELD)}
+        for name in ARCHIVE_SCHEMA.names:
+            columns[name].append(doc.get(name))
+        columns["extra"][-1] = json.dumps(extra, default=str) if extra else None
+    return pa.table(columns, schema=ARCHIVE_SCHEMA)
+
+
+def partition_dir(root: str, day: datetime, asset_id: str) -> str:
+    return f"{root}/telemetry/date={day:%Y-%m-%d}/asset_id={asset_id or UNKNOWN_ASSET}"
+
+
+def write_partition(fs, root: str, day: datetime, asset_id: str, docs: list) -> str:
+    directory = partition_dir(root, day, asset_id)
+    fs.create_dir(directory, recursive=True)
+    path = f"{directory}/part-{docs[0]['_id']}.parquet"
+    tmp = f"{path}.tmp"
+    pq.write_table(to_table(docs), tmp, filesystem=fs,
+                   row_group_size=ARCHIVE_ROW_GROUP_ROWS, compression="zstd")
+    fs.move(tmp, path)
+    return path
+
+
+def delete_archived(collection, ids: list, batch_size: int) -> int:
+    deleted = 0
+    for i in range(0, len(ids), batch_size):
+        deleted += collection.delete_many({"_id": {"$in": ids[i:i + batch_size]}}).deleted_count
+    return deleted
+
+
+def _day_partitions(collection, window: dict):
+    """(asset_id, docs) per asset for one day, docs sorted by created_at.
+
+    Readings written before ingestion stored asset_id (see
+    backfill_asset_id.py) are grouped by truck_id / sensor_id instead, and
+    the ones with neither go to the UNKNOWN_ASSET partition.
+    """
+    for asset_id in collection.distinct("asset_id", {"created_at": window}):
+        if asset_id is None:
+            continue
+        docs = list(collection.find({"asset_id": asset_id, "created_at": window})
+                    .sort([("created_at", 1), ("_id", 1)]))
+        if docs:
+            yield asset_id, docs
+
+    legacy = {}
+    for doc in collection.find({"asset_id": None, "created_at": window}).sort([("created_at", 1), ("_id", 1)]):
+        doc["asset_id"] = doc.get("truck_id") or doc.get("sensor_id")
+        legacy.setdefault(doc["asset_id"], []).append(doc)
+    for asset_id, docs in legacy.items():
+        yield asset_id, docs
+
+
+def archive(db, fs, root: str, horizon: datetime, delete_batch: int, dry_run: bool = False):
+    """Archive and delete telemetry older than horizon, oldest day first."""
+    collection = db[TELEMETRY_COLLECTION]
+    archived = files = 0
+    start = time.time()
+    floor = None
+
+    while True:
+        bounds = {"$lt": horizon} if floor is None else {"$gte": floor, "$lt": horizon}
+        oldest = collection.find_one({"created_at": bounds}, {"created_at": 1}, sort=[("created_at", 1)])
+        if not oldest:
+            break
+        day = oldest["created_at"].replace(tzinfo=timezone.utc, hour=0, minute=0, second=0, microsecond=0)
+        window = {"$gte": day, "$lt": min(day + timedelta(days=1), horizon)}
+        day_count = 0
+
+        for asset_id, docs in _day_partitions(collection, window):
+            if dry_run:
+                logger.info(f"would archive {len(docs)} readings to {partition_dir(root, day, asset_id)}")
+            else:
+                path = write_partition(fs, root, day, asset_id, docs)
+                delete_archived(collection, [d["_id"] for d in docs], delete_batch)
+                logger.debug(f"{path}: {len(docs)} readings")
+            day_count += len(docs)
+            files += 1
+
+        archived += day_count
+        logger.info(f"{day:%Y-%m-%d}: {day_count} readings archived ({time.time() - start:.0f}s)")
+        if dry_run:
+            break
+        # Never revisit a day: whatever is left of it could not be archived
+        floor = day + timedelta(days=1)
+
+    if not dry_run:
+        db.migrations.update_one(
+            {"_id": "archive:telemetry"},
+            {"$set": {"horizon": horizon, "updated_at": datetime.now(timezone.utc)},
+             "$inc": {"archived": archived, "files": files}},
+            upsert=True
+        )
+    logger.info(f"Archive done: {archived} readings in {files} files, horizon {horizon.isoformat()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move aged telemetry from MongoDB to Parquet")
+    parser.add_argument("--uri", default=ARCHIVE_URI, help="archive root, local path or s3://bucket/prefix")
+    parser.add_argument("--horizon-hours", type=int, default=ARCHIVE_HORIZON_HOURS)
+    parser.add_argument("--delete-batch", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="only report the oldest day to archive")
+    args = parser.parse_args()
+    if not args.uri:
+        parser.error("set ARCHIVE_URI or --uri")
+
+    filesystem, root = pafs.FileSystem.from_uri(args.uri)
+    horizon = datetime.now(timezone.utc) - timedelta(hours=args.horizon_hours)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    try:
+        archive(client[MONGO_DB], filesystem, root.rstrip("/"), horizon, args.delete_batch, args.dry_run)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
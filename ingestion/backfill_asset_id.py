@@ -0,0 +1,123 @@
+"""
+Cold Chain Digital Twin - asset_id Backfill
+Sets the canonical asset_id (truck_id or sensor_id) on telemetry documents
+written before ingestion stored it, then checks the history queries.
+
+  python backfill_asset_id.py             # indexes + backfill, resumable
+  python backfill_asset_id.py --explain   # only check index use and latency
+
+The backfill walks the _id index in chunks of --batch-size and runs one
+update_many per chunk, so each write touches a bounded _id range instead of
+scanning the collection for missing fields; the last finished _id is
+checkpointed in the `migrations` collection. Time-series collections are
+skipped: migrate_telemetry.py sets asset_id while copying into them.
+Alerts already carry asset_id from the bridge.
+"""
+
+import os
+import time
+import logging
+import argparse
+import statistics
+from datetime import datetime, timezone, timedelta
+
+from pymongo import MongoClient
+
+from mongo_indexes import ensure_indexes
+from telemetry_collection import TELEMETRY_COLLECTION, is_timeseries
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
+MONGO_DB = os.getenv("MONGO_DB", "coldchain")
+
+COLLECTIONS = (TELEMETRY_COLLECTION, "telemetry_legacy")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def backfill(db, name: str, batch_size: int):
+    collection = db[name]
+    checkpoint_id = f"asset_id:{name}"
+    checkpoint = db.migrations.find_one({"_id": checkpoint_id}) or {}
+    last_id, updated = checkpoint.get("last_id"), checkpoint.get("updated", 0)
+    start = time.time()
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        chunk = list(collection.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size))
+        if not chunk:
+            break
+        upper = chunk[-1]["_id"]
+        bounds = {"$lte": upper} if last_id is None else {"$gt": last_id, "$lte": upper}
+        result = collection.update_many(
+            {"_id": bounds, "asset_id": {"$exists": False}},
+            [{"$set": {"asset_id": {"$ifNull": ["$truck_id", "$sensor_id"]}}}]
+        )
+        last_id, updated = upper, updated + result.modified_count
+        db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "updated": updated, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        logger.info(f"{name}: {updated} documents updated ({time.time() - start:.0f}s)")
+
+    logger.info(f"{name}: backfill done, {updated} documents updated")
+
+
+def explain(db, name: str, hours: int, runs: int):
+    """Winning plan and median latency of the history query for a few assets."""
+    collection = db[name]
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    for asset_id in [a for a in collection.distinct("asset_id") if a][:5]:
+        query = {"asset_id": asset_id, "created_at": {"$gte": since}}
+        plan = collection.find(query).sort("created_at", -1).limit(1000).explain()
+        stats = plan.get("executionStats", {})
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            list(collection.find(query, {"_id": 0}).sort("created_at", -1).limit(1000))
+            timings.append((time.perf_counter() - started) * 1000)
+        logger.info(f"{name} {asset_id}: {' -> '.join(plan_stages(plan['queryPlanner']['winningPlan']))}, "
+                    f"{stats.get('nReturned', '?')} returned / {stats.get('totalDocsExamined', '?')} examined, "
+                    f"median {statistics.median(timings):.1f} ms")
+
+
+def plan_stages(plan: dict) -> list:
+    """Stage names from the top of a winning plan down (IXSCAN = index used, COLLSCAN = not)."""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage") or plan.get("queryPlan", {}).get("stage", "?"))
+        plan = plan.get("inputStage") or plan.get("queryPlan", {}).get("inputStage")
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill canonical asset_id on telemetry")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--explain", action="store_true", help="only report index use and latency")
+    parser.add_argument("--hours", type=int, default=24, help="range for the query check")
+    parser.add_argument("--runs", type=int, default=20, help="repetitions per latency measurement")
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    db = client[MONGO_DB]
+    try:
+        names = [name for name in COLLECTIONS if name in db.list_collection_names()]
+        if not args.explain:
+            ensure_indexes(db)
+            for name in names:
+                if is_timeseries(db, name):
+                    logger.info(f"{name}: time-series collection, skipped")
+                else:
+                    backfill(db, name, args.batch_size)
+        for name in names:
+            explain(db, name, args.hours, args.runs)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
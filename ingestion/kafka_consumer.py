@@ -1,16 +1,40 @@
 """
 Cold Chain Digital Twin - Kafka to MongoDB Consumer
 Consumes telemetry from Kafka and stores in MongoDB
+
+Messages are consumed in micro-batches of up to INGEST_BATCH_SIZE (or
+whatever arrived within INGEST_BATCH_TIMEOUT seconds) and split across
+INGEST_WORKERS threads by message key (the asset id), so each asset's
+readings are written in order by one worker while workers write in
+parallel. Each worker batch costs at most three round trips: an unordered
+insert_many of raw telemetry, one of alerts, and one unordered bulk_write
+of asset upserts coalesced to the last reading per asset.
+
+Offsets are committed per partition up to the lowest offset not yet
+written (offset_tracker.py), so a crash or MongoDB outage replays in-flight
+readings rather than losing them (at-least-once).
+`python kafka_consumer.py --benchmark` measures msg/s at a few batch sizes
+and worker counts against MONGO_URI.
 """
 
 import os
-import json
+import sys
+import time
+import queue
 import logging
+import threading
 from datetime import datetime, timezone
 
-from confluent_kafka import Consumer, KafkaException
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from confluent_kafka import Consumer, KafkaException, TopicPartition
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+
+from telemetry_codec import decode_message
+from mongo_indexes import ensure_indexes
+from offset_tracker import OffsetTracker
+from rollups import RollupBuilder
+from telemetry_collection import TELEMETRY_TIMESERIES, ensure_telemetry_collection, telemetry_meta
 
 # Configuration
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
@@ -20,6 +44,29 @@ KAFKA_TOPICS = os.getenv("KAFKA_TOPICS", "coldchain.telemetry.trucks,coldchain.t
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
 MONGO_DB = os.getenv("MONGO_DB", "coldchain")
 
+# Stamp created_at from the reading's own timestamp instead of ingest time.
+# Used when backfilling history from the simulator's virtual-time mode.
+USE_EVENT_TIME = os.getenv("USE_EVENT_TIME", "false").lower() == "true"
+
+# Micro-batching: max messages per batch, seconds to wait for a batch to fill
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+INGEST_BATCH_TIMEOUT = float(os.getenv("INGEST_BATCH_TIMEOUT", 0.5))
+
+# Writer threads (messages hash to one by key) and batches each may have queued
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+INGEST_QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", 4))
+
+# Maintain 1-minute / 1-hour rollups (rollups.py) alongside raw telemetry
+INGEST_ROLLUPS = os.getenv("INGEST_ROLLUPS", "true").lower() == "true"
+
+# Seconds to wait before retrying a batch MongoDB rejected
+WRITE_RETRY_DELAY = float(os.getenv("WRITE_RETRY_DELAY", 2.0))
+
+# Seconds between throughput log lines
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", 30))
+
+DUPLICATE_KEY = 11000
+
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,60 +87,228 @@ def connect_mongodb():
         raise
 
 
-def process_telemetry(db, message: dict):
-    """Process telemetry message and update Digital Twin state"""
-    
-    # Insert raw telemetry
-    telemetry_doc = {
-        **message,
-        "created_at": datetime.now(timezone.utc)
-    }
-    db.telemetry.insert_one(telemetry_doc)
-    
-    # Update Digital Twin state (upsert current state)
+def event_time(message: dict) -> datetime:
+    """created_at for a message: its event timestamp if USE_EVENT_TIME, else now"""
+    if USE_EVENT_TIME and message.get("timestamp"):
+        try:
+            ts = datetime.fromisoformat(message["timestamp"].replace("Z", "+00:00"))
+            return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc)
+
+
+def asset_update(message: dict, created_at: datetime, count: int = 1):
+    """Digital Twin upsert for an asset's latest reading, or None if it has no ID"""
     asset_id = message.get("truck_id") or message.get("sensor_id")
-    asset_type = message.get("asset_type")
-    
-    if asset_id:
-        update_doc = {
-            "$set": {
-                "type": asset_type,
-                "current_state": {
-                    "temperature_c": message.get("temperature_c"),
-                    "humidity_pct": message.get("humidity_pct"),
-                    "door_open": message.get("door_open"),
-                    "compressor_running": message.get("compressor_running"),
-                },
-                "last_updated": datetime.now(timezone.utc),
-                "mqtt_topic": message.get("mqtt_topic")
+    if not asset_id:
+        return None
+
+    update_doc = {
+        "$set": {
+            "type": message.get("asset_type"),
+            "current_state": {
+                "temperature_c": message.get("temperature_c"),
+                "humidity_pct": message.get("humidity_pct"),
+                "door_open": message.get("door_open"),
+                "compressor_running": message.get("compressor_running"),
             },
-            "$inc": {"message_count": 1}
-        }
-        
-        # Add location for trucks
-        if message.get("latitude") and message.get("longitude"):
-            update_doc["$set"]["current_state"]["location"] = {
-                "type": "Point",
-                "coordinates": [message.get("longitude"), message.get("latitude")]
-            }
-            update_doc["$set"]["current_state"]["speed_kmh"] = message.get("speed_kmh")
-        
-        db.assets.update_one(
-            {"_id": asset_id},
-            update_doc,
-            upsert=True
-        )
-
-
-def process_alert(db, message: dict):
-    """Process alert message"""
-    alert_doc = {
-        **message,
-        "created_at": datetime.now(timezone.utc),
-        "acknowledged": False
+            "last_updated": created_at,
+            "mqtt_topic": message.get("mqtt_topic")
+        },
+        "$inc": {"message_count": count}
     }
-    db.alerts.insert_one(alert_doc)
-    logger.warning(f"Alert stored: {message.get('anomaly', {}).get('type')} for {message.get('asset_id')}")
+
+    # Add location for trucks
+    if message.get("latitude") and message.get("longitude"):
+        update_doc["$set"]["current_state"]["location"] = {
+            "type": "Point",
+            "coordinates": [message.get("longitude"), message.get("latitude")]
+        }
+        update_doc["$set"]["current_state"]["speed_kmh"] = message.get("speed_kmh")
+
+    return UpdateOne({"_id": asset_id}, update_doc, upsert=True)
+
+
+def build_batch(messages: list, rollups: RollupBuilder = None, ids: list = None, batch_id: str = None):
+    """Split decoded (topic, message) pairs into telemetry docs, alert docs, asset
+    upserts and (with a RollupBuilder) rollup upserts per rollup collection.
+
+    Telemetry docs carry the canonical asset_id (truck_id or sensor_id) that
+    the history queries filter on. Asset upserts are coalesced: one per
+    asset, carrying its last reading in the batch and a message_count
+    increment for all of them. ids, one per message, are used as the
+    telemetry / alert _ids; batch_id guards the rollup upserts (rollups.py).
+    """
+    telemetry, alerts, readings = [], [], []
+    latest = {}  # asset_id -> (message, created_at, count)
+    now = datetime.now(timezone.utc)
+
+    for i, (topic, message) in enumerate(messages):
+        if topic == "coldchain.alerts":
+            alerts.append({**message, "created_at": now, "acknowledged": False})
+            if ids:
+                alerts[-1]["_id"] = ids[i]
+            continue
+        created_at = event_time(message)
+        asset_id = message.get("truck_id") or message.get("sensor_id")
+        doc = {**message, "asset_id": asset_id, "created_at": created_at}
+        if ids:
+            doc["_id"] = ids[i]
+        if TELEMETRY_TIMESERIES:
+            doc["meta"] = telemetry_meta(message)
+        telemetry.append(doc)
+        if asset_id:
+            count = latest[asset_id][2] + 1 if asset_id in latest else 1
+            latest[asset_id] = (message, created_at, count)
+            readings.append((asset_id, created_at, message))
+
+    assets = [asset_update(message, created_at, count) for message, created_at, count in latest.values()]
+    rollup_ops = rollups.build(readings, batch_id or str(ObjectId())) if rollups is not None else {}
+    return telemetry, alerts, assets, rollup_ops
+
+
+def ignore_duplicates(write):
+    """Run an unordered write, tolerating duplicate _ids from a retried batch."""
+    try:
+        write()
+    except BulkWriteError as e:
+        if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])) \
+                or e.details.get("writeConcernErrors"):
+            raise
+
+
+def write_batch(db, batch: tuple, done: set = None):
+    """Write one build_batch() result to MongoDB. Raises if any part is not stored.
+
+    Documents get their _id on the first attempt, so retrying the same batch
+    after a partial insert only produces duplicate-key errors, which are ignored.
+    done collects the collections already written; a retry passing the same
+    set skips them, so the $inc of asset and rollup upserts is not applied
+    twice (a rollup write that failed part-way is guarded per bucket, see
+    rollups.py).
+    """
+    done = set() if done is None else done
+    telemetry, alerts, assets, rollup_ops = batch
+    if telemetry and "telemetry" not in done:
+        ignore_duplicates(lambda: db.telemetry.insert_many(telemetry, ordered=False))
+        done.add("telemetry")
+    if alerts and "alerts" not in done:
+        ignore_duplicates(lambda: db.alerts.insert_many(alerts, ordered=False))
+        done.add("alerts")
+        for alert in alerts:
+            logger.warning(f"Alert stored: {alert.get('event', 'RAISED')} {alert.get('anomaly', {}).get('type')} "
+                           f"for {alert.get('asset_id')}")
+    if assets and "assets" not in done:
+        db.assets.bulk_write(assets, ordered=False)
+        done.add("assets")
+    for collection, ops in rollup_ops.items():
+        if collection not in done:
+            ignore_duplicates(lambda: db[collection].bulk_write(ops, ordered=False))
+            done.add(collection)
+    return len(telemetry), len(alerts), len(assets)
+
+
+def write_with_retry(db, messages: list, rollups: RollupBuilder = None, ids: list = None,
+                     batch_id: str = None):
+    """write_batch() until it succeeds; MongoDB outages stall the worker, not lose data.
+
+    A message that can never be stored (BSON cannot encode it, e.g. an
+    integer over 64 bits, or MongoDB rejects the document) fails the batch
+    for good instead: the batch is then written one message at a time and
+    the messages that still fail are logged and skipped. Each message keeps
+    its _id and the batch id across these attempts, so what the failed batch
+    did write only comes back as ignored duplicate-key errors.
+    """
+    ids = ids or [ObjectId() for _ in messages]
+    batch_id = batch_id or str(ObjectId())
+    try:
+        return retry_until_stored(db, build_batch(messages, rollups, ids, batch_id))
+    except Exception as e:
+        if len(messages) == 1:
+            topic, message = messages[0]
+            logger.error(f"Skipping unwritable message from {topic}: {e} ({str(message)[:200]})")
+            return 0, 0, 0
+        logger.error(f"Batch of {len(messages)} failed ({e}), writing its messages one at a time")
+        totals = [0, 0, 0]
+        for message, _id in zip(messages, ids):
+            for i, n in enumerate(write_with_retry(db, [message], rollups, [_id], batch_id)):
+                totals[i] += n
+        return tuple(totals)
+
+
+def retry_until_stored(db, batch: tuple):
+    """write_batch() until it succeeds, retrying only errors that can pass."""
+    done = set()
+    while True:
+        try:
+            return write_batch(db, batch, done)
+        except BulkWriteError as e:
+            if not e.details.get("writeConcernErrors"):
+                raise  # the documents themselves were rejected
+            logger.error(f"Batch write failed, retrying in {WRITE_RETRY_DELAY}s: {e}")
+        except PyMongoError as e:
+            logger.error(f"Batch write failed, retrying in {WRITE_RETRY_DELAY}s: {e}")
+        time.sleep(WRITE_RETRY_DELAY)
+
+
+def worker_for(msg) -> int:
+    """Worker index for a message: by key (asset id), so an asset always lands on one worker."""
+    key = msg.key()
+    return hash(key if key is not None else msg.partition()) % INGEST_WORKERS
+
+
+def writer(db, work: queue.Queue, tracker: OffsetTracker):
+    """Write queued sub-batches and mark their offsets done."""
+    rollups = RollupBuilder() if INGEST_ROLLUPS else None
+    while True:
+        items = work.get()
+        try:
+            write_with_retry(db, [(topic, message) for _, _, topic, message in items], rollups)
+        except Exception as e:
+            # Never let the thread die: its queue would fill and block dispatch for good
+            logger.error(f"Dropping batch of {len(items)} messages: {e}")
+        finally:
+            for tp, offset, _, _ in items:
+                tracker.complete(tp, offset)
+            work.task_done()
+
+
+def dispatch(msgs: list, work_queues: list, tracker: OffsetTracker) -> int:
+    """Decode a consumed batch and queue it per worker. Returns the number of valid messages."""
+    per_worker = [[] for _ in work_queues]
+    valid = 0
+    for msg in msgs:
+        if msg.error():
+            logger.error(f"Consumer error: {msg.error()}")
+            continue
+        tp = (msg.topic(), msg.partition())
+        tracker.track(tp, msg.offset())
+        try:
+            message = decode_message(msg.value(), msg.headers())
+        except ValueError as e:
+            logger.error(f"Invalid message: {e}")
+            tracker.complete(tp, msg.offset())
+            continue
+        per_worker[worker_for(msg)].append((tp, msg.offset(), msg.topic(), message))
+        valid += 1
+
+    for work, items in zip(work_queues, per_worker):
+        if items:
+            work.put(items)
+    return valid
+
+
+def commit_offsets(consumer, tracker: OffsetTracker):
+    """Commit each partition's watermark (the next offset to read after all written ones)."""
+    offsets = [TopicPartition(topic, partition, offset)
+               for (topic, partition), offset in tracker.committable().items()]
+    if not offsets:
+        return
+    try:
+        consumer.commit(offsets=offsets, asynchronous=False)
+    except KafkaException as e:
+        logger.error(f"Offset commit failed: {e}")
 
 
 def main():
@@ -108,56 +323,113 @@ def main():
     # Connect to MongoDB
     mongo_client = connect_mongodb()
     db = mongo_client[MONGO_DB]
+    ensure_telemetry_collection(db)
+    ensure_indexes(db)
     
     # Kafka consumer config
     consumer_config = {
         'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
         'group.id': KAFKA_GROUP_ID,
         'auto.offset.reset': 'earliest',
-        'enable.auto.commit': True,
+        'enable.auto.commit': False,
     }
-    
+
+    tracker = OffsetTracker()
+    work_queues = [queue.Queue(maxsize=INGEST_QUEUE_BATCHES) for _ in range(INGEST_WORKERS)]
+    for index, work in enumerate(work_queues):
+        threading.Thread(target=writer, args=(db, work, tracker),
+                         name=f"ingest-writer-{index}", daemon=True).start()
+
     consumer = Consumer(consumer_config)
-    consumer.subscribe(KAFKA_TOPICS.split(','))
-    
-    logger.info("Consumer started, waiting for messages...")
-    
-    message_count = 0
+
+    def on_revoke(consumer, partitions):
+        # Finish and commit what was consumed from these partitions before another member takes them
+        for work in work_queues:
+            work.join()
+        commit_offsets(consumer, tracker)
+        tracker.forget([(p.topic, p.partition) for p in partitions])
+
+    consumer.subscribe(KAFKA_TOPICS.split(','), on_revoke=on_revoke)
     
+    logger.info(f"Consumer started ({INGEST_WORKERS} writers, batches of {INGEST_BATCH_SIZE}, "
+                f"{INGEST_BATCH_TIMEOUT}s), waiting for messages...")
+
+    message_count, batch_count = 0, 0
+    stats_count, stats_since = 0, time.time()
+
     try:
         while True:
-            msg = consumer.poll(1.0)
-            
-            if msg is None:
-                continue
-            if msg.error():
-                logger.error(f"Consumer error: {msg.error()}")
-                continue
-            
-            try:
-                topic = msg.topic()
-                value = json.loads(msg.value().decode('utf-8'))
-                
-                if topic == "coldchain.alerts":
-                    process_alert(db, value)
-                else:
-                    process_telemetry(db, value)
-                
-                message_count += 1
-                if message_count % 100 == 0:
-                    logger.info(f"Processed {message_count} messages")
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON: {e}")
-            except Exception as e:
-                logger.error(f"Processing error: {e}")
-                
+            msgs = consumer.consume(num_messages=INGEST_BATCH_SIZE, timeout=INGEST_BATCH_TIMEOUT)
+            if msgs:
+                dispatch(msgs, work_queues, tracker)
+                message_count += len(msgs)
+                batch_count += 1
+                stats_count += len(msgs)
+
+            # Written in MongoDB (or skipped as invalid): safe to move the offsets on
+            commit_offsets(consumer, tracker)
+
+            elapsed = time.time() - stats_since
+            if elapsed >= STATS_INTERVAL:
+                logger.info(f"Processed {message_count} messages in {batch_count} batches, "
+                            f"{stats_count / elapsed:.1f} msg/s, {tracker.in_flight()} in flight, "
+                            f"queued {[work.qsize() for work in work_queues]}")
+                stats_count, stats_since = 0, time.time()
+
     except KeyboardInterrupt:
         logger.info("Shutting down...")
+        for work in work_queues:
+            work.join()
+        commit_offsets(consumer, tracker)
     finally:
         consumer.close()
         mongo_client.close()
 
 
+def benchmark(batch_sizes=(1, 10, 100, 500, 1000), worker_counts=(1, 2, 4, 8), total=5000, assets=50):
+    """Measure write throughput against MONGO_URI by batch size and worker count.
+
+    Readings are split across workers by asset, as in main(). Writes
+    synthetic room readings into a scratch database, dropped afterwards.
+    """
+    client = connect_mongodb()
+    db = client[f"{MONGO_DB}_ingest_benchmark"]
+
+    def run(messages: list, batch_size: int) -> None:
+        for offset in range(0, len(messages), batch_size):
+            write_batch(db, build_batch(messages[offset:offset + batch_size]))
+
+    try:
+        for workers in worker_counts:
+            for batch_size in batch_sizes:
+                client.drop_database(db.name)
+                shares = [[] for _ in range(workers)]
+                for i in range(total):
+                    shares[(i % assets) % workers].append(("coldchain.telemetry.rooms", {
+                        "sensor_id": f"sensor-room-site1-room{i % assets}",
+                        "asset_type": "cold_room",
+                        "temperature_c": 2.5,
+                        "humidity_pct": 60.0,
+                        "door_open": False,
+                        "compressor_running": True,
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                    }))
+                threads = [threading.Thread(target=run, args=(share, max(batch_size // workers, 1)))
+                           for share in shares]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                print(f"workers {workers}, batch {batch_size:>5}: {total / elapsed:>9.0f} msg/s")
+    finally:
+        client.drop_database(db.name)
+        client.close()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Cold Chain Digital Twin - Telemetry Migration Tool
+Moves raw telemetry from the regular `telemetry` collection to a MongoDB
+time-series collection (see telemetry_collection.py) and compares the two.
+
+  python migrate_telemetry.py             # migrate + backfill, resumable
+  python migrate_telemetry.py --compare   # disk footprint and range-query latency
+
+Steps:
+  1. rename telemetry -> telemetry_legacy (skipped if already done)
+  2. create the time-series `telemetry` collection with its indexes
+  3. copy telemetry_legacy into it in bulk, in _id order, checkpointing the
+     last copied _id in the `migrations` collection after every batch
+
+Stop the ingestion consumer first (kubectl scale deployment kafka-consumer
+--replicas=0). It commits offsets only after a write, so readings that
+arrive meanwhile wait in Kafka; start it again with TELEMETRY_TIMESERIES=true.
+The legacy collection is left in place for the comparison; drop it when done.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+from datetime import datetime, timezone, timedelta
+
+from pymongo import MongoClient
+
+from mongo_indexes import ensure_indexes
+from telemetry_collection import (
+    TELEMETRY_COLLECTION, create_timeseries, is_timeseries, telemetry_meta,
+)
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
+MONGO_DB = os.getenv("MONGO_DB", "coldchain")
+
+LEGACY_COLLECTION = "telemetry_legacy"
+CHECKPOINT_ID = "telemetry_timeseries"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def prepare(db):
+    """Rename the regular collection out of the way and create the time-series one."""
+    names = db.list_collection_names()
+    if TELEMETRY_COLLECTION in names and not is_timeseries(db):
+        if LEGACY_COLLECTION in names:
+            sys.exit(f"Both '{TELEMETRY_COLLECTION}' (regular) and '{LEGACY_COLLECTION}' exist; "
+                     f"was ingestion still running? Resolve manually.")
+        db[TELEMETRY_COLLECTION].rename(LEGACY_COLLECTION)
+        logger.info(f"Renamed '{TELEMETRY_COLLECTION}' to '{LEGACY_COLLECTION}'")
+        names = db.list_collection_names()
+
+    if TELEMETRY_COLLECTION not in names:
+        create_timeseries(db)
+        ensure_indexes(db)
+    if LEGACY_COLLECTION not in names:
+        sys.exit(f"No '{LEGACY_COLLECTION}' collection to backfill from")
+
+
+def backfill(db, batch_size: int):
+    """Copy telemetry_legacy into the time-series collection, resuming from the checkpoint."""
+    legacy, target = db[LEGACY_COLLECTION], db[TELEMETRY_COLLECTION]
+    checkpoint = db.migrations.find_one({"_id": CHECKPOINT_ID}) or {}
+    query = {"_id": {"$gt": checkpoint["last_id"]}} if "last_id" in checkpoint else {}
+    copied, skipped = checkpoint.get("copied", 0), 0
+    total = legacy.estimated_document_count()
+    start = time.time()
+
+    batch = []
+    for doc in legacy.find(query, sort=[("_id", 1)], batch_size=batch_size):
+        if not isinstance(doc.get("created_at"), datetime):
+            skipped += 1
+            continue
+        doc["meta"] = telemetry_meta(doc)
+        doc.setdefault("asset_id", doc["meta"]["asset_id"])
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            copied = flush(db, target, batch, copied)
+            batch = []
+            logger.info(f"Copied {copied}/{total} ({copied / max(time.time() - start, 1e-9):.0f} docs/s)")
+    if batch:
+        copied = flush(db, target, batch, copied)
+
+    logger.info(f"Backfill done: {copied} documents copied, {skipped} without created_at skipped, "
+                f"{time.time() - start:.1f}s")
+
+
+def flush(db, target, batch: list, copied: int) -> int:
+    target.insert_many(batch, ordered=False)
+    copied += len(batch)
+    db.migrations.update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"last_id": batch[-1]["_id"], "copied": copied, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return copied
+
+
+def footprint(db, name: str) -> dict:
+    stats = db.command("collStats", name)
+    return {
+        "count": stats.get("count", 0),
+        "data_mb": stats.get("size", 0) / 1e6,
+        "storage_mb": stats.get("storageSize", 0) / 1e6,
+        "index_mb": stats.get("totalIndexSize", 0) / 1e6,
+    }
+
+
+def range_query_ms(collection, asset_id: str, hours: int, runs: int) -> float:
+    """Median latency of the state engine's history query shape."""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    query = {"asset_id": asset_id, "created_at": {"$gte": since}}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        list(collection.find(query, {"_id": 0}).sort("created_at", -1).limit(1000))
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def compare(db, hours: int, runs: int):
+    names = [name for name in (LEGACY_COLLECTION, TELEMETRY_COLLECTION) if name in db.list_collection_names()]
+    for name in names:
+        f = footprint(db, name)
+        logger.info(f"{name:>18}: {f['count']} docs, data {f['data_mb']:.1f} MB, "
+                    f"storage {f['storage_mb']:.1f} MB, indexes {f['index_mb']:.1f} MB")
+
+    assets = [a for a in db[names[0]].distinct("asset_id") if a][:5]
+    for asset_id in assets:
+        latencies = ", ".join(f"{name} {range_query_ms(db[name], asset_id, hours, runs):.1f} ms" for name in names)
+        logger.info(f"{asset_id} last {hours}h: {latencies}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move telemetry to a MongoDB time-series collection")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--compare", action="store_true", help="only report footprint and query latency")
+    parser.add_argument("--hours", type=int, default=24, help="range for the latency comparison")
+    parser.add_argument("--runs", type=int, default=20, help="repetitions per latency measurement")
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    db = client[MONGO_DB]
+    try:
+        if not args.compare:
+            prepare(db)
+            backfill(db, args.batch_size)
+        compare(db, args.hours, args.runs)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold Chain Digital Twin - MongoDB Index Bootstrap
+Run by the ingestion consumer at startup (and by the migration tools), so
+a fresh or restored database gets the indexes the history queries need.
+
+All per-asset queries filter on the canonical asset_id plus a created_at
+range, so both collections get a compound (asset_id, created_at) index.
+Retention is a TTL index on created_at (the time-series telemetry
+collection expires through its own expireAfterSeconds instead). Rollup
+collections get (asset_id, bucket) and a TTL on bucket.
+create_index is a no-op when the index already exists; an existing
+created_at index with other TTL options is updated in place with collMod.
+"""
+
+import os
+import logging
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from rollups import ROLLUP_TIERS
+from telemetry_collection import TELEMETRY_COLLECTION, TELEMETRY_TTL_SECONDS, is_timeseries
+
+logger = logging.getLogger(__name__)
+
+# Alert retention in seconds (30 days); 0 = keep forever
+ALERT_TTL_SECONDS = int(os.getenv("ALERT_TTL_SECONDS", 2592000))
+
+# Rollup retention in seconds: 1-minute buckets 30 days, 1-hour buckets 400 days
+ROLLUP_TTL_SECONDS = {
+    "telemetry_1m": int(os.getenv("ROLLUP_1M_TTL_SECONDS", 2592000)),
+    "telemetry_1h": int(os.getenv("ROLLUP_1H_TTL_SECONDS", 34560000)),
+}
+
+ASSET_TIME_INDEX = [("asset_id", ASCENDING), ("created_at", DESCENDING)]
+
+INDEX_OPTIONS_CONFLICT = (85, 86)
+
+
+def ensure_ttl(collection, seconds: int, field: str = "created_at"):
+    """TTL index on a time field, or update the expiry of an existing index on it."""
+    if not seconds:
+        return
+    try:
+        collection.create_index([(field, ASCENDING)], expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code not in INDEX_OPTIONS_CONFLICT:
+            raise
+        collection.database.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+        )
+        logger.info(f"Updated {collection.name}.{field} TTL to {seconds}s")
+
+
+def ensure_indexes(db):
+    """Create the (asset_id, created_at) and retention indexes on telemetry and alerts."""
+    telemetry = db[TELEMETRY_COLLECTION]
+    telemetry.create_index(ASSET_TIME_INDEX)
+    if not is_timeseries(db):
+        ensure_ttl(telemetry, TELEMETRY_TTL_SECONDS)
+
+    db.alerts.create_index(ASSET_TIME_INDEX)
+    ensure_ttl(db.alerts, ALERT_TTL_SECONDS)
+
+    for name in ROLLUP_TIERS:
+        db[name].create_index([("asset_id", ASCENDING), ("bucket", ASCENDING)])
+        ensure_ttl(db[name], ROLLUP_TTL_SECONDS[name], field="bucket")
+    logger.info("MongoDB indexes ready")
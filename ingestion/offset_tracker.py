@@ -0,0 +1,56 @@
+"""
+Cold Chain Digital Twin - Offset Tracker
+Per-partition commit watermarks for the parallel ingestion workers.
+
+Workers finish messages out of order across partitions, and within a
+partition when its keys hash to different workers. A partition's offset is
+only committed up to its lowest offset that is not yet written, so a crash
+never skips a reading that was still in flight.
+"""
+
+import threading
+from collections import deque
+
+
+class OffsetTracker:
+    """In-flight offsets per (topic, partition)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}    # (topic, partition) -> deque of offsets, in consume order
+        self._done = {}       # (topic, partition) -> set of finished offsets still behind the head
+        self._next = {}       # (topic, partition) -> offset to commit (last contiguous done + 1)
+        self._committed = {}  # (topic, partition) -> offset last handed out by committable()
+
+    def track(self, tp: tuple, offset: int):
+        """Register a consumed offset; call in consume order per partition."""
+        with self._lock:
+            self._pending.setdefault(tp, deque()).append(offset)
+            self._done.setdefault(tp, set())
+
+    def complete(self, tp: tuple, offset: int):
+        with self._lock:
+            pending, done = self._pending[tp], self._done[tp]
+            done.add(offset)
+            while pending and pending[0] in done:
+                head = pending.popleft()
+                done.discard(head)
+                self._next[tp] = head + 1
+
+    def committable(self) -> dict:
+        """{(topic, partition): offset} for partitions whose watermark moved since the last call."""
+        with self._lock:
+            moved = {tp: offset for tp, offset in self._next.items() if self._committed.get(tp) != offset}
+            self._committed.update(moved)
+            return moved
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def forget(self, partitions: list):
+        """Drop state for revoked partitions."""
+        with self._lock:
+            for tp in partitions:
+                for table in (self._pending, self._done, self._next, self._committed):
+                    table.pop(tp, None)
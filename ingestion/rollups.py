@@ -0,0 +1,105 @@
+"""
+Cold Chain Digital Twin - Telemetry Rollups
+1-minute and 1-hour aggregates per asset, maintained by the ingestion
+writers as readings arrive, so history endpoints can chart a week from
+~168 hourly documents instead of every raw reading.
+
+Collections telemetry_1m / telemetry_1h, one document per asset per bucket:
+  _id              "<asset_id>|<bucket start ISO>"
+  asset_id, bucket (bucket start, UTC)
+  count
+  temp_min / temp_max / temp_sum / temp_count
+  humidity_min / humidity_max / humidity_sum / humidity_count
+  door_open_s, compressor_on_s
+  batches          ids of the last RECENT_BATCHES batches applied
+
+Averages are sum / count at read time. Door-open and compressor-on seconds
+credit the gap since the asset's previous reading (capped at MAX_GAP_SECONDS)
+to the state that previous reading reported. The previous reading is kept
+per writer thread, which is safe because an asset always hashes to the same
+writer. A batch becomes one upsert per (asset, bucket) per tier using $min,
+$max and $inc. Each upsert only matches a bucket whose `batches` does not
+hold its batch id yet, and pushes the id; a retried batch that already
+landed in a bucket then hits a duplicate-key error on the upsert instead
+of counting twice. A writer retries a batch before starting its next one,
+so the last few ids are enough.
+"""
+
+import os
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+ROLLUP_TIERS = {
+    "telemetry_1m": 60,
+    "telemetry_1h": 3600,
+}
+
+# Longest gap between readings still credited to door/compressor time
+MAX_GAP_SECONDS = float(os.getenv("ROLLUP_MAX_GAP_SECONDS", 300))
+
+RECENT_BATCHES = 8
+
+_FIELDS = (("temperature_c", "temp"), ("humidity_pct", "humidity"))
+
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    epoch = ts.timestamp()
+    return datetime.fromtimestamp(epoch - epoch % seconds, ts.tzinfo)
+
+
+class RollupBuilder:
+    """Folds readings into per-bucket partial aggregates for one writer thread"""
+
+    def __init__(self):
+        self._previous = {}  # asset_id -> (created_at, door_open, compressor_running)
+
+    def build(self, readings: list, batch_id: str) -> dict:
+        """{collection: [UpdateOne, ...]} for (asset_id, created_at, message) readings in order."""
+        partials = {name: {} for name in ROLLUP_TIERS}
+        for asset_id, created_at, message in readings:
+            door_s = compressor_s = 0.0
+            previous = self._previous.get(asset_id)
+            if previous is not None:
+                gap = (created_at - previous[0]).total_seconds()
+                if 0 < gap <= MAX_GAP_SECONDS:
+                    door_s = gap if previous[1] else 0.0
+                    compressor_s = gap if previous[2] else 0.0
+            if previous is None or created_at >= previous[0]:
+                self._previous[asset_id] = (created_at, message.get("door_open"),
+                                            message.get("compressor_running"))
+
+            for name, seconds in ROLLUP_TIERS.items():
+                bucket = bucket_start(created_at, seconds)
+                agg = partials[name].setdefault((asset_id, bucket), {
+                    "count": 0, "door_open_s": 0.0, "compressor_on_s": 0.0,
+                })
+                agg["count"] += 1
+                agg["door_open_s"] += door_s
+                agg["compressor_on_s"] += compressor_s
+                for field, prefix in _FIELDS:
+                    value = message.get(field)
+                    if value is None:
+                        continue
+                    agg[f"{prefix}_min"] = min(agg.get(f"{prefix}_min", value), value)
+                    agg[f"{prefix}_max"] = max(agg.get(f"{prefix}_max", value), value)
+                    agg[f"{prefix}_sum"] = agg.get(f"{prefix}_sum", 0.0) + value
+                    agg[f"{prefix}_count"] = agg.get(f"{prefix}_count", 0) + 1
+
+        return {name: [upsert(asset_id, bucket, agg, batch_id) for (asset_id, bucket), agg in buckets.items()]
+                for name, buckets in partials.items() if buckets}
+
+
+def upsert(asset_id: str, bucket: datetime, agg: dict, batch_id: str) -> UpdateOne:
+    update = {
+        "$setOnInsert": {"asset_id": asset_id, "bucket": bucket},
+        "$inc": {key: value for key, value in agg.items() if key.endswith(("count", "_sum", "_s"))},
+        "$push": {"batches": {"$each": [batch_id], "$slice": -RECENT_BATCHES}},
+    }
+    mins = {key: value for key, value in agg.items() if key.endswith("_min")}
+    maxes = {key: value for key, value in agg.items() if key.endswith("_max")}
+    if mins:
+        update["$min"] = mins
+        update["$max"] = maxes
+    return UpdateOne({"_id": f"{asset_id}|{bucket.isoformat()}", "batches": {"$ne": batch_id}},
+                     update, upsert=True)
@@ -0,0 +1,72 @@
+"""
+Cold Chain Digital Twin - Telemetry Collection Layout
+Shared by the Kafka consumer and migrate_telemetry.py.
+
+With TELEMETRY_TIMESERIES=true, raw telemetry lives in a native MongoDB
+time-series collection:
+  timeField  created_at
+  metaField  meta = {"asset_id": ..., "asset_type": ...}
+
+Readings are bucketed per asset and stored column-compressed, so the
+repeated fields cost far less on disk. Documents keep their top-level
+asset_id / created_at fields and the same (asset_id, created_at) index as
+the regular collection (mongo_indexes.py), so queries on db.telemetry work
+unchanged.
+
+Time-series collections do not enforce unique _id values: a batch the
+consumer retries after a partial write can store a reading twice.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_COLLECTION = "telemetry"
+TELEMETRY_TIMESERIES = os.getenv("TELEMETRY_TIMESERIES", "false").lower() == "true"
+TELEMETRY_GRANULARITY = os.getenv("TELEMETRY_GRANULARITY", "seconds")
+# Same retention as the TTL index on the regular collection (7 days); 0 = keep forever
+TELEMETRY_TTL_SECONDS = int(os.getenv("TELEMETRY_TTL_SECONDS", 604800))
+
+TIME_FIELD = "created_at"
+META_FIELD = "meta"
+
+
+def telemetry_meta(message: dict) -> dict:
+    return {
+        "asset_id": message.get("truck_id") or message.get("sensor_id"),
+        "asset_type": message.get("asset_type"),
+    }
+
+
+def is_timeseries(db, name: str = TELEMETRY_COLLECTION) -> bool:
+    for info in db.list_collections(filter={"name": name}):
+        return info.get("type") == "timeseries"
+    return False
+
+
+def create_timeseries(db, name: str = TELEMETRY_COLLECTION):
+    """Create a time-series telemetry collection (indexes come from mongo_indexes.py)."""
+    options = {
+        "timeseries": {
+            "timeField": TIME_FIELD,
+            "metaField": META_FIELD,
+            "granularity": TELEMETRY_GRANULARITY,
+        }
+    }
+    if TELEMETRY_TTL_SECONDS:
+        options["expireAfterSeconds"] = TELEMETRY_TTL_SECONDS
+    collection = db.create_collection(name, **options)
+    logger.info(f"Created time-series collection '{name}' (granularity {TELEMETRY_GRANULARITY})")
+    return collection
+
+
+def ensure_telemetry_collection(db):
+    """Create the time-series collection on first start when TELEMETRY_TIMESERIES is set."""
+    if not TELEMETRY_TIMESERIES:
+        return
+    if TELEMETRY_COLLECTION not in db.list_collection_names():
+        create_timeseries(db)
+    elif not is_timeseries(db):
+        logger.warning(f"'{TELEMETRY_COLLECTION}' is a regular collection; run migrate_telemetry.py "
+                       f"to move it to time-series storage")
@@ -0,0 +1,48 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pyarrow import fs as pafs
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+mongomock = pytest.importorskip("mongomock")
+
+from archive_telemetry import archive, UNKNOWN_ASSET  # noqa: E402
+from telemetry_collection import TELEMETRY_COLLECTION  # noqa: E402
+
+
+def test_archive_terminates_on_readings_without_asset_id(tmp_path):
+    db = mongomock.MongoClient().coldchain
+    collection = db[TELEMETRY_COLLECTION]
+    old = datetime(2026, 1, 1, 12, 0)
+    collection.insert_many([
+        {"truck_id": "truck01", "temperature_c": 1.0, "created_at": old},
+        {"sensor_id": "room01", "temperature_c": 2.0, "created_at": old + timedelta(minutes=1)},
+        {"asset_id": None, "temperature_c": 3.0, "created_at": old + timedelta(minutes=2)},
+        {"asset_id": "truck02", "temperature_c": 4.0, "created_at": old + timedelta(days=1)},
+    ])
+
+    archive(db, pafs.LocalFileSystem(), str(tmp_path), datetime(2026, 1, 5, tzinfo=timezone.utc), delete_batch=10)
+
+    assert collection.count_documents({}) == 0
+    day = tmp_path / "telemetry" / "date=2026-01-01"
+    assert sorted(p.name for p in day.iterdir()) == [
+        f"asset_id={UNKNOWN_ASSET}", "asset_id=room01", "asset_id=truck01",
+    ]
+    table = pq.read_table(next((day / "asset_id=truck01").iterdir()))
+    assert table["asset_id"].to_pylist() == ["truck01"]
+
+
+def test_archive_moves_past_a_day_it_cannot_archive(tmp_path, monkeypatch):
+    import archive_telemetry
+
+    db = mongomock.MongoClient().coldchain
+    db[TELEMETRY_COLLECTION].insert_one({"asset_id": "truck01", "created_at": datetime(2026, 1, 1)})
+    monkeypatch.setattr(archive_telemetry, "_day_partitions", lambda collection, window: iter(()))
+
+    archive(db, pafs.LocalFileSystem(), str(tmp_path), datetime(2026, 1, 5, tzinfo=timezone.utc), delete_batch=10)
+
+    assert db[TELEMETRY_COLLECTION].count_documents({}) == 1
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import queue
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("confluent_kafka")
+
+from pymongo.errors import AutoReconnect  # noqa: E402
+
+import kafka_consumer  # noqa: E402
+from offset_tracker import OffsetTracker  # noqa: E402
+
+TP = ("coldchain.telemetry.rooms", 0)
+
+
+def reading(room: int, temperature):
+    return {"sensor_id": f"sensor-room-site1-room{room}", "asset_type": "cold_room",
+            "temperature_c": temperature, "timestamp": "2026-01-01T00:00:00+00:00"}
+
+
+def test_writer_skips_unwritable_message_and_keeps_running(monkeypatch):
+    monkeypatch.setattr(kafka_consumer, "INGEST_ROLLUPS", False)
+    db = mongomock.MongoClient().coldchain
+    tracker, work = OffsetTracker(), queue.Queue()
+    threading.Thread(target=kafka_consumer.writer, args=(db, work, tracker), daemon=True).start()
+
+    batches = [[reading(1, 2.0), reading(2, 2 ** 70), reading(3, 3.0)], [reading(4, 4.0)]]
+    offset = 0
+    for batch in batches:
+        items = []
+        for message in batch:
+            tracker.track(TP, offset)
+            items.append((TP, offset, TP[0], message))
+            offset += 1
+        work.put(items)
+    deadline = time.time() + 10
+    while work.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.05)
+    assert not work.unfinished_tasks, "writer stopped draining its queue"
+
+    stored = sorted(doc["sensor_id"][-5:] for doc in db.telemetry.find())
+    assert stored == ["room1", "room3", "room4"]
+    assert tracker.committable() == {TP: offset}
+
+
+def test_retry_after_lost_acknowledgement_counts_rollups_once(monkeypatch):
+    monkeypatch.setattr(kafka_consumer, "WRITE_RETRY_DELAY", 0)
+    db = mongomock.MongoClient().coldchain
+    bulk_write, failed = mongomock.collection.Collection.bulk_write, []
+
+    def applied_then_lost(self, requests, **kwargs):
+        result = bulk_write(self, requests, **kwargs)
+        if self.name == "telemetry_1h" and not failed:
+            failed.append(self.name)
+            raise AutoReconnect("connection closed before the reply")
+        return result
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", applied_then_lost)
+    messages = [(TP[0], reading(1, 2.0)), (TP[0], reading(1, 4.0))]
+    kafka_consumer.write_with_retry(db, messages, kafka_consumer.RollupBuilder())
+
+    assert failed == ["telemetry_1h"]
+    assert db.telemetry.count_documents({}) == 2
+    assert db.assets.find_one()["message_count"] == 2
+    for collection in ("telemetry_1m", "telemetry_1h"):
+        bucket = db[collection].find_one()
+        assert (bucket["count"], bucket["temp_sum"]) == (2, 6.0)
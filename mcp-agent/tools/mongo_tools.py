@@ -42,16 +42,11 @@ def query_telemetry(asset_id: str, hours: int = 2, limit: int = 50) -> str:
     db = get_db()
     since = datetime.now(timezone.utc) - timedelta(hours=hours)
 
-    # The ingestion consumer stores truck_id or sensor_id depending on asset type
-    query = {
-        "$or": [
-            {"truck_id": asset_id},
-            {"sensor_id": asset_id},
-            {"truck_id": {"$regex": asset_id, "$options": "i"}},
-            {"sensor_id": {"$regex": asset_id, "$options": "i"}},
-        ],
-        "created_at": {"$gte": since}
-    }
+    # The ingestion consumer stores the canonical asset_id (truck_id or sensor_id);
+    # exact IDs use the (asset_id, created_at) index, partial ones fall back to a regex
+    query = {"asset_id": asset_id, "created_at": {"$gte": since}}
+    if not db.telemetry.find_one(query, {"_id": 1}):
+        query["asset_id"] = {"$regex": asset_id, "$options": "i"}
 
     cursor = db.telemetry.find(
         query, {"_id": 0}
@@ -118,7 +113,10 @@ def find_breaches(asset_id: str = None, hours: int = 24, limit: int = 20) -> str
     # and have anomaly.type field (e.g. TEMP_BREACH, DOOR_OPEN)
     query = {"created_at": {"$gte": since}}
     if asset_id:
-        query["asset_id"] = {"$regex": asset_id, "$options": "i"}
+        # Exact IDs use the (asset_id, created_at) index; partial ones fall back to a regex
+        query["asset_id"] = asset_id
+        if not db.alerts.find_one(query, {"_id": 1}):
+            query["asset_id"] = {"$regex": asset_id, "$options": "i"}
 
     cursor = db.alerts.find(query, {"_id": 0}).sort("created_at", -1).limit(limit)
 
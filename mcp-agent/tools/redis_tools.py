@@ -3,10 +3,13 @@ Redis MCP Tools — Real-time digital twin state from Redis.
 Connects to Redis running on EKS (via NodePort).
 
 Key prefixes used by state-engine:
-  asset:state:{asset_id}  — current asset state
+  asset:state:{asset_id}  — current asset state (JSON layout)
+  asset:hash:{asset_id}   — current asset state (hash layout, one field per value)
   alert:active:{asset_id} — active alerts
   assets:index            — set of all asset IDs
   alerts:active:index     — set of asset IDs with active alerts
+  assets:state:{state}    — set of asset IDs currently in that state
+  assets:type:{type}      — set of asset IDs of that asset type
 """
 
 import os
@@ -18,8 +21,13 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 
 ASSET_STATE_PREFIX = "asset:state:"
+ASSET_HASH_PREFIX = "asset:hash:"
 ALERT_ACTIVE_PREFIX = "alert:active:"
 
+_FLOAT_FIELDS = {"temperature_c", "humidity_pct", "latitude", "longitude", "speed_kmh"}
+_BOOL_FIELDS = {"door_open", "compressor_running"}
+_LOCATION_FIELDS = ("latitude", "longitude", "speed_kmh")
+
 _redis = None
 
 
@@ -33,6 +41,49 @@ def get_redis():
     return _redis
 
 
+def _decode_hash(fields: dict) -> dict:
+    state = {}
+    for field, value in fields.items():
+        if value is None or value == "":
+            continue
+        if field == "reasons":
+            state[field] = json.loads(value)
+        elif field in _FLOAT_FIELDS:
+            state[field] = float(value)
+        elif field in _BOOL_FIELDS:
+            state[field] = value == "1"
+        else:
+            state[field] = value
+    if "latitude" in state:
+        state["location"] = {field: state.pop(field, None) for field in _LOCATION_FIELDS}
+    return state
+
+
+def _read_states(r, asset_ids: list, fields: list = None) -> list:
+    """Current state per asset from whichever layout the state engine wrote.
+    fields limits what is fetched from hash-layout assets."""
+    pipe = r.pipeline(transaction=False)
+    for aid in asset_ids:
+        pipe.get(f"{ASSET_STATE_PREFIX}{aid}")
+        if fields:
+            pipe.hmget(f"{ASSET_HASH_PREFIX}{aid}", fields)
+        else:
+            pipe.hgetall(f"{ASSET_HASH_PREFIX}{aid}")
+    values = pipe.execute()
+
+    states = []
+    for data, hashed in zip(values[::2], values[1::2]):
+        if data:
+            states.append(json.loads(data))
+        elif fields and any(hashed):
+            states.append(_decode_hash(dict(zip(fields, hashed))))
+        elif hashed and not fields:
+            states.append(_decode_hash(hashed))
+        else:
+            states.append(None)
+    return states
+
+
 def get_live_state(asset_id: str) -> str:
     """Get the real-time state of an asset from Redis.
 
@@ -43,22 +94,19 @@ def get_live_state(asset_id: str) -> str:
         JSON string with current state from Redis.
     """
     r = get_redis()
-    key = f"{ASSET_STATE_PREFIX}{asset_id}"
-    data = r.get(key)
+    state = _read_states(r, [asset_id])[0]
 
-    if not data:
+    if not state:
         # Try scanning for partial match
-        all_keys = r.keys(f"{ASSET_STATE_PREFIX}*{asset_id}*")
+        all_keys = r.keys(f"{ASSET_STATE_PREFIX}*{asset_id}*") or r.keys(f"{ASSET_HASH_PREFIX}*{asset_id}*")
         if all_keys:
-            data = r.get(all_keys[0])
-            if data:
-                state = json.loads(data)
-                actual_id = all_keys[0].replace(ASSET_STATE_PREFIX, "")
+            actual_id = all_keys[0].split(":", 2)[2]
+            state = _read_states(r, [actual_id])[0]
+            if state:
                 return json.dumps({"asset_id": actual_id, "source": "redis_live", **state})
 
         return json.dumps({"message": f"No live state found in Redis for {asset_id}"})
 
-    state = json.loads(data)
     return json.dumps({"asset_id": asset_id, "source": "redis_live", **state})
 
 
@@ -75,15 +123,9 @@ def get_all_live_states() -> str:
         return json.dumps({"message": "No live states found in Redis"})
 
     results = []
-    pipe = r.pipeline(transaction=False)
     sorted_ids = sorted(asset_ids)
-    for aid in sorted_ids:
-        pipe.get(f"{ASSET_STATE_PREFIX}{aid}")
-    values = pipe.execute()
-
-    for asset_id, data in zip(sorted_ids, values):
-        if data:
-            state = json.loads(data)
+    for asset_id, state in zip(sorted_ids, _read_states(r, sorted_ids)):
+        if state:
             state["asset_id"] = asset_id
             results.append(state)
 
@@ -154,15 +196,11 @@ def compare_assets(asset_ids: list = None) -> str:
     if not asset_ids:
         return json.dumps({"message": "No assets found"})
 
-    pipe = r.pipeline(transaction=False)
-    for aid in asset_ids:
-        pipe.get(f"{ASSET_STATE_PREFIX}{aid}")
-    values = pipe.execute()
-
+    fields = ["state", "temperature_c", "humidity_pct", "door_open", "compressor_running",
+              "asset_type", "updated_at"]
     results = []
-    for aid, data in zip(asset_ids, values):
-        if data:
-            state = json.loads(data)
+    for aid, state in zip(asset_ids, _read_states(r, asset_ids, fields)):
+        if state:
             results.append({
                 "asset_id": aid,
                 "state": state.get("state", "UNKNOWN"),
@@ -192,16 +230,12 @@ def list_all_assets() -> str:
     if not asset_ids:
         return json.dumps({"message": "No assets found in Redis"})
 
-    pipe = r.pipeline(transaction=False)
     sorted_ids = sorted(asset_ids)
-    for aid in sorted_ids:
-        pipe.get(f"{ASSET_STATE_PREFIX}{aid}")
-    values = pipe.execute()
+    states = _read_states(r, sorted_ids, ["state", "asset_type", "temperature_c"])
 
     results = []
-    for aid, data in zip(sorted_ids, values):
-        if data:
-            state = json.loads(data)
+    for aid, state in zip(sorted_ids, states):
+        if state:
             results.append({
                 "asset_id": aid,
                 "state": state.get("state", "UNKNOWN"),
@@ -224,6 +224,7 @@ apply_terraform() {
   export MQTT_BROKER_PRIVATE_IP=$(terraform output -raw mqtt_broker_private_ip)
   export MONGODB_PRIVATE_IP=$(terraform output -raw mongodb_private_ip)
   export EKS_CLUSTER_NAME=$(terraform output -raw eks_cluster_name 2>/dev/null || echo "$PROJECT-eks")
+  export ARCHIVE_URI=$(terraform output -raw telemetry_archive_uri 2>/dev/null || echo "")
 
   cd ..
   log_done "MQTT=$MQTT_BROKER_IP | MongoDB=$MONGODB_PRIVATE_IP"
@@ -295,6 +296,16 @@ ecr_login() {
 build_and_push_images() {
   log_step "Build and Push Application Images"
 
+  # Each image bakes in its own copy of the telemetry codec; bridge/ holds the source
+  local copy
+  for copy in ingestion/telemetry_codec.py sensors/telemetry_codec.py state-engine/telemetry_codec.py; do
+    if ! cmp -s bridge/telemetry_codec.py "$copy"; then
+      log_error "$copy differs from bridge/telemetry_codec.py — copy bridge's over it before deploying"
+      track_step "Build & Push App Images" "fail" "telemetry_codec.py copies differ"
+      exit 1
+    fi
+  done
+
   local pushed=0
 
   for i in "${!SERVICES[@]}"; do
@@ -401,6 +412,7 @@ apply_configmaps() {
     --from-literal=KAFKA_TOPICS="coldchain.telemetry.trucks,coldchain.telemetry.rooms,coldchain.alerts" \
     --from-literal=MONGO_URI="mongodb://${MONGODB_PRIVATE_IP}:27017" \
     --from-literal=MONGO_DB="coldchain" \
+    --from-literal=ARCHIVE_URI="${ARCHIVE_URI}" \
     --dry-run=client -o yaml | kubectl apply -f -
 
   kubectl create configmap state-engine-config -n "$NAMESPACE" \
@@ -412,6 +424,7 @@ apply_configmaps() {
     --from-literal=REDIS_DB="0" \
     --from-literal=MONGO_URI="mongodb://${MONGODB_PRIVATE_IP}:27017" \
     --from-literal=MONGO_DB="coldchain" \
+    --from-literal=ARCHIVE_URI="${ARCHIVE_URI}" \
     --dry-run=client -o yaml | kubectl apply -f -
 
   # Create profile ConfigMap from selected YAML
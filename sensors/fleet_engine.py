@@ -0,0 +1,386 @@
+"""
+Cold Chain Digital Twin - Vectorized Fleet Engine
+Struct-of-arrays version of ColdRoomSensor / TruckSensor for load testing.
+
+Every piece of per-asset state (temperature, humidity, door, compressor,
+power, route position) lives in a NumPy array, and step() advances the
+whole fleet at once. The rules mirror simulate_step() in simulator.py
+one-for-one, so the thermal and door/compressor behaviour is the same as
+the object-per-sensor simulator, just without a Python loop per asset.
+"""
+
+import copy
+from typing import Optional
+
+import numpy as np
+
+
+# Sentinel for "no command override" in the int8 override columns
+NO_OVERRIDE = -1
+
+# Power status codes (index into POWER_STATUSES)
+POWER_STATUSES = ("normal", "brownout", "backup", "outage")
+POWER_NORMAL = 0
+POWER_OUTAGE = 3
+
+SITES = ["site1", "site2", "site3"]
+ROOM_TARGET_TEMPS = [-20, -18, -15, 2, 4, 8]
+TRUCK_TARGET_TEMPS = [-18, -15, 2, 4]
+
+# Same waypoints as TruckSensor.ROUTES
+ROUTES = {
+    "route_la_sf": [
+        (34.0522, -118.2437), (34.4208, -119.6982),
+        (35.2828, -120.6596), (36.7783, -119.4179),
+        (37.3382, -121.8863), (37.7749, -122.4194),
+    ],
+    "route_sd_la": [
+        (32.7157, -117.1611), (33.1959, -117.3795),
+        (33.4484, -117.6323), (33.6846, -117.8265),
+        (33.8366, -117.9143), (34.0522, -118.2437),
+    ],
+    "route_fullerton_local": [
+        (33.8704, -117.9242), (33.8353, -117.9145),
+        (33.7879, -117.8531), (33.7175, -117.8311),
+        (33.8704, -117.9242),
+    ]
+}
+
+
+class _Columns:
+    """Base for the column stores: per-row attributes can be sliced into views"""
+
+    ROW_FIELDS = ()
+
+    def view(self, rows: slice):
+        """Same store restricted to a slice of rows; arrays are NumPy views, so writes go through."""
+        if rows == slice(None):
+            return self
+        sub = copy.copy(self)
+        for name in self.ROW_FIELDS:
+            setattr(sub, name, getattr(self, name)[rows])
+        sub.count = len(range(self.count)[rows])
+        return sub
+
+
+class ColdRoomArrays(_Columns):
+    """Column store for all cold rooms in the fleet"""
+
+    ROW_FIELDS = (
+        "site_ids", "room_ids", "sensor_ids", "topics", "site_codes", "target_temp",
+        "current_temp", "humidity", "door_open", "compressor_running", "compressor_cycles",
+        "power_status", "door_open_since", "cmd_door_open", "cmd_compressor_off", "cmd_power_outage",
+    )
+
+    # Thermal dynamics parameters (ColdRoomSensor)
+    cooling_rate = 0.3
+    warming_rate = 0.1
+    door_warming_rate = 0.8
+
+    def __init__(self, count: int, rng: np.random.Generator, offset: int = 0):
+        self.count = count
+        numbers = range(offset, offset + count)
+        self.site_ids = [SITES[i % len(SITES)] for i in numbers]
+        self.room_ids = [f"room{i + 1}" for i in numbers]
+        self.sensor_ids = [f"sensor-room-{s}-{r}" for s, r in zip(self.site_ids, self.room_ids)]
+        self.topics = [f"warehouse/{s}/room/{r}/telemetry" for s, r in zip(self.site_ids, self.room_ids)]
+        self.site_codes = np.arange(offset, offset + count, dtype=np.int32) % len(SITES)
+
+        self.target_temp = rng.choice(ROOM_TARGET_TEMPS, size=count).astype(np.float64)
+        self.current_temp = self.target_temp + rng.uniform(-0.5, 0.5, count)
+        self.humidity = rng.uniform(45, 55, count)
+        self.door_open = np.zeros(count, dtype=bool)
+        self.compressor_running = np.ones(count, dtype=bool)
+        self.compressor_cycles = np.zeros(count, dtype=np.int64)
+        self.power_status = np.full(count, POWER_NORMAL, dtype=np.int8)
+        self.door_open_since = np.full(count, np.nan)
+
+        # Command overrides: NO_OVERRIDE, 0 (False) or 1 (True)
+        self.cmd_door_open = np.full(count, NO_OVERRIDE, dtype=np.int8)
+        self.cmd_compressor_off = np.full(count, NO_OVERRIDE, dtype=np.int8)
+        self.cmd_power_outage = np.full(count, NO_OVERRIDE, dtype=np.int8)
+
+
+class TruckArrays(_Columns):
+    """Column store for all refrigerated trucks in the fleet"""
+
+    ROW_FIELDS = (
+        "truck_ids", "sensor_ids", "topics", "target_temp", "current_temp", "humidity",
+        "door_open", "compressor_running", "engine_running", "door_open_since", "cmd_door_open",
+        "cmd_compressor_off", "route", "route_index", "route_progress", "speed", "latitude", "longitude",
+    )
+
+    # Thermal dynamics parameters (TruckSensor)
+    cooling_rate = 0.25
+    warming_rate = 0.15
+    door_warming_rate = 1.0
+
+    def __init__(self, count: int, rng: np.random.Generator, fleet_id: str = "fleet1", offset: int = 0):
+        self.count = count
+        self.fleet_id = fleet_id
+        self.truck_ids = [f"truck{i + 1:02d}" for i in range(offset, offset + count)]
+        self.sensor_ids = [f"sensor-truck-{t}" for t in self.truck_ids]
+        self.topics = [f"fleet/{t}/telemetry" for t in self.truck_ids]
+
+        self.target_temp = rng.choice(TRUCK_TARGET_TEMPS, size=count).astype(np.float64)
+        self.current_temp = self.target_temp + rng.uniform(-0.5, 0.5, count)
+        self.humidity = rng.uniform(40, 50, count)
+        self.door_open = np.zeros(count, dtype=bool)
+        self.compressor_running = np.ones(count, dtype=bool)
+        self.engine_running = np.ones(count, dtype=bool)
+        self.door_open_since = np.full(count, np.nan)
+
+        # Command overrides: NO_OVERRIDE, 0 (False) or 1 (True)
+        self.cmd_door_open = np.full(count, NO_OVERRIDE, dtype=np.int8)
+        self.cmd_compressor_off = np.full(count, NO_OVERRIDE, dtype=np.int8)
+
+        # GPS simulation: waypoints padded to a (routes, max_len, 2) block
+        self.route_names = list(ROUTES.keys())
+        max_len = max(len(r) for r in ROUTES.values())
+        self.waypoints = np.zeros((len(ROUTES), max_len, 2))
+        self.route_lengths = np.zeros(len(ROUTES), dtype=np.int64)
+        for i, name in enumerate(self.route_names):
+            self.waypoints[i, :len(ROUTES[name])] = ROUTES[name]
+            self.route_lengths[i] = len(ROUTES[name])
+
+        self.route = rng.integers(0, len(ROUTES), count)
+        self.route_index = np.zeros(count, dtype=np.int64)
+        self.route_progress = np.zeros(count)
+        self.speed = rng.uniform(60, 90, count)
+        self.latitude = self.waypoints[self.route, 0, 0].copy()
+        self.longitude = self.waypoints[self.route, 0, 1].copy()
+
+
+class VectorizedFleet:
+    """Advances every cold room and truck in one vectorized step"""
+
+    def __init__(self, num_cold_rooms: int, num_trucks: int, seed: Optional[int] = None,
+                 room_offset: int = 0, truck_offset: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.rooms = ColdRoomArrays(num_cold_rooms, self.rng, offset=room_offset)
+        self.trucks = TruckArrays(num_trucks, self.rng, offset=truck_offset)
+
+        # Index for fast command lookup: asset key -> ("room"|"truck", row)
+        self._index = {}
+        for i, (site, room_id, sensor_id) in enumerate(
+                zip(self.rooms.site_ids, self.rooms.room_ids, self.rooms.sensor_ids)):
+            self._index[sensor_id] = ("room", i)
+            self._index[f"{site}-{room_id}"] = ("room", i)
+            self._index[f"cold-room-{site}-{room_id}"] = ("room", i)
+        for i, (truck_id, sensor_id) in enumerate(zip(self.trucks.truck_ids, self.trucks.sensor_ids)):
+            self._index[sensor_id] = ("truck", i)
+            self._index[truck_id] = ("truck", i)
+
+    def __len__(self) -> int:
+        return self.rooms.count + self.trucks.count
+
+    def find(self, asset_id: str):
+        """Resolve an asset ID to (kind, row), using the same matching as SensorFleetSimulator."""
+        hit = self._index.get(asset_id)
+        if hit:
+            return hit
+
+        asset_lower = asset_id.lower().replace("-", "").replace("_", "")
+        for key, value in self._index.items():
+            if key.lower().replace("-", "").replace("_", "") == asset_lower:
+                return value
+
+        return None
+
+    def site_rows(self, site_id: str) -> np.ndarray:
+        """Row indices of the cold rooms at a site."""
+        if site_id not in SITES:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.rooms.site_codes == SITES.index(site_id))
+
+    # -------------------------------------------------------------------------
+    # Simulation step
+    # -------------------------------------------------------------------------
+
+    def step(self, now: float, rooms: slice = slice(None), trucks: slice = slice(None)):
+        """Advance the fleet (or a slice of rooms / trucks) by one time step (now = epoch seconds)."""
+        self.step_rooms(now, rooms)
+        self.step_trucks(now, trucks)
+
+    def step_rooms(self, now: float, rows: slice = slice(None)):
+        """Advance a slice of the cold rooms by one time step."""
+        view = self.rooms.view(rows)
+        if view.count:
+            self._step_rooms(view, now)
+
+    def step_trucks(self, now: float, rows: slice = slice(None)):
+        """Advance a slice of the trucks by one time step."""
+        view = self.trucks.view(rows)
+        if view.count:
+            self._step_trucks(view, now)
+
+    def _step_rooms(self, r: ColdRoomArrays, now: float):
+        rng = self.rng
+        n = r.count
+
+        # Apply command overrides
+        door_cmd = r.cmd_door_open != NO_OVERRIDE
+        comp_cmd = r.cmd_compressor_off != NO_OVERRIDE
+        power_cmd = r.cmd_power_outage != NO_OVERRIDE
+        r.door_open[door_cmd] = r.cmd_door_open[door_cmd] == 1
+        r.compressor_running[comp_cmd] = r.cmd_compressor_off[comp_cmd] != 1
+        outage = r.cmd_power_outage == 1
+        r.compressor_running[outage] = False
+        r.power_status[outage] = POWER_OUTAGE
+
+        # Door events (only where no command override is active)
+        open_since = ~np.isnan(r.door_open_since)
+        close = (~door_cmd & r.door_open & open_since
+                 & (now - r.door_open_since > rng.uniform(30, 120, n)))
+        opened = ~door_cmd & ~r.door_open & (rng.random(n) < 0.02)
+        r.door_open[close] = False
+        r.door_open_since[close] = np.nan
+        r.door_open[opened] = True
+        r.door_open_since[opened] = now
+
+        # Compressor events
+        free = ~comp_cmd & ~power_cmd
+        stop = free & r.compressor_running & (r.current_temp < r.target_temp - 2) & (rng.random(n) < 0.1)
+        start = free & ~r.compressor_running & (r.current_temp > r.target_temp + 1)
+        r.compressor_running[stop] = False
+        r.compressor_running[start] = True
+        r.compressor_cycles[start] += 1
+
+        # Power events
+        normal = r.power_status == POWER_NORMAL
+        degrade = ~power_cmd & normal & (rng.random(n) < 0.005)
+        recover = ~power_cmd & ~normal & (rng.random(n) < 0.2)
+        r.power_status[degrade] = rng.choice([1, 2], size=int(degrade.sum()))
+        r.power_status[recover] = POWER_NORMAL
+
+        # Thermal dynamics
+        door = r.door_open
+        cooling = ~door & r.compressor_running & (r.current_temp > r.target_temp)
+        warming = ~door & ~r.compressor_running
+        r.current_temp += np.where(door, rng.uniform(0.3, r.door_warming_rate, n), 0.0)
+        r.current_temp -= np.where(cooling, rng.uniform(0.1, r.cooling_rate, n), 0.0)
+        r.current_temp += np.where(warming, rng.uniform(0.05, r.warming_rate, n), 0.0)
+        r.humidity += np.where(door, rng.uniform(1, 3, n), 0.0)
+
+        drying = r.compressor_running & ~door
+        r.humidity[:] = np.where(drying, np.maximum(40, r.humidity - rng.uniform(0, 0.5, n)), r.humidity)
+        np.clip(r.humidity, 30, 95, out=r.humidity)
+
+    def _step_trucks(self, t: TruckArrays, now: float):
+        rng = self.rng
+        n = t.count
+
+        # Apply command overrides
+        door_cmd = t.cmd_door_open != NO_OVERRIDE
+        comp_cmd = t.cmd_compressor_off != NO_OVERRIDE
+        t.door_open[door_cmd] = t.cmd_door_open[door_cmd] == 1
+        t.compressor_running[comp_cmd] = t.cmd_compressor_off[comp_cmd] != 1
+
+        # Movement
+        moving = t.engine_running.copy()
+        t.speed[~moving] = 0
+        t.route_progress += np.where(moving, rng.uniform(0.01, 0.03, n), 0.0)
+        arrived = moving & (t.route_progress >= 1.0)
+        t.route_index[arrived] = (t.route_index[arrived] + 1) % t.route_lengths[t.route[arrived]]
+        t.route_progress[arrived] = 0.0
+        parked = arrived & (rng.random(n) < 0.3)
+        t.engine_running[parked] = False
+        unload = parked & ~door_cmd
+        t.door_open[unload] = True
+        t.door_open_since[unload] = now
+
+        next_index = (t.route_index + 1) % t.route_lengths[t.route]
+        current_wp = t.waypoints[t.route, t.route_index]
+        next_wp = t.waypoints[t.route, next_index]
+        position = current_wp + (next_wp - current_wp) * t.route_progress[:, None]
+        t.latitude[:] = np.where(moving, position[:, 0], t.latitude)
+        t.longitude[:] = np.where(moving, position[:, 1], t.longitude)
+        t.speed[:] = np.where(moving, np.clip(t.speed + rng.uniform(-5, 5, n), 0, 120), t.speed)
+
+        # Door events (only where no command override is active)
+        open_since = ~np.isnan(t.door_open_since)
+        close = (~door_cmd & t.door_open & open_since
+                 & (now - t.door_open_since > rng.uniform(60, 300, n)))
+        t.door_open[close] = False
+        t.door_open_since[close] = np.nan
+        t.engine_running[close] = True
+        t.speed[close] = rng.uniform(30, 50, int(close.sum()))
+
+        # Thermal dynamics
+        door = t.door_open
+        warming = ~door & (~t.compressor_running | ~t.engine_running)
+        cooling = ~door & ~warming & (t.current_temp > t.target_temp)
+        t.current_temp += np.where(door, rng.uniform(0.5, t.door_warming_rate, n), 0.0)
+        t.current_temp += np.where(warming, rng.uniform(0.05, t.warming_rate, n), 0.0)
+        t.current_temp -= np.where(cooling, rng.uniform(0.1, t.cooling_rate, n), 0.0)
+        t.humidity += np.where(door, rng.uniform(2, 5, n), 0.0)
+
+        auto = t.engine_running & ~comp_cmd
+        hot = auto & (t.current_temp > t.target_temp + 2)
+        cold = auto & ~hot & (t.current_temp < t.target_temp - 1)
+        t.compressor_running[hot] = True
+        t.compressor_running[cold] = rng.random(int(cold.sum())) > 0.3
+
+        np.clip(t.humidity, 30, 95, out=t.humidity)
+
+    # -------------------------------------------------------------------------
+    # Telemetry output
+    # -------------------------------------------------------------------------
+
+    def room_telemetry(self, timestamp: str, rows: slice = slice(None)):
+        """Yield (topic, payload) for every cold room in rows, matching ColdRoomTelemetry."""
+        r = self.rooms.view(rows)
+        if not r.count:
+            return
+        temps = np.round(r.current_temp + self.rng.normal(0, 0.1, r.count), 2).tolist()
+        humidity = np.round(r.humidity + self.rng.normal(0, 0.5, r.count), 1).tolist()
+        door = r.door_open.tolist()
+        compressor = r.compressor_running.tolist()
+        cycles = r.compressor_cycles.tolist()
+        power = r.power_status.tolist()
+
+        for i in range(r.count):
+            yield r.topics[i], {
+                "sensor_id": r.sensor_ids[i],
+                "site_id": r.site_ids[i],
+                "room_id": r.room_ids[i],
+                "asset_type": "cold_room",
+                "timestamp": timestamp,
+                "temperature_c": temps[i],
+                "humidity_pct": humidity[i],
+                "door_open": door[i],
+                "compressor_running": compressor[i],
+                "compressor_cycle_count": cycles[i],
+                "power_status": POWER_STATUSES[power[i]],
+            }
+
+    def truck_telemetry(self, timestamp: str, rows: slice = slice(None)):
+        """Yield (topic, payload) for every truck in rows, matching TruckTelemetry."""
+        t = self.trucks.view(rows)
+        if not t.count:
+            return
+        temps = np.round(t.current_temp + self.rng.normal(0, 0.15, t.count), 2).tolist()
+        humidity = np.round(t.humidity + self.rng.normal(0, 0.8, t.count), 1).tolist()
+        latitude = np.round(t.latitude, 6).tolist()
+        longitude = np.round(t.longitude, 6).tolist()
+        speed = np.where(t.engine_running, np.round(t.speed, 1), 0).tolist()
+        door = t.door_open.tolist()
+        compressor = t.compressor_running.tolist()
+        engine = t.engine_running.tolist()
+
+        for i in range(t.count):
+            yield t.topics[i], {
+                "sensor_id": t.sensor_ids[i],
+                "truck_id": t.truck_ids[i],
+                "fleet_id": t.fleet_id,
+                "asset_type": "refrigerated_truck",
+                "timestamp": timestamp,
+                "temperature_c": temps[i],
+                "humidity_pct": humidity[i],
+                "door_open": door[i],
+                "compressor_running": compressor[i],
+                "latitude": latitude[i],
+                "longitude": longitude[i],
+                "speed_kmh": speed[i],
+                "engine_running": engine[i],
+            }
@@ -0,0 +1,63 @@
+"""
+Cold Chain Digital Twin - Gateway Bundler
+Gateway mode for the sensor simulator (GATEWAY_MODE=true).
+
+Instead of one MQTT message per sensor reading, readings are buffered per
+gateway (all cold rooms at a site_id, or all trucks in a fleet_id) and sent
+as one bundle on:
+  gateway/site/{site_id}/telemetry
+  gateway/fleet/{fleet_id}/telemetry
+
+Bundle payload:
+  {"gateway_id": "site1", "gateway_type": "site", "timestamp": "...",
+   "readings": [{"topic": "<per-asset topic>", "payload": {...}}, ...]}
+
+The bridge splits bundles back into per-asset Kafka records, so nothing
+downstream of it changes. A bundle is sent once its oldest reading has
+waited max_delay seconds or it holds max_readings readings.
+"""
+
+from typing import Iterator, Optional, Tuple
+
+
+def gateway_of(payload: dict) -> Tuple[str, str]:
+    """(gateway_type, gateway_id) that a telemetry payload is bundled under."""
+    if payload.get("asset_type") == "refrigerated_truck":
+        return "fleet", payload.get("fleet_id", "fleet1")
+    return "site", payload.get("site_id", "unknown")
+
+
+def bundle_topic(gateway_type: str, gateway_id: str) -> str:
+    return f"gateway/{gateway_type}/{gateway_id}/telemetry"
+
+
+class GatewayBundler:
+    """Per-gateway reading buffers with a delay and size cap"""
+
+    def __init__(self, max_delay: float, max_readings: int = 500):
+        self.max_delay = max_delay
+        self.max_readings = max_readings
+        self._buffers = {}  # (gateway_type, gateway_id) -> (first_added_at, [readings])
+
+    def add(self, topic: str, payload: dict, now: float) -> Optional[Tuple[tuple, list]]:
+        """Buffer a reading. Returns (gateway, readings) if this filled its bundle."""
+        key = gateway_of(payload)
+        first_added, readings = self._buffers.setdefault(key, (now, []))
+        readings.append({"topic": topic, "payload": payload})
+        if len(readings) >= self.max_readings:
+            del self._buffers[key]
+            return key, readings
+        return None
+
+    def next_flush(self) -> Optional[float]:
+        """When the oldest buffered bundle is due, or None if nothing is buffered."""
+        if not self._buffers:
+            return None
+        return min(first for first, _ in self._buffers.values()) + self.max_delay
+
+    def pop_due(self, now: float, flush_all: bool = False) -> Iterator[Tuple[tuple, list]]:
+        """Yield (gateway, readings) for every bundle that has waited max_delay."""
+        for key, (first_added, readings) in list(self._buffers.items()):
+            if flush_all or now - first_added >= self.max_delay:
+                del self._buffers[key]
+                yield key, readings
@@ -0,0 +1,91 @@
+"""
+Profile Loader — Reads simulator settings from the active YAML profile.
+Same profile file the state engine uses (mounted at /app/config/active.yaml).
+Falls back to the environment defaults if the file or pyyaml is missing.
+"""
+
+import os
+from typing import Optional
+
+PROFILE_PATH = os.getenv("PROFILE_PATH", "/app/config/active.yaml")
+
+_profile = None
+
+
+def load_profile() -> dict:
+    """Load the active profile from YAML file (cached)."""
+    global _profile
+    if _profile is not None:
+        return _profile
+
+    _profile = {}
+    if not os.path.exists(PROFILE_PATH):
+        print(f"Profile not found at {PROFILE_PATH}, using environment defaults")
+        return _profile
+
+    try:
+        import yaml
+        with open(PROFILE_PATH) as f:
+            _profile = yaml.safe_load(f) or {}
+        print(f"Loaded profile: {_profile.get('name', 'unknown')}")
+        _drop_invalid_intervals(_profile)
+    except Exception as e:
+        print(f"Failed to load profile: {e}")
+    return _profile
+
+
+def _drop_invalid_intervals(profile: dict):
+    """Drop publish intervals that are not positive numbers; lookups then fall through to PUBLISH_INTERVAL."""
+    intervals = (profile.get("simulator", {}) or {}).get("publish_intervals", {}) or {}
+    for key, value in list(intervals.items()):
+        try:
+            valid = float(value) > 0
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            print(f"Ignoring publish interval {value!r} for {key}: not a positive number of seconds")
+            del intervals[key]
+
+
+def get_publish_interval(asset_type: str, asset_id: Optional[str], default: float) -> float:
+    """Publish interval in seconds for an asset.
+
+    Lookup order in simulator.publish_intervals:
+    1. the asset ID (e.g. truck01)
+    2. the asset type (refrigerated_truck / cold_room)
+    3. `default` (PUBLISH_INTERVAL)
+    """
+    sim = load_profile().get("simulator", {}) or {}
+    intervals = sim.get("publish_intervals", {}) or {}
+    if asset_id and asset_id in intervals:
+        return float(intervals[asset_id])
+    return float(intervals.get(asset_type, default))
+
+
+def get_threshold_type(asset_type: str, asset_id: Optional[str] = None) -> str:
+    """Threshold type for an asset, resolved the same way as the state engine.
+
+    Lookup order:
+    1. asset_assignments (specific asset override)
+    2. asset_defaults (by asset type)
+    3. frozen_goods (fallback)
+    """
+    profile = load_profile()
+    assignments = profile.get("asset_assignments", {}) or {}
+    defaults = profile.get("asset_defaults", {}) or {}
+    if asset_id and asset_id in assignments:
+        return assignments[asset_id]
+    return defaults.get(asset_type, "frozen_goods")
+
+
+def get_temp_warning(threshold_type: str) -> float:
+    """temp_warning for a threshold type (state engine default: -10.0)."""
+    thresholds = load_profile().get("thresholds", {}) or {}
+    values = thresholds.get(threshold_type, thresholds.get("frozen_goods", {})) or {}
+    return float(values.get("temp_warning", -10.0))
+
+
+def get_report_config() -> dict:
+    """Report-by-exception settings from simulator.report_by_exception."""
+    sim = load_profile().get("simulator", {}) or {}
+    return sim.get("report_by_exception", {}) or {}
@@ -0,0 +1,62 @@
+"""
+Cold Chain Digital Twin - Publish Scheduler
+Fixed-rate, staggered publish scheduling for the sensor simulator.
+
+Each entry (a sensor, or a slice of the vectorized fleet) has its own
+interval. Entries sharing an interval are spread evenly across it so the
+broker sees a steady stream instead of one burst per cycle, and due times
+advance on a fixed grid (due += interval) so the rate does not drift by
+however long the publishing work took. An entry that falls behind is
+caught up by up to `max_catchup` missed slots; beyond that the missed
+slots are skipped and the entry keeps its original phase.
+"""
+
+import heapq
+import itertools
+from typing import Iterator, Optional, Tuple
+
+
+class PublishScheduler:
+    """Priority queue of (due_time, entry) with per-entry fixed intervals"""
+
+    def __init__(self, max_catchup: int = 3):
+        self.max_catchup = max_catchup
+        self.skipped = 0
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, entry, interval: float, first_due: float):
+        """Schedule an entry every `interval` seconds starting at `first_due`."""
+        heapq.heappush(self._heap, (first_due, next(self._seq), interval, entry))
+
+    def add_staggered(self, entries: list, interval: float, start: float):
+        """Schedule entries at the same interval, evenly offset across one interval."""
+        count = len(entries)
+        for i, entry in enumerate(entries):
+            self.add(entry, interval, start + interval * i / count)
+
+    def next_due(self) -> Optional[float]:
+        """Due time of the earliest entry, or None if nothing is scheduled."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> Iterator[Tuple[object, float]]:
+        """Yield (entry, due_time) for every slot due at or before `now`.
+
+        Entries are rescheduled on their fixed grid as they are yielded, so an
+        entry that is behind is yielded again for each missed slot (up to
+        max_catchup) before the call returns.
+        """
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            due, seq, interval, entry = heapq.heappop(heap)
+            next_due = due + interval
+            behind = now - next_due
+            if behind > interval * self.max_catchup:
+                missed = int(behind // interval)
+                next_due += missed * interval
+                self.skipped += missed
+            heapq.heappush(heap, (next_due, seq, interval, entry))
+            yield entry, due
@@ -0,0 +1,92 @@
+"""
+Cold Chain Digital Twin - Report-by-Exception Filter
+Edge-style publishing for the sensor simulator (REPORT_BY_EXCEPTION=true).
+
+A sampled reading is published only when:
+  - a boolean or status field flips (door, compressor, engine, power status)
+  - a numeric field leaves its deadband around the last published value
+  - the heartbeat interval has passed since the last publish (liveness)
+
+Deadbands are set per threshold type in the active profile under
+simulator.report_by_exception.deadbands, with a `default` entry for types
+that are not listed. As temperature closes on the asset's temp_warning
+(within approach_band_c), the temperature deadband and the heartbeat shrink
+in proportion, so at or above the warning every sample is published.
+"""
+
+from typing import Optional
+
+from profile_loader import get_report_config, get_temp_warning, get_threshold_type
+
+DEFAULT_DEADBANDS = {"temperature_c": 0.5, "humidity_pct": 2.0, "speed_kmh": 5.0}
+DEFAULT_HEARTBEAT = 60.0
+DEFAULT_APPROACH_BAND = 3.0
+
+# Fields that change on every sample without carrying news
+IGNORED_FIELDS = ("timestamp",)
+
+
+class ReportFilter:
+    """Decides per asset whether a sampled reading is worth publishing"""
+
+    def __init__(self, config: Optional[dict] = None):
+        config = get_report_config() if config is None else config
+        self.heartbeat = float(config.get("heartbeat_seconds", DEFAULT_HEARTBEAT))
+        self.approach_band = float(config.get("approach_band_c", DEFAULT_APPROACH_BAND))
+
+        deadbands = config.get("deadbands", {}) or {}
+        self._default_deadbands = {**DEFAULT_DEADBANDS, **(deadbands.get("default") or {})}
+        self._deadbands = {
+            threshold_type: {**self._default_deadbands, **(values or {})}
+            for threshold_type, values in deadbands.items() if threshold_type != "default"
+        }
+
+        self._assets = {}  # asset_id -> (deadbands, temp_warning)
+        self._last = {}    # asset_id -> (published_at, payload)
+        self.published = 0
+        self.suppressed = 0
+
+    def _asset(self, asset_type: str, asset_id: str) -> tuple:
+        settings = self._assets.get(asset_id)
+        if settings is None:
+            threshold_type = get_threshold_type(asset_type, asset_id)
+            settings = (self._deadbands.get(threshold_type, self._default_deadbands),
+                        get_temp_warning(threshold_type))
+            self._assets[asset_id] = settings
+        return settings
+
+    def urgency(self, temperature: float, temp_warning: float) -> float:
+        """1.0 while well clear of temp_warning, falling to 0.0 at or above it."""
+        if self.approach_band <= 0:
+            return 1.0 if temperature < temp_warning else 0.0
+        return min(max((temp_warning - temperature) / self.approach_band, 0.0), 1.0)
+
+    def should_publish(self, asset_type: str, asset_id: str, payload: dict, now: float) -> bool:
+        """Record the decision for one sampled payload and return it."""
+        last = self._last.get(asset_id)
+        if last is None or self._is_exception(asset_type, asset_id, last, payload, now):
+            self._last[asset_id] = (now, payload)
+            self.published += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def _is_exception(self, asset_type: str, asset_id: str, last: tuple, payload: dict, now: float) -> bool:
+        deadbands, temp_warning = self._asset(asset_type, asset_id)
+        published_at, previous = last
+        scale = self.urgency(payload["temperature_c"], temp_warning)
+
+        if now - published_at >= self.heartbeat * scale:
+            return True
+
+        for field, value in payload.items():
+            if field in IGNORED_FIELDS:
+                continue
+            if isinstance(value, (bool, str)):
+                if value != previous.get(field):
+                    return True
+            elif field in deadbands:
+                band = deadbands[field] * scale if field == "temperature_c" else deadbands[field]
+                if abs(value - previous[field]) > band:
+                    return True
+        return False
@@ -0,0 +1,54 @@
+"""
+Cold Chain Digital Twin - Simulation Clocks
+WallClock runs the simulator in real time (the default).
+VirtualClock runs it in event time as fast as the CPU allows, so days of
+telemetry can be generated in seconds for backfills and benchmarks.
+
+Both expose the same small interface used by the sensors and the fleet
+simulator: time(), now() and sleep(). Timed command expiries are handled by
+the simulator's TimerWheel, driven from its main loop.
+"""
+
+import time
+from datetime import datetime, timezone
+
+
+class WallClock:
+    """Real time: time.time() and time.sleep()"""
+
+    virtual = False
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Deterministic event time that only moves when the simulator sleeps.
+
+    sleep() jumps the clock forward instantly; command durations are
+    honoured in virtual time because the simulator's timer wheel is
+    advanced against this clock.
+    """
+
+    virtual = True
+
+    def __init__(self, start: float):
+        self._now = start
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._now, timezone.utc)
+
+    def sleep(self, seconds: float):
+        self._now += seconds
+
+
+WALL_CLOCK = WallClock()
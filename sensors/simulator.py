@@ -12,19 +12,65 @@ Supports command handling via MQTT topics:
 import json
 import time
 import random
-import threading
 import os
-from datetime import datetime, timezone
-from dataclasses import dataclass, asdict
-from typing import Optional
+import queue
+import multiprocessing
+from datetime import datetime, timezone, timedelta
+from dataclasses import dataclass, asdict, replace
+from typing import Optional, Tuple
+import numpy as np
 import paho.mqtt.client as mqtt
 
+from fleet_engine import (
+    VectorizedFleet, NO_OVERRIDE, POWER_NORMAL, POWER_OUTAGE, POWER_STATUSES, SITES
+)
+from sim_clock import WALL_CLOCK, VirtualClock
+from publish_scheduler import PublishScheduler
+from profile_loader import get_publish_interval
+from timer_wheel import TimerWheel
+from report_filter import ReportFilter
+from gateway import GatewayBundler, bundle_topic
+from telemetry_codec import encode
+
 
 # Configuration from environment
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_QOS = int(os.getenv("MQTT_QOS", 1))
 PUBLISH_INTERVAL = float(os.getenv("PUBLISH_INTERVAL", 5.0))
+# "objects" (one Python object per sensor) or "vectorized" (NumPy fleet engine)
+SIM_ENGINE = os.getenv("SIM_ENGINE", "objects")
+
+# Virtual-time mode: "wall" (real time) or "virtual" (event time, as fast as possible)
+SIM_CLOCK = os.getenv("SIM_CLOCK", "wall")
+SIM_SEED = os.getenv("SIM_SEED")
+SIM_DURATION = float(os.getenv("SIM_DURATION", 86400))  # virtual seconds to generate
+SIM_START = os.getenv("SIM_START")  # ISO 8601; defaults to now - SIM_DURATION
+
+# Sharded mode: split the fleet across this many worker processes (1 = single process)
+SIM_SHARDS = int(os.getenv("SIM_SHARDS", 1))
+
+# Vectorized engine: rows per scheduled publish batch (batches are staggered across the interval)
+SIM_BATCH_SIZE = int(os.getenv("SIM_BATCH_SIZE", 100))
+
+# Edge mode: publish only on deadband exits, flag flips and heartbeats
+# (deadbands per threshold type in profile simulator.report_by_exception)
+REPORT_BY_EXCEPTION = os.getenv("REPORT_BY_EXCEPTION", "false").lower() == "true"
+
+# Wire format for telemetry: "json" or "binary" (compact struct layout, see telemetry_codec.py)
+TELEMETRY_FORMAT = os.getenv("TELEMETRY_FORMAT", "json")
+
+# Gateway mode: bundle readings per site (rooms) / fleet (trucks) into one MQTT message
+GATEWAY_MODE = os.getenv("GATEWAY_MODE", "false").lower() == "true"
+GATEWAY_MAX_DELAY = float(os.getenv("GATEWAY_MAX_DELAY", PUBLISH_INTERVAL))  # seconds a reading may wait
+GATEWAY_MAX_READINGS = int(os.getenv("GATEWAY_MAX_READINGS", 500))
+
+# Command expiries (auto-close / auto-restore) are applied on this tick grid, in seconds
+COMMAND_TICK = float(os.getenv("COMMAND_TICK", 1.0))
+
+# Sensor dynamics advance once per PUBLISH_INTERVAL of elapsed time, whatever the
+# publish rate; a publish owing more steps than this resynchronises instead.
+MAX_STEPS_PER_PUBLISH = 10
 
 
 @dataclass
@@ -64,7 +110,8 @@ class TruckTelemetry:
 class ColdRoomSensor:
     """Simulates a cold room with realistic thermal dynamics"""
 
-    def __init__(self, site_id: str, room_id: str, target_temp: float = -20.0):
+    def __init__(self, site_id: str, room_id: str, target_temp: float = -20.0, clock=None):
+        self.clock = clock or WALL_CLOCK
         self.sensor_id = f"sensor-room-{site_id}-{room_id}"
         self.site_id = site_id
         self.room_id = room_id
@@ -131,7 +178,7 @@ class ColdRoomSensor:
             site_id=self.site_id,
             room_id=self.room_id,
             asset_type="cold_room",
-            timestamp=datetime.now(timezone.utc).isoformat(),
+            timestamp=self.clock.now().isoformat(),
             temperature_c=round(self.current_temp + temp_noise, 2),
             humidity_pct=round(self.humidity + humidity_noise, 1),
             door_open=self.door_open,
@@ -143,14 +190,14 @@ class ColdRoomSensor:
     def _simulate_door_events(self):
         if self.door_open:
             if self.door_open_since:
-                open_duration = time.time() - self.door_open_since
+                open_duration = self.clock.time() - self.door_open_since
                 if open_duration > random.uniform(30, 120):
                     self.door_open = False
                     self.door_open_since = None
         else:
             if random.random() < 0.02:
                 self.door_open = True
-                self.door_open_since = time.time()
+                self.door_open_since = self.clock.time()
 
     def _simulate_compressor_events(self):
         if self.compressor_running:
@@ -197,7 +244,8 @@ class TruckSensor:
     }
 
     def __init__(self, truck_id: str, fleet_id: str = "fleet1",
-                 target_temp: float = -18.0, route_name: str = None):
+                 target_temp: float = -18.0, route_name: str = None, clock=None):
+        self.clock = clock or WALL_CLOCK
         self.sensor_id = f"sensor-truck-{truck_id}"
         self.truck_id = truck_id
         self.fleet_id = fleet_id
@@ -250,7 +298,7 @@ class TruckSensor:
             truck_id=self.truck_id,
             fleet_id=self.fleet_id,
             asset_type="refrigerated_truck",
-            timestamp=datetime.now(timezone.utc).isoformat(),
+            timestamp=self.clock.now().isoformat(),
             temperature_c=round(self.current_temp + temp_noise, 2),
             humidity_pct=round(self.humidity + humidity_noise, 1),
             door_open=self.door_open,
@@ -276,7 +324,7 @@ class TruckSensor:
                 self.engine_running = False
                 if self._cmd_door_open is None:
                     self.door_open = True
-                    self.door_open_since = time.time()
+                    self.door_open_since = self.clock.time()
 
         current_wp = self.route[self.route_index]
         next_wp = self.route[(self.route_index + 1) % len(self.route)]
@@ -288,7 +336,7 @@ class TruckSensor:
 
     def _simulate_door_events(self):
         if self.door_open and self.door_open_since:
-            open_duration = time.time() - self.door_open_since
+            open_duration = self.clock.time() - self.door_open_since
             if open_duration > random.uniform(60, 300):
                 self.door_open = False
                 self.door_open_since = None
@@ -318,33 +366,76 @@ class TruckSensor:
         return f"fleet/{self.truck_id}/telemetry"
 
 
+def physics_steps(last_step: Optional[float], due: float) -> Tuple[int, float]:
+    """Dynamics steps owed by a publish at `due`, and the new last-step time."""
+    if last_step is None:
+        return 1, due
+    steps = int((due - last_step) / PUBLISH_INTERVAL + 1e-6)
+    if steps > MAX_STEPS_PER_PUBLISH:
+        return MAX_STEPS_PER_PUBLISH, due
+    return steps, last_step + steps * PUBLISH_INTERVAL
+
+
+def asset_identity(sensor) -> Tuple[str, str]:
+    """(asset_type, asset_id) of a sensor, as the state engine keys it."""
+    if isinstance(sensor, TruckSensor):
+        return "refrigerated_truck", sensor.truck_id
+    return "cold_room", sensor.sensor_id
+
+
+def match_asset(index: dict, asset_id: str):
+    """Look up an asset key, falling back to a case/separator-insensitive match."""
+    # Direct lookup
+    hit = index.get(asset_id)
+    if hit is not None:
+        return hit
+
+    # Try case-insensitive and partial match
+    asset_lower = asset_id.lower().replace("-", "").replace("_", "")
+    for key, value in index.items():
+        if key.lower().replace("-", "").replace("_", "") == asset_lower:
+            return value
+
+    return None
+
+
 class SensorFleetSimulator:
     """Manages a fleet of simulated sensors with command handling"""
 
-    def __init__(self, num_cold_rooms: int = 10, num_trucks: int = 12):
+    def __init__(self, num_cold_rooms: int = 10, num_trucks: int = 12, clock=None,
+                 room_offset: int = 0, truck_offset: int = 0, command_queue=None,
+                 name: str = "cold-chain-simulator"):
+        self.clock = clock or WALL_CLOCK
         self.sensors = []
         self.client: Optional[mqtt.Client] = None
         self.running = False
+        self.name = name
+
+        self._init_commands(command_queue)
+        self._init_publishing()
+
+        # sensor_id -> (last dynamics step time, last telemetry)
+        self._samples = {}
 
         # Index for fast command lookup
         self._sensor_index = {}
 
-        sites = ["site1", "site2", "site3"]
-        for i in range(num_cold_rooms):
+        sites = SITES
+        for i in range(room_offset, room_offset + num_cold_rooms):
             site = sites[i % len(sites)]
             room_id = f"room{i + 1}"
             target_temp = random.choice([-20, -18, -15, 2, 4, 8])
-            sensor = ColdRoomSensor(site, room_id, target_temp)
+            sensor = ColdRoomSensor(site, room_id, target_temp, clock=self.clock)
             self.sensors.append(sensor)
             # Index by multiple keys for flexible matching
             self._sensor_index[sensor.sensor_id] = sensor
             self._sensor_index[f"{site}-{room_id}"] = sensor
             self._sensor_index[f"cold-room-{site}-{room_id}"] = sensor
 
-        for i in range(num_trucks):
+        for i in range(truck_offset, truck_offset + num_trucks):
             truck_id = f"truck{i + 1:02d}"
             target_temp = random.choice([-18, -15, 2, 4])
-            sensor = TruckSensor(truck_id, target_temp=target_temp)
+            sensor = TruckSensor(truck_id, target_temp=target_temp, clock=self.clock)
             self.sensors.append(sensor)
             self._sensor_index[sensor.sensor_id] = sensor
             self._sensor_index[truck_id] = sensor
@@ -354,20 +445,30 @@ class SensorFleetSimulator:
         print(f"  - {num_cold_rooms} cold rooms across {len(sites)} sites")
         print(f"  - {num_trucks} refrigerated trucks")
 
-    def _find_sensor(self, asset_id: str):
-        """Find a sensor by various ID formats."""
-        # Direct lookup
-        sensor = self._sensor_index.get(asset_id)
-        if sensor:
-            return sensor
+    def _init_commands(self, command_queue):
+        """Set up the command inbox and the expiry wheel.
 
-        # Try case-insensitive and partial match
-        asset_lower = asset_id.lower().replace("-", "").replace("_", "")
-        for key, s in self._sensor_index.items():
-            if key.lower().replace("-", "").replace("_", "") == asset_lower:
-                return s
+        Commands are only ever applied on the main loop: the MQTT thread (or,
+        in sharded mode, the parent process) puts them on the inbox, and
+        timed overrides are lifted by the wheel when the loop advances it.
+        """
+        self.subscribe_commands = command_queue is None
+        self.command_queue = queue.Queue() if command_queue is None else command_queue
+        self.timers = TimerWheel(tick=COMMAND_TICK, start=self.clock.time())
 
-        return None
+    def _init_publishing(self):
+        """Set up the optional edge filter and gateway bundler."""
+        self.report_filter = ReportFilter() if REPORT_BY_EXCEPTION else None
+        self.gateway = GatewayBundler(GATEWAY_MAX_DELAY, GATEWAY_MAX_READINGS) if GATEWAY_MODE else None
+        self.bundles_sent = 0
+
+    def _expire_later(self, key, duration: float, callback):
+        """Schedule an override to be lifted, replacing any pending expiry for the same key."""
+        self.timers.schedule(self.clock.time() + duration, key, callback)
+
+    def _find_sensor(self, asset_id: str):
+        """Find a sensor by various ID formats."""
+        return match_asset(self._sensor_index, asset_id)
 
     def _setup_command_handler(self):
         """Subscribe to command topics for simulation control."""
@@ -388,15 +489,7 @@ class SensorFleetSimulator:
                 command_type = parts[2]
 
                 print(f"[CMD] Received: {command_type} {action} on {target_id} for {duration}s")
-
-                if command_type == "door":
-                    self._handle_door_command(target_id, action, duration)
-                elif command_type == "compressor":
-                    self._handle_compressor_command(target_id, action, duration)
-                elif command_type == "power":
-                    self._handle_power_command(target_id, action, duration)
-                else:
-                    print(f"[CMD] Unknown command type: {command_type}")
+                self.command_queue.put((command_type, target_id, action, duration))
 
             except Exception as e:
                 print(f"[CMD] Error handling command: {e}")
@@ -405,6 +498,29 @@ class SensorFleetSimulator:
         self.client.message_callback_add("commands/#", on_command)
         print("[CMD] Subscribed to commands/# for simulation control")
 
+    def handle_command(self, command_type: str, target_id: str, action: str, duration: int):
+        """Dispatch a parsed command to its handler."""
+        if command_type == "door":
+            self._handle_door_command(target_id, action, duration)
+        elif command_type == "compressor":
+            self._handle_compressor_command(target_id, action, duration)
+        elif command_type == "power":
+            self._handle_power_command(target_id, action, duration)
+        else:
+            print(f"[CMD] Unknown command type: {command_type}")
+
+    def _drain_command_queue(self):
+        """Apply commands received since the last loop iteration."""
+        while True:
+            try:
+                command = self.command_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self.handle_command(*command)
+            except Exception as e:
+                print(f"[CMD] Error handling command: {e}")
+
     def _handle_door_command(self, asset_id: str, action: str, duration: int):
         """Handle door open/close commands."""
         sensor = self._find_sensor(asset_id)
@@ -415,7 +531,7 @@ class SensorFleetSimulator:
         if action == "open":
             sensor._cmd_door_open = True
             sensor.door_open = True
-            sensor.door_open_since = time.time()
+            sensor.door_open_since = self.clock.time()
             print(f"[CMD] ✓ Opened door on {asset_id} for {duration}s")
 
             def auto_close():
@@ -424,9 +540,10 @@ class SensorFleetSimulator:
                 sensor.door_open_since = None
                 print(f"[CMD] ✓ Auto-closed door on {asset_id}")
 
-            threading.Timer(duration, auto_close).start()
+            self._expire_later(("door", sensor.sensor_id), duration, auto_close)
 
         elif action == "close":
+            self.timers.cancel(("door", sensor.sensor_id))
             sensor._cmd_door_open = None
             sensor.door_open = False
             sensor.door_open_since = None
@@ -449,9 +566,10 @@ class SensorFleetSimulator:
                 sensor.compressor_running = True
                 print(f"[CMD] ✓ Compressor restored on {asset_id}")
 
-            threading.Timer(duration, auto_restore).start()
+            self._expire_later(("compressor", sensor.sensor_id), duration, auto_restore)
 
         elif action == "restore":
+            self.timers.cancel(("compressor", sensor.sensor_id))
             sensor._cmd_compressor_off = None
             sensor.compressor_running = True
             print(f"[CMD] ✓ Compressor restored on {asset_id}")
@@ -479,9 +597,10 @@ class SensorFleetSimulator:
                     s.power_status = "normal"
                 print(f"[CMD] ✓ Power restored at {site_id}")
 
-            threading.Timer(duration, auto_restore).start()
+            self._expire_later(("power", site_id), duration, auto_restore)
 
         elif action == "restore":
+            self.timers.cancel(("power", site_id))
             for s in affected:
                 s._cmd_power_outage = None
                 s.compressor_running = True
@@ -491,15 +610,16 @@ class SensorFleetSimulator:
     def connect_mqtt(self):
         """Establish MQTT connection"""
         self.client = mqtt.Client(
-            client_id=f"cold-chain-simulator-{random.randint(1000, 9999)}",
+            client_id=f"{self.name}-{random.randint(1000, 9999)}",
             protocol=mqtt.MQTTv311
         )
 
         def on_connect(client, userdata, flags, rc):
             if rc == 0:
                 print(f"Connected to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}")
-                # Re-subscribe on reconnect
-                self._setup_command_handler()
+                # Re-subscribe on reconnect (shards get commands from the parent instead)
+                if self.subscribe_commands:
+                    self._setup_command_handler()
             else:
                 print(f"Failed to connect, return code: {rc}")
 
@@ -522,10 +642,16 @@ class SensorFleetSimulator:
         if not self.client:
             return False
 
-        topic = sensor.mqtt_topic
-        payload = json.dumps(asdict(telemetry))
+        return self.publish_payload(sensor.mqtt_topic, asdict(telemetry))
+
+    def publish_payload(self, topic: str, payload: dict):
+        """Publish a telemetry dict to an MQTT topic"""
+        if not self.client:
+            return False
 
-        result = self.client.publish(topic, payload, qos=MQTT_QOS)
+        data, _ = encode(payload, binary=TELEMETRY_FORMAT == "binary")
+        result = self.client.publish(topic, data, qos=MQTT_QOS)
+        self._last_publish = result
 
         if result.rc == mqtt.MQTT_ERR_SUCCESS:
             return True
@@ -533,6 +659,112 @@ class SensorFleetSimulator:
             print(f"Publish failed for {topic}: {result.rc}")
             return False
 
+    def build_schedule(self, start: float) -> PublishScheduler:
+        """Stagger every sensor across its own publish interval (see profile simulator.publish_intervals)."""
+        groups = {}
+        for sensor in self.sensors:
+            interval = get_publish_interval(*asset_identity(sensor), PUBLISH_INTERVAL)
+            groups.setdefault(interval, []).append(sensor)
+
+        scheduler = PublishScheduler()
+        for interval, sensors in groups.items():
+            scheduler.add_staggered(sensors, interval, start)
+        return scheduler
+
+    def publish_due(self, scheduler: PublishScheduler, now: float) -> int:
+        """Publish every sensor whose slot is due. Returns publish count."""
+        published = 0
+        for sensor, due in scheduler.pop_due(now):
+            payload = asdict(self._sample(sensor, due))
+            if self.report_filter and not self.report_filter.should_publish(
+                    *asset_identity(sensor), payload, now):
+                continue
+            if self.emit(sensor.mqtt_topic, payload, now):
+                published += 1
+        return published
+
+    def emit(self, topic: str, payload: dict, now: float) -> bool:
+        """Publish a reading, or hand it to the gateway bundler in gateway mode."""
+        if self.gateway is None:
+            return self.publish_payload(topic, payload)
+
+        full = self.gateway.add(topic, payload, now)
+        if full:
+            self.publish_bundle(*full)
+        return True
+
+    def publish_bundle(self, gateway: tuple, readings: list) -> bool:
+        """Publish one gateway bundle carrying many readings"""
+        gateway_type, gateway_id = gateway
+        bundle = {
+            "gateway_id": gateway_id,
+            "gateway_type": gateway_type,
+            "timestamp": self.clock.now().isoformat(),
+            "readings": readings,
+        }
+        self.bundles_sent += 1
+        return self.publish_payload(bundle_topic(gateway_type, gateway_id), bundle)
+
+    def flush_bundles(self, now: float, flush_all: bool = False):
+        """Publish every gateway bundle that has waited GATEWAY_MAX_DELAY."""
+        if self.gateway is not None:
+            for gateway, readings in self.gateway.pop_due(now, flush_all):
+                self.publish_bundle(gateway, readings)
+
+    def _sample(self, sensor, due: float):
+        """Latest reading for a sensor, stepping its dynamics once per PUBLISH_INTERVAL elapsed.
+
+        The thermal model is tuned per PUBLISH_INTERVAL step, so a sensor that
+        publishes faster re-sends its current reading with a fresh timestamp
+        rather than warming up faster.
+        """
+        last_step, telemetry = self._samples.get(sensor.sensor_id, (None, None))
+        steps, stepped_at = physics_steps(last_step, due)
+        if steps == 0:
+            return replace(telemetry, timestamp=self.clock.now().isoformat())
+
+        for _ in range(steps):
+            telemetry = sensor.simulate_step()
+        self._samples[sensor.sensor_id] = (stepped_at, telemetry)
+        return telemetry
+
+    def print_status(self):
+        """Print a periodic status line for one truck and one room."""
+        truck = next((s for s in self.sensors if isinstance(s, TruckSensor)), None)
+        room = next((s for s in self.sensors if isinstance(s, ColdRoomSensor)), None)
+
+        if truck:
+            print(f"  Truck {truck.truck_id}: {truck.current_temp:.1f}°C, "
+                  f"GPS: ({truck.latitude:.4f}, {truck.longitude:.4f}), "
+                  f"Speed: {truck.speed:.0f} km/h, "
+                  f"Door: {'OPEN' if truck.door_open else 'closed'}, "
+                  f"Compressor: {'ON' if truck.compressor_running else 'OFF'}")
+        if room:
+            print(f"  Room {room.room_id}: {room.current_temp:.1f}°C, "
+                  f"Door: {'OPEN' if room.door_open else 'closed'}, "
+                  f"Compressor: {'ON' if room.compressor_running else 'OFF'}, "
+                  f"Power: {room.power_status}")
+
+        # Show any active command overrides
+        cmd_active = []
+        for s in self.sensors:
+            if getattr(s, '_cmd_door_open', None) is not None:
+                name = getattr(s, 'truck_id', None) or s.sensor_id
+                cmd_active.append(f"{name}:door_open")
+            if getattr(s, '_cmd_compressor_off', None) is not None:
+                name = getattr(s, 'truck_id', None) or s.sensor_id
+                cmd_active.append(f"{name}:compressor_off")
+            if getattr(s, '_cmd_power_outage', None) is not None:
+                cmd_active.append(f"{s.sensor_id}:power_outage")
+        if cmd_active:
+            print(f"  [Active Commands] {', '.join(cmd_active)}")
+
+    def _drain_publishes(self):
+        """Wait for the last publish so a virtual-time run can't outrun the broker."""
+        last = getattr(self, "_last_publish", None)
+        if last is not None and last.rc == mqtt.MQTT_ERR_SUCCESS:
+            last.wait_for_publish()
+
     def run(self):
         """Main simulation loop"""
         if not self.connect_mqtt():
@@ -540,60 +772,78 @@ class SensorFleetSimulator:
             return
 
         self.running = True
-        iteration = 0
+        total_published = 0
+        window_published = 0
+        unsynced = 0
+        started = time.time()
+
+        start = self.clock.time()
+        scheduler = self.build_schedule(start)
+
+        # In virtual time, stop at the end of the window and report once per simulated hour
+        end_time = start + SIM_DURATION if self.clock.virtual else None
+        status_window = 3600.0 if self.clock.virtual else 10 * PUBLISH_INTERVAL
+        next_status = start + status_window
 
         print(f"\nStarting telemetry simulation (interval: {PUBLISH_INTERVAL}s)")
+        if self.clock.virtual:
+            print(f"Virtual clock: {self.clock.now().isoformat()} + {SIM_DURATION:.0f}s of event time")
         print(f"Command handling: ACTIVE (listening on commands/#)")
+        if self.report_filter:
+            print(f"Report by exception: ON (heartbeat {self.report_filter.heartbeat:.0f}s)")
+        if self.gateway:
+            print(f"Gateway mode: ON (bundles per site/fleet, max delay {GATEWAY_MAX_DELAY}s)")
         print("-" * 60)
 
         try:
             while self.running:
-                iteration += 1
-                published = 0
-
-                for sensor in self.sensors:
-                    telemetry = sensor.simulate_step()
-                    if self.publish_telemetry(sensor, telemetry):
-                        published += 1
-
-                if iteration % 10 == 0:
-                    truck = next((s for s in self.sensors if isinstance(s, TruckSensor)), None)
-                    room = next((s for s in self.sensors if isinstance(s, ColdRoomSensor)), None)
-
-                    print(f"\n[Iteration {iteration}] Published {published}/{len(self.sensors)} messages")
-                    if truck:
-                        print(f"  Truck {truck.truck_id}: {truck.current_temp:.1f}°C, "
-                              f"GPS: ({truck.latitude:.4f}, {truck.longitude:.4f}), "
-                              f"Speed: {truck.speed:.0f} km/h, "
-                              f"Door: {'OPEN' if truck.door_open else 'closed'}, "
-                              f"Compressor: {'ON' if truck.compressor_running else 'OFF'}")
-                    if room:
-                        print(f"  Room {room.room_id}: {room.current_temp:.1f}°C, "
-                              f"Door: {'OPEN' if room.door_open else 'closed'}, "
-                              f"Compressor: {'ON' if room.compressor_running else 'OFF'}, "
-                              f"Power: {room.power_status}")
-
-                    # Show any active command overrides
-                    cmd_active = []
-                    for s in self.sensors:
-                        if getattr(s, '_cmd_door_open', None) is not None:
-                            name = getattr(s, 'truck_id', None) or s.sensor_id
-                            cmd_active.append(f"{name}:door_open")
-                        if getattr(s, '_cmd_compressor_off', None) is not None:
-                            name = getattr(s, 'truck_id', None) or s.sensor_id
-                            cmd_active.append(f"{name}:compressor_off")
-                        if getattr(s, '_cmd_power_outage', None) is not None:
-                            cmd_active.append(f"{s.sensor_id}:power_outage")
-                    if cmd_active:
-                        print(f"  [Active Commands] {', '.join(cmd_active)}")
-
-                time.sleep(PUBLISH_INTERVAL)
+                now = self.clock.time()
+                if end_time is not None and now >= end_time:
+                    break
+
+                self._drain_command_queue()
+                self.timers.advance(now)
+
+                published = self.publish_due(scheduler, now)
+                self.flush_bundles(now)
+                total_published += published
+                window_published += published
+                unsynced += published
+
+                if now >= next_status:
+                    iteration = int((now - start) / PUBLISH_INTERVAL)
+                    skipped = f", {scheduler.skipped} slots skipped" if scheduler.skipped else ""
+                    if self.report_filter:
+                        skipped += f", {self.report_filter.suppressed} suppressed by exception reporting"
+                    if self.gateway:
+                        skipped += f", {self.bundles_sent} gateway bundles"
+                    print(f"\n[Iteration {iteration}] Published {window_published} messages in "
+                          f"{status_window:.0f}s ({window_published / status_window:.1f} msg/s{skipped})")
+                    self.print_status()
+                    next_status += status_window
+                    window_published = 0
+
+                if self.clock.virtual and unsynced >= 1000:
+                    self._drain_publishes()
+                    unsynced = 0
+
+                next_flush = self.gateway.next_flush() if self.gateway else None
+                next_due = min(t for t in (scheduler.next_due(), self.timers.next_expiry(),
+                                           next_flush, now + PUBLISH_INTERVAL) if t is not None)
+                self.clock.sleep(max(0.0, next_due - self.clock.time()))
+
+            if self.clock.virtual:
+                elapsed = time.time() - started
+                bundled = f" in {self.bundles_sent} gateway bundles" if self.gateway else ""
+                print(f"\nGenerated {total_published} messages{bundled} up to {self.clock.now().isoformat()} "
+                      f"in {elapsed:.1f}s ({total_published / max(elapsed, 1e-9):.0f} msg/s)")
 
         except KeyboardInterrupt:
             print("\n\nShutting down simulator...")
         finally:
             self.running = False
             if self.client:
+                self.flush_bundles(self.clock.time(), flush_all=True)
                 self.client.loop_stop()
                 self.client.disconnect()
             print("Simulator stopped.")
@@ -602,6 +852,336 @@ class SensorFleetSimulator:
         self.running = False
 
 
+class VectorizedFleetSimulator(SensorFleetSimulator):
+    """SensorFleetSimulator backed by the NumPy struct-of-arrays engine.
+
+    Used for load tests with very large fleets: the whole fleet advances in
+    one VectorizedFleet.step() instead of one simulate_step() per sensor.
+    """
+
+    def __init__(self, num_cold_rooms: int = 10, num_trucks: int = 12,
+                 seed: Optional[int] = None, clock=None, room_offset: int = 0,
+                 truck_offset: int = 0, command_queue=None, name: str = "cold-chain-simulator"):
+        self.clock = clock or WALL_CLOCK
+        self.sensors = []
+        self.client: Optional[mqtt.Client] = None
+        self.running = False
+        self.name = name
+        self._init_commands(command_queue)
+        self._init_publishing()
+        self._samples = {}
+        self.fleet = VectorizedFleet(num_cold_rooms, num_trucks, seed=seed,
+                                     room_offset=room_offset, truck_offset=truck_offset)
+
+        print(f"Initialized {len(self.fleet)} sensors (vectorized engine):")
+        print(f"  - {num_cold_rooms} cold rooms across {len(SITES)} sites")
+        print(f"  - {num_trucks} refrigerated trucks")
+
+    def build_schedule(self, start: float) -> PublishScheduler:
+        """Stagger SIM_BATCH_SIZE-row batches across each asset type's interval.
+
+        The vectorized engine schedules per asset type only; per-asset
+        intervals in the profile apply to the object engine.
+        """
+        scheduler = PublishScheduler()
+        for kind, asset_type, cols in (("room", "cold_room", self.fleet.rooms),
+                                       ("truck", "refrigerated_truck", self.fleet.trucks)):
+            if not cols.count:
+                continue
+            interval = get_publish_interval(asset_type, None, PUBLISH_INTERVAL)
+            batches = [(kind, slice(i, i + SIM_BATCH_SIZE)) for i in range(0, cols.count, SIM_BATCH_SIZE)]
+            scheduler.add_staggered(batches, interval, start)
+        return scheduler
+
+    def publish_due(self, scheduler: PublishScheduler, now: float) -> int:
+        published = 0
+        for (kind, rows), due in scheduler.pop_due(now):
+            last_step = self._samples.get((kind, rows.start))
+            steps, self._samples[(kind, rows.start)] = physics_steps(last_step, due)
+
+            if kind == "room":
+                step, telemetry = self.fleet.step_rooms, self.fleet.room_telemetry
+            else:
+                step, telemetry = self.fleet.step_trucks, self.fleet.truck_telemetry
+            for _ in range(steps):
+                step(self.clock.time(), rows)
+
+            for topic, payload in telemetry(self.clock.now().isoformat(), rows):
+                if self.report_filter and not self.report_filter.should_publish(
+                        payload["asset_type"], payload.get("truck_id") or payload["sensor_id"], payload, now):
+                    continue
+                if self.emit(topic, payload, now):
+                    published += 1
+        return published
+
+    def print_status(self):
+        rooms, trucks = self.fleet.rooms, self.fleet.trucks
+
+        if trucks.count:
+            print(f"  Truck {trucks.truck_ids[0]}: {trucks.current_temp[0]:.1f}°C, "
+                  f"GPS: ({trucks.latitude[0]:.4f}, {trucks.longitude[0]:.4f}), "
+                  f"Speed: {trucks.speed[0]:.0f} km/h, "
+                  f"Door: {'OPEN' if trucks.door_open[0] else 'closed'}, "
+                  f"Compressor: {'ON' if trucks.compressor_running[0] else 'OFF'}")
+        if rooms.count:
+            print(f"  Room {rooms.room_ids[0]}: {rooms.current_temp[0]:.1f}°C, "
+                  f"Door: {'OPEN' if rooms.door_open[0] else 'closed'}, "
+                  f"Compressor: {'ON' if rooms.compressor_running[0] else 'OFF'}, "
+                  f"Power: {POWER_STATUSES[rooms.power_status[0]]}")
+
+        overrides = {
+            "door_open": int((rooms.cmd_door_open != NO_OVERRIDE).sum()
+                             + (trucks.cmd_door_open != NO_OVERRIDE).sum()),
+            "compressor_off": int((rooms.cmd_compressor_off != NO_OVERRIDE).sum()
+                                  + (trucks.cmd_compressor_off != NO_OVERRIDE).sum()),
+            "power_outage": int((rooms.cmd_power_outage != NO_OVERRIDE).sum()),
+        }
+        cmd_active = [f"{name}={count}" for name, count in overrides.items() if count]
+        if cmd_active:
+            print(f"  [Active Commands] {', '.join(cmd_active)}")
+
+    def _columns(self, kind: str):
+        return self.fleet.rooms if kind == "room" else self.fleet.trucks
+
+    def _handle_door_command(self, asset_id: str, action: str, duration: int):
+        hit = self.fleet.find(asset_id)
+        if not hit:
+            print(f"[CMD] Unknown asset for door command: {asset_id}")
+            return
+        cols, row = self._columns(hit[0]), hit[1]
+
+        if action == "open":
+            cols.cmd_door_open[row] = 1
+            cols.door_open[row] = True
+            cols.door_open_since[row] = self.clock.time()
+            print(f"[CMD] ✓ Opened door on {asset_id} for {duration}s")
+
+            def auto_close():
+                cols.cmd_door_open[row] = NO_OVERRIDE
+                cols.door_open[row] = False
+                cols.door_open_since[row] = np.nan
+                print(f"[CMD] ✓ Auto-closed door on {asset_id}")
+
+            self._expire_later(("door",) + hit, duration, auto_close)
+
+        elif action == "close":
+            self.timers.cancel(("door",) + hit)
+            cols.cmd_door_open[row] = NO_OVERRIDE
+            cols.door_open[row] = False
+            cols.door_open_since[row] = np.nan
+            print(f"[CMD] ✓ Closed door on {asset_id}")
+
+    def _handle_compressor_command(self, asset_id: str, action: str, duration: int):
+        hit = self.fleet.find(asset_id)
+        if not hit:
+            print(f"[CMD] Unknown asset for compressor command: {asset_id}")
+            return
+        cols, row = self._columns(hit[0]), hit[1]
+
+        if action == "fail":
+            cols.cmd_compressor_off[row] = 1
+            cols.compressor_running[row] = False
+            print(f"[CMD] ✓ Compressor failed on {asset_id} for {duration}s")
+
+            def auto_restore():
+                cols.cmd_compressor_off[row] = NO_OVERRIDE
+                cols.compressor_running[row] = True
+                print(f"[CMD] ✓ Compressor restored on {asset_id}")
+
+            self._expire_later(("compressor",) + hit, duration, auto_restore)
+
+        elif action == "restore":
+            self.timers.cancel(("compressor",) + hit)
+            cols.cmd_compressor_off[row] = NO_OVERRIDE
+            cols.compressor_running[row] = True
+            print(f"[CMD] ✓ Compressor restored on {asset_id}")
+
+    def _handle_power_command(self, site_id: str, action: str, duration: int):
+        rooms = self.fleet.rooms
+        affected = self.fleet.site_rows(site_id)
+
+        if not len(affected):
+            print(f"[CMD] No cold rooms found at site: {site_id}")
+            return
+
+        def restore():
+            rooms.cmd_power_outage[affected] = NO_OVERRIDE
+            rooms.compressor_running[affected] = True
+            rooms.power_status[affected] = POWER_NORMAL
+
+        if action == "outage":
+            rooms.cmd_power_outage[affected] = 1
+            rooms.compressor_running[affected] = False
+            rooms.power_status[affected] = POWER_OUTAGE
+            print(f"[CMD] ✓ Power outage at {site_id}, {len(affected)} rooms affected for {duration}s")
+
+            def auto_restore():
+                restore()
+                print(f"[CMD] ✓ Power restored at {site_id}")
+
+            self._expire_later(("power", site_id), duration, auto_restore)
+
+        elif action == "restore":
+            self.timers.cancel(("power", site_id))
+            restore()
+            print(f"[CMD] ✓ Power restored at {site_id}")
+
+
+def split_range(total: int, parts: int) -> list:
+    """Split range(total) into `parts` contiguous (start, count) chunks."""
+    base, extra = divmod(total, parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        count = base + (1 if i < extra else 0)
+        chunks.append((start, count))
+        start += count
+    return chunks
+
+
+def run_shard(shard: int, rooms: tuple, trucks: tuple, command_queue,
+              engine: str, seed: Optional[int], virtual_start: Optional[float]):
+    """Worker process entry point: simulate one contiguous slice of the fleet."""
+    shard_seed = None if seed is None else seed + shard
+    if shard_seed is not None:
+        random.seed(shard_seed)
+    clock = VirtualClock(virtual_start) if virtual_start is not None else WALL_CLOCK
+
+    kwargs = dict(clock=clock, room_offset=rooms[0], truck_offset=trucks[0],
+                  command_queue=command_queue, name=f"cold-chain-simulator-shard{shard}")
+    if engine == "vectorized":
+        simulator = VectorizedFleetSimulator(rooms[1], trucks[1], seed=shard_seed, **kwargs)
+    else:
+        simulator = SensorFleetSimulator(rooms[1], trucks[1], **kwargs)
+    simulator.run()
+
+
+class ShardedFleetSimulator:
+    """Splits the fleet across worker processes, one MQTT connection per shard.
+
+    Shard k owns a stable, contiguous range of room and truck numbers, so
+    sensor IDs are the same as in single-process mode. The parent process
+    keeps the only commands/# subscription and forwards each command to the
+    shard that owns the target asset (power commands go to every shard with
+    rooms at that site).
+    """
+
+    def __init__(self, num_cold_rooms: int, num_trucks: int, shards: int,
+                 engine: str = "objects", seed: Optional[int] = None,
+                 virtual_start: Optional[float] = None):
+        self.shards = shards
+        self.engine = engine
+        self.seed = seed
+        self.virtual_start = virtual_start
+        self.client: Optional[mqtt.Client] = None
+        self.processes = []
+
+        self.room_ranges = split_range(num_cold_rooms, shards)
+        self.truck_ranges = split_range(num_trucks, shards)
+        self.queues = [multiprocessing.Queue() for _ in range(shards)]
+
+        # Routing tables: asset key -> shard, site -> shards with rooms there
+        self._asset_shards = {}
+        self._site_shards = {}
+        for shard, (start, count) in enumerate(self.room_ranges):
+            for i in range(start, start + count):
+                site, room_id = SITES[i % len(SITES)], f"room{i + 1}"
+                for key in (f"sensor-room-{site}-{room_id}", f"{site}-{room_id}", f"cold-room-{site}-{room_id}"):
+                    self._asset_shards[key] = shard
+                self._site_shards.setdefault(site, set()).add(shard)
+        for shard, (start, count) in enumerate(self.truck_ranges):
+            for i in range(start, start + count):
+                truck_id = f"truck{i + 1:02d}"
+                self._asset_shards[truck_id] = shard
+                self._asset_shards[f"sensor-truck-{truck_id}"] = shard
+
+        print(f"Sharded fleet: {num_cold_rooms} cold rooms + {num_trucks} trucks over {shards} processes")
+        for shard in range(shards):
+            rooms, trucks = self.room_ranges[shard], self.truck_ranges[shard]
+            print(f"  - shard {shard}: rooms {rooms[0] + 1}-{rooms[0] + rooms[1]}, "
+                  f"trucks {trucks[0] + 1}-{trucks[0] + trucks[1]}")
+
+    def route_command(self, command_type: str, target_id: str, action: str, duration: int):
+        """Forward a command to the shard(s) owning the target."""
+        if command_type == "power":
+            shards = sorted(self._site_shards.get(target_id, ()))
+        else:
+            shard = match_asset(self._asset_shards, target_id)
+            shards = [] if shard is None else [shard]
+
+        if not shards:
+            print(f"[CMD] Unknown target for {command_type} command: {target_id}")
+            return
+        for shard in shards:
+            self.queues[shard].put((command_type, target_id, action, duration))
+        print(f"[CMD] Routed {command_type} {action} on {target_id} to shard(s) {shards}")
+
+    def connect_mqtt(self):
+        """Connect the parent's command-routing MQTT client"""
+        self.client = mqtt.Client(
+            client_id=f"cold-chain-simulator-router-{random.randint(1000, 9999)}",
+            protocol=mqtt.MQTTv311
+        )
+
+        def on_command(client, userdata, msg):
+            try:
+                parts = msg.topic.split("/")
+                if len(parts) < 3:
+                    print(f"[CMD] Invalid command topic: {msg.topic}")
+                    return
+                payload = json.loads(msg.payload.decode("utf-8"))
+                self.route_command(parts[2], parts[1], payload.get("action", ""),
+                                   payload.get("duration_seconds", 60))
+            except Exception as e:
+                print(f"[CMD] Error routing command: {e}")
+
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                client.subscribe("commands/#")
+                print("[CMD] Router subscribed to commands/#")
+            else:
+                print(f"Failed to connect, return code: {rc}")
+
+        self.client.on_connect = on_connect
+        self.client.on_message = on_command
+
+        try:
+            self.client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
+            self.client.loop_start()
+            return True
+        except Exception as e:
+            print(f"MQTT connection error: {e}")
+            return False
+
+    def run(self):
+        """Start one worker process per shard and route commands until they exit"""
+        if not self.connect_mqtt():
+            print("Failed to connect to MQTT broker. Exiting.")
+            return
+
+        for shard in range(self.shards):
+            process = multiprocessing.Process(
+                target=run_shard,
+                args=(shard, self.room_ranges[shard], self.truck_ranges[shard], self.queues[shard],
+                      self.engine, self.seed, self.virtual_start),
+                name=f"simulator-shard{shard}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+        try:
+            for process in self.processes:
+                process.join()
+        except KeyboardInterrupt:
+            print("\n\nShutting down sharded simulator...")
+            for process in self.processes:
+                process.terminate()
+        finally:
+            self.client.loop_stop()
+            self.client.disconnect()
+            print("Sharded simulator stopped.")
+
+
 def main():
     num_rooms = int(os.getenv("NUM_COLD_ROOMS", 10))
     num_trucks = int(os.getenv("NUM_TRUCKS", 12))
@@ -615,10 +1195,32 @@ def main():
     print(f"  Publish Interval: {PUBLISH_INTERVAL}s")
     print(f"  Cold Rooms: {num_rooms}")
     print(f"  Trucks: {num_trucks}")
+    print(f"  Engine: {SIM_ENGINE}")
+    print(f"  Clock: {SIM_CLOCK}" + (f" (seed {SIM_SEED})" if SIM_SEED else ""))
+    print(f"  Shards: {SIM_SHARDS}")
     print(f"  Command Handling: ENABLED (commands/#)")
     print()
 
-    simulator = SensorFleetSimulator(num_rooms, num_trucks)
+    seed = int(SIM_SEED) if SIM_SEED else None
+    if seed is not None:
+        random.seed(seed)
+
+    clock = WALL_CLOCK
+    if SIM_CLOCK == "virtual":
+        if SIM_START:
+            start = datetime.fromisoformat(SIM_START.replace("Z", "+00:00"))
+        else:
+            start = datetime.now(timezone.utc) - timedelta(seconds=SIM_DURATION)
+        clock = VirtualClock(start.timestamp())
+
+    if SIM_SHARDS > 1:
+        virtual_start = clock.time() if clock.virtual else None
+        simulator = ShardedFleetSimulator(num_rooms, num_trucks, SIM_SHARDS, engine=SIM_ENGINE,
+                                          seed=seed, virtual_start=virtual_start)
+    elif SIM_ENGINE == "vectorized":
+        simulator = VectorizedFleetSimulator(num_rooms, num_trucks, seed=seed, clock=clock)
+    else:
+        simulator = SensorFleetSimulator(num_rooms, num_trucks, clock=clock)
     simulator.run()
 
 
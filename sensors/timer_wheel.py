@@ -0,0 +1,104 @@
+"""
+Cold Chain Digital Twin - Timer Wheel
+Hierarchical timing wheel for simulator command expiries (door auto-close,
+compressor and power auto-restore).
+
+One wheel replaces a threading.Timer per command: scheduling and cancelling
+are O(1), and expiries only fire when the owning loop calls advance(), so
+overrides are applied and lifted on the simulator's main thread at tick
+boundaries instead of from background threads.
+
+Levels are arrays of slots (256, 64, 64, 64 by default). Level 0 holds
+timers due within the next 256 ticks; each higher level covers 64 times
+the span of the one below. When a lower level wraps, the matching slot of
+the next level up is cascaded down, so each timer is touched at most once
+per level.
+"""
+
+from typing import Callable, Hashable, Optional
+
+
+class TimerWheel:
+    """Keyed one-shot timers on a hierarchical wheel with a fixed tick"""
+
+    def __init__(self, tick: float = 1.0, start: float = 0.0, bits: tuple = (8, 6, 6, 6)):
+        self.tick = tick
+        self._bits = bits
+        self._shifts = [sum(bits[:level]) for level in range(len(bits))]
+        self._levels = [[[] for _ in range(1 << b)] for b in bits]
+        self._max_delta = (1 << sum(bits)) - 1
+        self._now_tick = int(start // tick)
+        self._pending = {}  # key -> timer entry [expiry_tick, key, callback, live]
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def schedule(self, due: float, key: Hashable, callback: Callable[[], None]):
+        """Run `callback` at the first tick boundary at or after `due`.
+
+        A timer already pending under `key` is replaced, so re-issuing a
+        command restarts its expiry instead of stacking a second one.
+        """
+        self.cancel(key)
+        expiry = max(-int(-due // self.tick), self._now_tick + 1)
+        entry = [expiry, key, callback, True]
+        self._pending[key] = entry
+        self._insert(entry)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the timer pending under `key`. Returns False if there was none."""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = False  # dropped lazily when its slot is next visited
+        return True
+
+    def next_expiry(self) -> Optional[float]:
+        """Time of the next tick boundary if any timer is pending, else None."""
+        if not self._pending:
+            return None
+        return (self._now_tick + 1) * self.tick
+
+    def advance(self, now: float) -> int:
+        """Fire every timer due at or before `now`, in expiry order. Returns fired count."""
+        target = int(now // self.tick)
+        fired = 0
+        while self._now_tick < target:
+            if not self._pending:
+                self._now_tick = target
+                break
+            self._now_tick += 1
+            self._cascade()
+
+            slot = self._levels[0][self._now_tick & ((1 << self._bits[0]) - 1)]
+            due, slot[:] = list(slot), []
+            for entry in due:
+                if not entry[3]:
+                    continue
+                del self._pending[entry[1]]
+                entry[3] = False
+                entry[2]()
+                fired += 1
+        return fired
+
+    def _insert(self, entry: list):
+        delta = min(entry[0] - self._now_tick, self._max_delta)
+        for level, shift in enumerate(self._shifts):
+            if delta < 1 << (shift + self._bits[level]) or level == len(self._bits) - 1:
+                # Timers beyond the wheel's range park in the top level and
+                # are re-inserted against their real expiry on each cascade
+                position = (self._now_tick + delta) >> shift
+                self._levels[level][position & ((1 << self._bits[level]) - 1)].append(entry)
+                return
+
+    def _cascade(self):
+        """Move the slots that just came into range down a level."""
+        for level in range(1, len(self._bits)):
+            if self._now_tick & ((1 << self._shifts[level]) - 1):
+                return
+            index = (self._now_tick >> self._shifts[level]) & ((1 << self._bits[level]) - 1)
+            slot = self._levels[level][index]
+            entries, slot[:] = list(slot), []
+            for entry in entries:
+                if entry[3]:
+                    self._insert(entry)
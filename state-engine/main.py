@@ -4,7 +4,8 @@ FastAPI REST API + Kafka Consumer
 """
 
 import os
-import json
+import time
+import socket
 import logging
 import asyncio
 from threading import Thread
@@ -16,7 +17,7 @@ from enum import Enum
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from confluent_kafka import Consumer
+from confluent_kafka import Consumer, TopicPartition, OFFSET_END
 
 from state_calculator import StateCalculator
 try:
@@ -25,7 +26,9 @@ except Exception:
     def publish_critical_alert(*a, **k): pass
 from profile_loader import get_profile_summary, reload_profile
 from redis_client import RedisClient
-from mongo_client import MongoDBClient
+from mongo_client import MongoDBClient, pick_tier
+from telemetry_codec import decode_message
+from twin_store import TwinStore
 
 # Logging
 logging.basicConfig(
@@ -38,10 +41,20 @@ logger = logging.getLogger(__name__)
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
 KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "state-engine")
 KAFKA_TOPICS = os.getenv("KAFKA_TOPICS", "coldchain.telemetry.trucks,coldchain.telemetry.rooms,coldchain.alerts")
+# Messages per consume() call and how long to wait for a batch to fill
+STATE_BATCH_SIZE = int(os.getenv("STATE_BATCH_SIZE", 500))
+STATE_BATCH_TIMEOUT = float(os.getenv("STATE_BATCH_TIMEOUT", 0.2))
+STATS_INTERVAL = int(os.getenv("STATS_INTERVAL", 30))
+# Serve current asset state from the in-process twin store instead of Redis
+TWIN_STORE = os.getenv("TWIN_STORE", "true").lower() == "true"
+# The twin feed replays readings from this long before its Redis load, to
+# cover clock skew between the producers' message timestamps and this pod
+TWIN_REPLAY_MARGIN = float(os.getenv("TWIN_REPLAY_MARGIN", 30))
 
 # Initialize clients
 redis_client = RedisClient()
 mongo_client = MongoDBClient()
+twin_store = TwinStore() if TWIN_STORE else None
 
 
 # =============================================================================
@@ -52,7 +65,7 @@ kafka_consumer_running = False
 
 
 def kafka_consumer_thread():
-    """Background thread to consume Kafka messages"""
+    """Background thread to consume Kafka messages in batches"""
     global kafka_consumer_running
 
     consumer_config = {
@@ -63,38 +76,69 @@ def kafka_consumer_thread():
     }
 
     consumer = Consumer(consumer_config)
-    consumer.subscribe(KAFKA_TOPICS.split(','))
+    catchup = {"started": None, "messages": 0}
 
-    logger.info("Kafka consumer started")
+    def on_assign(consumer, partitions):
+        # Measure how fast the backlog behind the new assignment is drained
+        catchup["started"], catchup["messages"] = time.time(), 0
+        logger.info(f"Assigned {len(partitions)} partitions")
+
+    consumer.subscribe(KAFKA_TOPICS.split(','), on_assign=on_assign)
+
+    logger.info(f"Kafka consumer started (batch {STATE_BATCH_SIZE}, timeout {STATE_BATCH_TIMEOUT}s)")
     kafka_consumer_running = True
 
     message_count = 0
+    written_count = 0
+    window_start, window_messages = time.time(), 0
 
     try:
         while kafka_consumer_running:
-            msg = consumer.poll(1.0)
-
-            if msg is None:
-                continue
-            if msg.error():
-                logger.error(f"Consumer error: {msg.error()}")
-                continue
+            msgs = consumer.consume(num_messages=STATE_BATCH_SIZE, timeout=STATE_BATCH_TIMEOUT)
 
-            try:
-                topic = msg.topic()
-                value = json.loads(msg.value().decode('utf-8'))
-
-                if topic == "coldchain.alerts":
-                    process_alert(value)
+            telemetry, alerts = [], []
+            for msg in msgs:
+                if msg.error():
+                    logger.error(f"Consumer error: {msg.error()}")
+                    continue
+                try:
+                    value = decode_message(msg.value(), msg.headers())
+                except Exception as e:
+                    logger.error(f"Processing error: {e}")
+                    continue
+                if msg.topic() == "coldchain.alerts":
+                    alerts.append(value)
                 else:
-                    process_telemetry(value)
-
-                message_count += 1
-                if message_count % 500 == 0:
-                    logger.info(f"State Engine processed {message_count} messages")
+                    telemetry.append(value)
 
+            try:
+                written_count += process_telemetry_batch(telemetry)
             except Exception as e:
                 logger.error(f"Processing error: {e}")
+            for alert in alerts:
+                try:
+                    process_alert(alert)
+                except Exception as e:
+                    logger.error(f"Processing error: {e}")
+
+            processed = len(telemetry) + len(alerts)
+            message_count += processed
+            window_messages += processed
+
+            if catchup["started"] is not None:
+                catchup["messages"] += processed
+                if len(msgs) < STATE_BATCH_SIZE:
+                    elapsed = time.time() - catchup["started"]
+                    if catchup["messages"]:
+                        logger.info(f"Caught up after assignment: {catchup['messages']} messages in "
+                                    f"{elapsed:.1f}s ({catchup['messages'] / max(elapsed, 1e-6):.0f} msg/s)")
+                    catchup["started"] = None
+
+            elapsed = time.time() - window_start
+            if elapsed >= STATS_INTERVAL and window_messages:
+                logger.info(f"State Engine processed {message_count} messages "
+                            f"({window_messages / elapsed:.0f} msg/s, {written_count} state writes)")
+                window_start, window_messages = time.time(), 0
 
     except Exception as e:
         logger.error(f"Kafka consumer error: {e}")
@@ -103,16 +147,104 @@ def kafka_consumer_thread():
         kafka_consumer_running = False
 
 
-def process_telemetry(telemetry: dict):
-    """Process telemetry and update state"""
-    asset_id = telemetry.get("truck_id") or telemetry.get("sensor_id")
-    if not asset_id:
-        return
+twin_feed_running = False
+
+
+def twin_feed_thread():
+    """Keep the twin store current with every asset's readings.
+
+    The state consumer above only sees the partitions assigned to this
+    replica, so the store reads all telemetry partitions through its own
+    per-pod consumer group (no offset commits). It waits for its partitions,
+    seeks them to the offsets from just before the Redis load, loads the
+    current states from Redis and then replays from those offsets, so no
+    reading written between the load and the assignment is missed; replayed
+    readings older than the loaded state are skipped by the store. Redis
+    stays the shared copy, written by the state consumer.
+    """
+    global twin_feed_running
+
+    consumer = Consumer({
+        'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
+        'group.id': f"{KAFKA_GROUP_ID}-twin-{socket.gethostname()}",
+        'auto.offset.reset': 'latest',
+        'enable.auto.commit': False,
+    })
+    load_started = int((time.time() - TWIN_REPLAY_MARGIN) * 1000)
+    assigned = []
+
+    def on_assign(consumer, partitions):
+        # Later assignments (partitions added to a topic) start from the same point
+        positions = consumer.offsets_for_times(
+            [TopicPartition(p.topic, p.partition, load_started) for p in partitions], timeout=10)
+        for p in positions:
+            if p.offset < 0:
+                p.offset = OFFSET_END
+        consumer.assign(positions)
+        assigned.extend(positions)
+        logger.info(f"Twin feed assigned {len(positions)} partitions")
+
+    consumer.subscribe([t for t in KAFKA_TOPICS.split(',') if t != "coldchain.alerts"], on_assign=on_assign)
+
+    try:
+        twin_feed_running = True
+        pending = []
+        while twin_feed_running and not assigned:
+            pending.extend(consumer.consume(num_messages=STATE_BATCH_SIZE, timeout=STATE_BATCH_TIMEOUT))
+
+        for doc in redis_client.get_all_assets():
+            twin_store.update(doc.pop("asset_id"), doc)
+        apply_twin_messages(pending)
+        twin_store.publish(force=True)
+        twin_store.ready = True
+        logger.info(f"Twin store loaded {len(twin_store.snapshot)} assets from Redis")
+
+        while twin_feed_running:
+            apply_twin_messages(consumer.consume(num_messages=STATE_BATCH_SIZE, timeout=STATE_BATCH_TIMEOUT))
+            twin_store.publish()
+    except Exception as e:
+        logger.error(f"Twin feed error: {e}")
+    finally:
+        twin_store.ready = False
+        twin_feed_running = False
+        consumer.close()
+
+
+def apply_twin_messages(msgs: list):
+    for msg in msgs:
+        if msg.error():
+            continue
+        try:
+            telemetry = decode_message(msg.value(), msg.headers())
+            asset_id = telemetry.get("truck_id") or telemetry.get("sensor_id")
+            if asset_id:
+                state_result = StateCalculator.calculate_state(telemetry)
+                twin_store.update(asset_id, build_state_doc(telemetry, state_result))
+        except Exception as e:
+            logger.error(f"Twin store update error: {e}")
+
+
+def build_indexes():
+    """Build the Redis state/type indexes once for state written before they existed"""
+    try:
+        if redis_client.is_indexed():
+            return
+        start = time.time()
+        count = redis_client.reindex()
+        logger.info(f"Indexed {count} assets by state and type in {time.time() - start:.1f}s")
+    except Exception as e:
+        logger.error(f"Failed to build asset indexes: {e}")
 
-    # Calculate state
-    state_result = StateCalculator.calculate_state(telemetry)
 
-    # Build state document
+def current_state(asset_id: str) -> Optional[dict]:
+    """Current state of one asset, from the twin store once it is loaded"""
+    if twin_store is not None and twin_store.ready:
+        return twin_store.snapshot.get(asset_id)
+    return redis_client.get_asset_state(asset_id)
+
+
+def build_state_doc(telemetry: dict, state_result: dict) -> dict:
+    """State document stored in Redis for one reading"""
     state_doc = {
         "asset_type": telemetry.get("asset_type"),
         "state": state_result["state"],
@@ -132,43 +264,86 @@ def process_telemetry(telemetry: dict):
             "longitude": telemetry.get("longitude"),
             "speed_kmh": telemetry.get("speed_kmh")
         }
+    return state_doc
 
-    # Read previous state BEFORE overwriting
-    previous = redis_client.get_asset_state(asset_id) or {}
-    previous_state = previous.get("state", "NORMAL")
-    # Store in Redis
-    redis_client.set_asset_state(asset_id, state_doc)
-
-    # Handle alerts — only on state transition to avoid alert flood
-    current_state = state_result["state"]
-
-    if current_state in ["WARNING", "CRITICAL"]:
-        if previous_state != current_state:
-            # State changed — fire a new alert
-            redis_client.set_active_alert(asset_id, {
-                "state": current_state,
-                "reasons": state_result["reasons"],
-                "temperature_c": telemetry.get("temperature_c")
-            })
-            if current_state == "CRITICAL":
-                try:
-                    publish_critical_alert(
-                        asset_id=asset_id,
-                        alert_type="STATE_TRANSITION",
-                        message="; ".join(state_result["reasons"]),
-                    )
-                    logger.info(f"SNS alert sent for {asset_id}")
-                except Exception as sns_err:
-                    logger.error(f"SNS publish error for {asset_id}: {sns_err}")
-        # else: same state, keep existing alert, don't flood
-    else:
-        redis_client.clear_alert(asset_id)
+
+def process_telemetry_batch(readings: list) -> int:
+    """Process a batch of telemetry and update state; returns assets written.
+
+    Each reading is evaluated here; Redis applies every asset's readings in
+    order in one atomic script call (RedisClient.apply_readings), skipping
+    out-of-order readings, storing only the final state and reporting which
+    readings were transitions into WARNING/CRITICAL. All calls for the batch
+    share one pipeline, and SNS is only sent for transitions Redis reported,
+    so replicas racing on an asset cannot both notify.
+    """
+    by_asset = {}
+    for telemetry in readings:
+        asset_id = telemetry.get("truck_id") or telemetry.get("sensor_id")
+        if not asset_id:
+            continue
+        try:
+            state_result = StateCalculator.calculate_state(telemetry)
+            current_state = state_result["state"]
+            alert_doc = None
+            if current_state in ["WARNING", "CRITICAL"]:
+                alert_doc = {
+                    "state": current_state,
+                    "reasons": state_result["reasons"],
+                    "temperature_c": telemetry.get("temperature_c")
+                }
+            state_doc = build_state_doc(telemetry, state_result)
+        except Exception as e:
+            # One malformed reading must not cost the rest of the batch
+            logger.error(f"Skipping unprocessable reading for {asset_id}: {e} ({str(telemetry)[:200]})")
+            continue
+        by_asset.setdefault(asset_id, []).append(
+            (current_state, telemetry.get("timestamp"), state_doc, alert_doc)
+        )
+    if not by_asset:
+        return 0
+
+    transitions = redis_client.apply_readings(by_asset)
+
+    for asset_id, positions in transitions.items():
+        for position in positions:
+            state, _, state_doc, _ = by_asset[asset_id][position - 1]
+            if state != "CRITICAL":
+                continue
+            try:
+                publish_critical_alert(
+                    asset_id=asset_id,
+                    alert_type="STATE_TRANSITION",
+                    message="; ".join(state_doc["reasons"]),
+                )
+                logger.info(f"SNS alert sent for {asset_id}")
+            except Exception as sns_err:
+                logger.error(f"SNS publish error for {asset_id}: {sns_err}")
+    return len(transitions)
+
+
+def process_telemetry(telemetry: dict):
+    """Process telemetry and update state"""
+    process_telemetry_batch([telemetry])
 
 
 def process_alert(alert: dict):
-    """Process alert from Kafka"""
+    """Process alert from Kafka (an incident event from the bridge)
+
+    Redis keeps one active alert per asset, so a RESOLVE hands it over to
+    the most severe incident the bridge reports as still open on the asset.
+    """
     asset_id = alert.get("asset_id")
-    if asset_id:
+    if not asset_id:
+        return
+    if alert.get("event") == "RESOLVE":
+        still_open = alert.get("still_open") or []
+        replacement = None
+        if still_open:
+            replacement = {"asset_id": asset_id, "asset_type": alert.get("asset_type"), "event": "ONGOING",
+                           **still_open[0], "detected_at": alert.get("detected_at")}
+        redis_client.clear_alert(asset_id, alert.get("incident_id"), replacement)
+    else:
         redis_client.set_active_alert(asset_id, alert)
 
 
@@ -179,13 +354,17 @@ def process_alert(alert: dict):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    Thread(target=build_indexes, daemon=True).start()
     thread = Thread(target=kafka_consumer_thread, daemon=True)
     thread.start()
+    if twin_store is not None:
+        Thread(target=twin_feed_thread, daemon=True).start()
     logger.info("State Engine started")
     yield
     # Shutdown
-    global kafka_consumer_running
+    global kafka_consumer_running, twin_feed_running
     kafka_consumer_running = False
+    twin_feed_running = False
     logger.info("State Engine shutting down")
 
 
@@ -276,21 +455,22 @@ async def get_all_assets(
     asset_type: Optional[AssetTypeFilter] = Query(None, description="Filter by type"),
 ):
     """Get all assets with current state"""
-    assets = redis_client.get_all_assets()
-
-    if state:
-        assets = [a for a in assets if a.get("state") == state.value]
-
-    if asset_type:
-        assets = [a for a in assets if a.get("asset_type") == asset_type.value]
-
-    return assets
+    if twin_store is not None and twin_store.ready:
+        return twin_store.snapshot.assets(
+            state=state.value if state else None,
+            asset_type=asset_type.value if asset_type else None,
+        )
+
+    return redis_client.get_assets(
+        state=state.value if state else None,
+        asset_type=asset_type.value if asset_type else None,
+    )
 
 
 @app.get("/assets/{asset_id}", response_model=AssetState)
 async def get_asset(asset_id: str):
     """Get current state for a specific asset"""
-    state = redis_client.get_asset_state(asset_id)
+    state = current_state(asset_id)
     if not state:
         raise HTTPException(status_code=404, detail=f"Asset {asset_id} not found")
     state["asset_id"] = asset_id
@@ -300,9 +480,9 @@ async def get_asset(asset_id: str):
 @app.get("/assets/{asset_id}/history")
 async def get_asset_history(
     asset_id: str,
-    hours: int = Query(24, ge=1, le=168, description="Hours of history (1-168)")
+    hours: int = Query(24, ge=1, le=2160, description="Hours of history (1-2160)")
 ):
-    """Get historical telemetry for an asset"""
+    """Get historical telemetry for an asset (archive-backed past the hot horizon)"""
     history = mongo_client.get_asset_history(asset_id, hours=hours)
     return {
         "asset_id": asset_id,
@@ -342,6 +522,15 @@ async def get_active_alerts():
 @app.get("/stats", response_model=StatsResponse)
 async def get_stats():
     """Get dashboard statistics"""
+    if twin_store is not None and twin_store.ready:
+        snapshot = twin_store.snapshot
+        return {
+            "total_assets": len(snapshot),
+            "state_counts": {name: snapshot.state_counts.get(name, 0) for name in ("NORMAL", "WARNING", "CRITICAL")},
+            "asset_types": {name: snapshot.type_counts.get(name, 0) for name in ("refrigerated_truck", "cold_room")},
+            "active_alerts": redis_client.count_active_alerts(),
+            "updated_at": datetime.utcnow().isoformat()
+        }
     stats = redis_client.get_stats()
     if not stats:
         raise HTTPException(status_code=500, detail="Failed to get stats")
@@ -376,11 +565,14 @@ async def get_asset_telemetry(
     """
     Temperature + humidity timeseries for an asset.
     Returns list sorted oldest→newest for chart rendering.
-    Source: MongoDB telemetry collection.
+    Source: MongoDB telemetry, or the 1m / 1h rollups when the window has
+    more raw readings than `limit` (see mongo_client.pick_tier).
     """
     try:
         docs = mongo_client.get_telemetry_history(asset_id, hours=hours, limit=limit)
-        return {"asset_id": asset_id, "hours": hours, "count": len(docs), "data": docs}
+        tier = pick_tier(hours, limit)
+        resolution = "raw" if tier is None or (docs and "samples" not in docs[0]) else tier[0]
+        return {"asset_id": asset_id, "hours": hours, "count": len(docs), "resolution": resolution, "data": docs}
     except Exception as e:
         logger.error(f"telemetry history error for {asset_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -394,7 +586,7 @@ async def get_door_activity(
     """
     Door open/close event timeline.
     Returns events with timestamp, event_type (open/close), duration_seconds.
-    Source: MongoDB telemetry — derived from door_open field transitions.
+    Source: MongoDB telemetry (Parquet archive past the hot horizon) — derived from door_open field transitions.
     """
     try:
         events = mongo_client.get_door_events(asset_id, hours=hours)
@@ -419,7 +611,7 @@ async def get_compressor_activity(
     """
     Compressor on/off event timeline.
     Returns events + runtime percentage over the window.
-    Source: MongoDB telemetry — derived from compressor_on field transitions.
+    Source: MongoDB telemetry (Parquet archive past the hot horizon) — derived from compressor_on field transitions.
     """
     try:
         events = mongo_client.get_compressor_events(asset_id, hours=hours)
@@ -492,7 +684,7 @@ async def get_asset_config(asset_id: str):
     Falls back to profile_loader summary if Redis key missing.
     """
     try:
-        state = redis_client.get_asset_state(asset_id)
+        state = current_state(asset_id)
         if not state:
             raise HTTPException(status_code=404, detail=f"Asset {asset_id} not found")
         profile = get_profile_summary()
@@ -522,12 +714,21 @@ async def get_asset_summary(
     Source: Redis (current) + MongoDB (history aggregation).
     """
     try:
-        state = redis_client.get_asset_state(asset_id)
+        state = current_state(asset_id)
         if not state:
             raise HTTPException(status_code=404, detail=f"Asset {asset_id} not found")
-        telemetry = mongo_client.get_telemetry_history(asset_id, hours=hours, limit=2000)
-        raw_temps = [t.get("temperature") or t.get("temperature_c") for t in telemetry]
-        temps = [t for t in raw_temps if t is not None]
+        temperature_stats = mongo_client.get_temperature_stats(asset_id, hours=hours)
+        if temperature_stats is None:
+            # No rollups for this window yet: fall back to raw readings
+            telemetry = mongo_client.get_telemetry_history(asset_id, hours=hours, limit=2000)
+            raw_temps = [t.get("temperature") or t.get("temperature_c") for t in telemetry]
+            temps = [t for t in raw_temps if t is not None]
+            temperature_stats = {
+                "min": round(min(temps), 2) if temps else None,
+                "max": round(max(temps), 2) if temps else None,
+                "avg": round(sum(temps) / len(temps), 2) if temps else None,
+                "samples": len(temps),
+            }
         alert_docs = mongo_client.get_asset_alerts(asset_id, hours=hours)
         return {
             "asset_id": asset_id,
@@ -536,12 +737,7 @@ async def get_asset_summary(
             "current_humidity": state.get("humidity_pct"),
             "door_open": state.get("door_open", False),
             "compressor_on": state.get("compressor_running", True),
-            "temperature_stats": {
-                "min": round(min(temps), 2) if temps else None,
-                "max": round(max(temps), 2) if temps else None,
-                "avg": round(sum(temps) / len(temps), 2) if temps else None,
-                "samples": len(temps),
-            },
+            "temperature_stats": temperature_stats,
             "alert_count_24h": len(alert_docs),
             "last_updated": state.get("updated_at"),
         }
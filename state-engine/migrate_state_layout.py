@@ -0,0 +1,188 @@
+"""
+Asset State Layout Migration
+Moves asset state between the JSON layout (asset:state:{id}) and the hash
+layout (asset:hash:{id}); see REDIS_STATE_LAYOUT in redis_client.py.
+
+  python migrate_state_layout.py --to hash          # convert existing JSON keys
+  python migrate_state_layout.py --to json          # roll back
+  python migrate_state_layout.py --benchmark 100000 --db 15
+
+Switch the state engine's REDIS_STATE_LAYOUT first: its writes already
+replace the other layout's key, and readers fall back to it, so this only
+has to convert assets that have not reported since. Each key is converted
+by a script that checks the source is unchanged and the target does not
+exist yet, so a concurrent state-engine write is never overwritten.
+
+--benchmark writes a synthetic fleet through each layout into an empty
+scratch database and reports Redis memory, network bytes and CPU from
+INFO. The counters are server-wide, so run it where nothing else is busy.
+"""
+
+import json
+import time
+import random
+import logging
+import argparse
+
+from redis_client import (
+    RedisClient, ASSET_STATE_PREFIX, ASSET_HASH_PREFIX, HASH_FIELDS, encode_fields, decode_fields,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# KEYS: source key, target key   ARGV: source value (JSON) or '', then field/value pairs
+TO_HASH_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+if redis.call('EXISTS', KEYS[2]) == 0 and #ARGV > 1 then
+  redis.call('HSET', KEYS[2], unpack(ARGV, 2))
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+# KEYS: source key, target key   ARGV: JSON document, then the source's field/value pairs
+TO_JSON_LUA = """
+local current = redis.call('HGETALL', KEYS[1])
+if #current ~= #ARGV - 1 then return 0 end
+for i = 1, #current, 2 do
+  local found = false
+  for j = 2, #ARGV, 2 do
+    if ARGV[j] == current[i] then found = ARGV[j + 1] == current[i + 1] break end
+  end
+  if not found then return 0 end
+end
+if redis.call('EXISTS', KEYS[2]) == 0 then redis.call('SET', KEYS[2], ARGV[1]) end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+
+def migrate(redis_client: RedisClient, target: str, batch_size: int):
+    r = redis_client.client
+    source_prefix = ASSET_STATE_PREFIX if target == "hash" else ASSET_HASH_PREFIX
+    target_prefix = ASSET_HASH_PREFIX if target == "hash" else ASSET_STATE_PREFIX
+    script = r.register_script(TO_HASH_LUA if target == "hash" else TO_JSON_LUA)
+    converted = skipped = 0
+    start = time.time()
+
+    keys = []
+    for key in r.scan_iter(match=f"{source_prefix}*", count=batch_size):
+        keys.append(key)
+        if len(keys) >= batch_size:
+            done = _convert(r, script, keys, source_prefix, target_prefix, target)
+            converted, skipped = converted + done, skipped + len(keys) - done
+            keys = []
+            logger.info(f"{converted} converted, {skipped} changed underneath ({time.time() - start:.0f}s)")
+    if keys:
+        done = _convert(r, script, keys, source_prefix, target_prefix, target)
+        converted, skipped = converted + done, skipped + len(keys) - done
+    logger.info(f"Migration to {target} done: {converted} converted, {skipped} skipped "
+                f"(rewritten by the state engine meanwhile)")
+
+
+def _convert(r, script, keys: list, source_prefix: str, target_prefix: str, target: str) -> int:
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.get(key) if target == "hash" else pipe.hgetall(key)
+    values = pipe.execute()
+
+    pipe = r.pipeline(transaction=False)
+    for key, value in zip(keys, values):
+        if not value:
+            continue
+        target_key = target_prefix + key[len(source_prefix):]
+        if target == "hash":
+            pairs = [x for f, v in zip(HASH_FIELDS, encode_fields(json.loads(value))) if v != "" for x in (f, v)]
+            script(keys=[key, target_key], args=[value, *pairs], client=pipe)
+        else:
+            pairs = [x for item in value.items() for x in item]
+            script(keys=[key, target_key], args=[json.dumps(decode_fields(value)), *pairs], client=pipe)
+    return sum(1 for result in pipe.execute() if result == 1)
+
+
+def benchmark(db: int, assets: int, rounds: int):
+    """Memory, network and CPU per layout for a synthetic fleet in scratch db."""
+    print(f"{assets} assets, {rounds} update rounds, db {db}")
+    print(f"{'layout':<6} {'memory MB':>10} {'write in MB':>12} {'write CPU s':>12} "
+          f"{'read out MB':>12} {'read CPU s':>11}")
+    for layout in ("json", "hash"):
+        client = RedisClient(db=db, layout=layout)
+        r = client.client
+        if r.dbsize():
+            raise SystemExit(f"db {db} is not empty; pick an unused database for --benchmark")
+        try:
+            memory = _info(r, "used_memory")
+            _write_round(client, assets, 0)
+            memory = _info(r, "used_memory") - memory
+
+            net_in, cpu = _info(r, "total_net_input_bytes"), _cpu(r)
+            for i in range(1, rounds + 1):
+                _write_round(client, assets, i)
+            write_in, write_cpu = _info(r, "total_net_input_bytes") - net_in, _cpu(r) - cpu
+
+            # The projection a list view needs, as an HMGET in the hash layout
+            asset_ids = [f"asset{i}" for i in range(assets)]
+            net_out, cpu = _info(r, "total_net_output_bytes"), _cpu(r)
+            for start in range(0, assets, 1000):
+                client.get_asset_states(asset_ids[start:start + 1000], ["state", "asset_type", "temperature_c"])
+            read_out, read_cpu = _info(r, "total_net_output_bytes") - net_out, _cpu(r) - cpu
+
+            print(f"{layout:<6} {memory / 2**20:>10.1f} {write_in / 2**20:>12.1f} {write_cpu:>12.2f} "
+                  f"{read_out / 2**20:>12.1f} {read_cpu:>11.2f}")
+        finally:
+            r.flushdb()
+
+
+def _write_round(client: RedisClient, assets: int, round_no: int, batch: int = 500):
+    ts = f"2026-01-01T00:{round_no // 12:02d}:{round_no % 12 * 5:02d}+00:00"
+    for start in range(0, assets, batch):
+        readings = {}
+        for i in range(start, min(start + batch, assets)):
+            truck = i % 3 == 0
+            doc = {
+                "asset_type": "refrigerated_truck" if truck else "cold_room",
+                "state": "NORMAL",
+                "reasons": [],
+                "temperature_c": round(random.uniform(-20, 4), 1),
+                "humidity_pct": None if truck else round(random.uniform(70, 90), 1),
+                "door_open": False,
+                "compressor_running": True,
+                "mqtt_topic": f"coldchain/{'trucks' if truck else 'rooms'}/asset{i}/telemetry",
+                "last_telemetry_at": ts,
+            }
+            if truck:
+                doc["location"] = {"latitude": 34.05 + i * 1e-5, "longitude": -118.24, "speed_kmh": 60.0}
+            readings[f"asset{i}"] = [("NORMAL", ts, doc, None)]
+        client.apply_readings(readings)
+
+
+def _info(r, field: str) -> int:
+    return int(r.info()[field])
+
+
+def _cpu(r) -> float:
+    info = r.info("cpu")
+    return float(info["used_cpu_user"]) + float(info["used_cpu_sys"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert asset state between Redis layouts")
+    parser.add_argument("--to", choices=("hash", "json"), default="hash")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--benchmark", type=int, metavar="ASSETS", help="compare layouts on a synthetic fleet")
+    parser.add_argument("--rounds", type=int, default=5, help="update rounds per asset for --benchmark")
+    parser.add_argument("--db", type=int, default=15, help="empty scratch database for --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.db, args.benchmark, args.rounds)
+    else:
+        migrate(RedisClient(layout=args.to), args.to, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
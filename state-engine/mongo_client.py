@@ -9,16 +9,41 @@ from typing import List, Optional
 
 from pymongo import MongoClient
 
+from telemetry_archive import archive_from_env
+
 logger = logging.getLogger(__name__)
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
 MONGO_DB = os.getenv("MONGO_DB", "coldchain")
 
+# Rollup tiers written by ingestion (ingestion/rollups.py), finest first: (collection, bucket seconds)
+ROLLUP_TIERS = [("telemetry_1m", 60), ("telemetry_1h", 3600)]
+
+# Nominal seconds between raw readings, for sizing a raw query against the point limit
+RAW_INTERVAL_SECONDS = float(os.getenv("RAW_INTERVAL_SECONDS", 5.0))
+
+
+def pick_tier(hours: int, limit: int) -> Optional[tuple]:
+    """Rollup tier for a window: None (raw) while the raw readings fit in limit,
+    else the finest tier whose bucket count fits, else the coarsest tier."""
+    window = hours * 3600
+    if window / RAW_INTERVAL_SECONDS <= limit:
+        return None
+    for collection, seconds in ROLLUP_TIERS:
+        if window / seconds <= limit:
+            return collection, seconds
+    return ROLLUP_TIERS[-1]
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
 
 class MongoDBClient:
     def __init__(self):
         self.client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
         self.db = self.client[MONGO_DB]
+        self.archive = archive_from_env()
         logger.info(f"Connected to MongoDB at {MONGO_URI}")
     
     def ping(self) -> bool:
@@ -29,6 +54,42 @@ class MongoDBClient:
         except Exception as e:
             logger.error(f"MongoDB ping failed: {e}")
             return False
+
+    def _raw_history(
+        self,
+        asset_id: str,
+        cutoff: datetime,
+        fields: Optional[List[str]] = None,
+        limit: int = 0,
+        newest_first: bool = False,
+        require: Optional[str] = None,
+    ) -> List[dict]:
+        """Raw readings since cutoff from MongoDB, plus the Parquet archive
+        for the part of the window older than the archive horizon.
+
+        fields=None returns whole documents; require skips readings without
+        that field. Both sources are sorted on created_at and merged before
+        the limit is applied.
+        """
+        query = {"asset_id": asset_id, "created_at": {"$gte": cutoff}}
+        if require:
+            query[require] = {"$exists": True}
+        projection = {"_id": 0}
+        if fields is not None:
+            projection.update({f: 1 for f in ["created_at", *fields]})
+        direction = -1 if newest_first else 1
+        docs = list(self.db.telemetry.find(query, projection, sort=[("created_at", direction)]).limit(limit))
+
+        horizon = self.archive.horizon() if self.archive is not None else None
+        if horizon is None or cutoff >= horizon or (newest_first and limit and len(docs) >= limit):
+            return docs
+        try:
+            archived = self.archive.read(asset_id, cutoff, horizon, fields, require)
+        except Exception as e:
+            logger.error(f"Failed to read telemetry archive for {asset_id}: {e}")
+            return docs
+        merged = sorted(archived + docs, key=lambda d: _naive_utc(d["created_at"]), reverse=newest_first)
+        return merged[:limit] if limit else merged
     
     def get_asset_history(
         self, 
@@ -40,21 +101,8 @@ class MongoDBClient:
         try:
             since = datetime.now(timezone.utc) - timedelta(hours=hours)
             
-            # Check if truck or room
-            query = {
-                "$or": [
-                    {"truck_id": asset_id},
-                    {"sensor_id": asset_id}
-                ],
-                "created_at": {"$gte": since}
-            }
-            
-            cursor = self.db.telemetry.find(
-                query,
-                {"_id": 0}
-            ).sort("created_at", -1).limit(limit)
-            
-            return list(cursor)
+            # Canonical asset_id, served by the (asset_id, created_at) index
+            return self._raw_history(asset_id, since, limit=limit, newest_first=True)
         except Exception as e:
             logger.error(f"Failed to get asset history: {e}")
             return []
@@ -120,22 +168,20 @@ class MongoDBClient:
     # ── History / Detail helpers (called by new endpoints) ────────────────
 
     def get_telemetry_history(self, asset_id: str, hours: int = 24, limit: int = 500):
-        """Return temperature + humidity timeseries, oldest first."""
+        """Return temperature + humidity timeseries, oldest first.
+
+        Long windows read the rollup tier picked by pick_tier(); points then
+        carry the bucket average plus min/max. Falls back to raw readings
+        when the tier has no data for the window yet.
+        """
         from datetime import datetime, timezone, timedelta
         cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-        coll = self.db["telemetry"]
-        query = {
-            "$or": [
-                {"truck_id": asset_id},
-                {"sensor_id": asset_id},
-            ],
-            "created_at": {"$gte": cutoff},
-        }
-        docs = list(coll.find(
-            query,
-            {"_id": 0, "created_at": 1, "temperature_c": 1, "humidity_pct": 1},
-            sort=[("created_at", 1)],
-        ).limit(limit))
+        tier = pick_tier(hours, limit)
+        if tier is not None:
+            docs = self.get_rollup_history(asset_id, tier[0], cutoff, limit)
+            if docs:
+                return docs
+        docs = self._raw_history(asset_id, cutoff, ["temperature_c", "humidity_pct"], limit=limit)
         for d in docs:
             if hasattr(d.get("created_at"), "isoformat"):
                 dt = d.pop("created_at")
@@ -146,20 +192,74 @@ class MongoDBClient:
                 d["humidity"] = d.pop("humidity_pct")
         return docs
 
+    def get_rollup_history(self, asset_id: str, collection: str, cutoff: datetime, limit: int):
+        """Chart points from a rollup collection, oldest first."""
+        docs = list(self.db[collection].find(
+            {"asset_id": asset_id, "bucket": {"$gte": cutoff}},
+            {"_id": 0, "batches": 0},
+            sort=[("bucket", 1)],
+        ).limit(limit))
+        points = []
+        for d in docs:
+            dt = d["bucket"]
+            point = {"timestamp": dt.isoformat() + ("Z" if dt.tzinfo is None else ""), "samples": d.get("count", 0)}
+            for prefix, name in (("temp", "temperature"), ("humidity", "humidity")):
+                if d.get(f"{prefix}_count"):
+                    point[name] = round(d[f"{prefix}_sum"] / d[f"{prefix}_count"], 2)
+                    point[f"{name}_min"] = d.get(f"{prefix}_min")
+                    point[f"{name}_max"] = d.get(f"{prefix}_max")
+            points.append(point)
+        return points
+
+    def get_temperature_stats(self, asset_id: str, hours: int = 24) -> Optional[dict]:
+        """min/max/avg/samples of temperature over a window, from the rollups.
+
+        Whole hours come from telemetry_1h and the partial hour at the start
+        of the window from telemetry_1m, so a week costs ~170 small documents
+        aggregated in MongoDB. None if no rollups cover the window.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+        first_hour = cutoff.replace(minute=0, second=0, microsecond=0)
+        if first_hour < cutoff:
+            first_hour += timedelta(hours=1)
+
+        totals = {"min": None, "max": None, "sum": 0.0, "count": 0}
+        for collection, match in (
+            ("telemetry_1h", {"$gte": first_hour}),
+            ("telemetry_1m", {"$gte": cutoff, "$lt": first_hour}),
+        ):
+            result = list(self.db[collection].aggregate([
+                {"$match": {"asset_id": asset_id, "bucket": match}},
+                {"$group": {
+                    "_id": None,
+                    "min": {"$min": "$temp_min"},
+                    "max": {"$max": "$temp_max"},
+                    "sum": {"$sum": "$temp_sum"},
+                    "count": {"$sum": "$temp_count"},
+                }},
+            ]))
+            if not result or not result[0]["count"]:
+                continue
+            r = result[0]
+            totals["min"] = r["min"] if totals["min"] is None else min(totals["min"], r["min"])
+            totals["max"] = r["max"] if totals["max"] is None else max(totals["max"], r["max"])
+            totals["sum"] += r["sum"]
+            totals["count"] += r["count"]
+
+        if not totals["count"]:
+            return None
+        return {
+            "min": round(totals["min"], 2),
+            "max": round(totals["max"], 2),
+            "avg": round(totals["sum"] / totals["count"], 2),
+            "samples": totals["count"],
+        }
+
     def get_door_events(self, asset_id: str, hours: int = 24):
         """Derive door open/close events from telemetry transitions."""
         from datetime import datetime, timezone, timedelta
         cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-        coll = self.db["telemetry"]
-        query = {
-            "$or": [{"truck_id": asset_id}, {"sensor_id": asset_id}],
-            "created_at": {"$gte": cutoff},
-        }
-        docs = list(coll.find(
-            query,
-            {"_id": 0, "created_at": 1, "door_open": 1},
-            sort=[("created_at", 1)],
-        ))
+        docs = self._raw_history(asset_id, cutoff, ["door_open"])
         events = []
         prev_open, prev_ts = None, None
         for d in docs:
@@ -183,16 +283,7 @@ class MongoDBClient:
         """Derive compressor on/off events from telemetry transitions."""
         from datetime import datetime, timezone, timedelta
         cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-        coll = self.db["telemetry"]
-        query = {
-            "$or": [{"truck_id": asset_id}, {"sensor_id": asset_id}],
-            "created_at": {"$gte": cutoff},
-        }
-        docs = list(coll.find(
-            query,
-            {"_id": 0, "created_at": 1, "compressor_running": 1},
-            sort=[("created_at", 1)],
-        ))
+        docs = self._raw_history(asset_id, cutoff, ["compressor_running"])
         events = []
         prev_on, prev_ts = None, None
         for d in docs:
@@ -216,17 +307,8 @@ class MongoDBClient:
         """Return GPS trail for trucks."""
         from datetime import datetime, timezone, timedelta
         cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-        coll = self.db["telemetry"]
-        query = {
-            "truck_id": asset_id,
-            "created_at": {"$gte": cutoff},
-            "latitude": {"$exists": True},
-        }
-        docs = list(coll.find(
-            query,
-            {"_id": 0, "created_at": 1, "latitude": 1, "longitude": 1, "speed_kmh": 1},
-            sort=[("created_at", 1)],
-        ).limit(limit))
+        docs = self._raw_history(asset_id, cutoff, ["latitude", "longitude", "speed_kmh"],
+                                 limit=limit, require="latitude")
         for d in docs:
             if hasattr(d.get("created_at"), "isoformat"):
                 dt = d.pop("created_at")
@@ -4,11 +4,14 @@ Redis Client - Manages asset state cache
 
 import os
 import json
+import time
 import logging
+from hashlib import sha1
 from datetime import datetime, timezone
 from typing import Optional, List, Dict
 
 import redis
+from redis.exceptions import NoScriptError
 
 logger = logging.getLogger(__name__)
 
@@ -21,16 +24,296 @@ ASSET_STATE_PREFIX = "asset:state:"
 ALERT_ACTIVE_PREFIX = "alert:active:"
 STATS_KEY = "stats:dashboard"
 
+# Secondary indexes, kept in step with each asset's stored state by the
+# apply script: one set of asset IDs per state and per asset type (their
+# SCARDs are the /stats counters), registries of the state and type names
+# in use, and the active alerts scored by expiry time so they can be
+# counted without reading them. The scripts build index key names from the
+# stored values, which is fine on the single Redis instance used here.
+STATE_INDEX_PREFIX = "assets:state:"
+TYPE_INDEX_PREFIX = "assets:type:"
+STATE_NAMES_KEY = "assets:states"
+TYPE_NAMES_KEY = "assets:types"
+ALERT_EXPIRY_KEY = "alerts:active:expiry"
+INDEXED_KEY = "assets:indexed"
+
+# Asset state layout: "json" stores one JSON string per asset under
+# asset:state:{id}; "hash" stores one field per HASH_FIELDS entry under
+# asset:hash:{id}, so writes only touch changed fields and readers can HMGET
+# the fields they need. Each layout's writes delete the asset's key in the
+# other layout, and readers fall back to the other layout on a miss, so the
+# setting can be switched (and migrate_state_layout.py run) without downtime.
+REDIS_STATE_LAYOUT = os.getenv("REDIS_STATE_LAYOUT", "json").lower()
+ASSET_HASH_PREFIX = "asset:hash:"
+HASH_FIELDS = (
+    "asset_type", "state", "reasons", "temperature_c", "humidity_pct", "door_open",
+    "compressor_running", "mqtt_topic", "last_telemetry_at", "latitude", "longitude",
+    "speed_kmh", "updated_at",
+)
+_FLOAT_FIELDS = {"temperature_c", "humidity_pct", "latitude", "longitude", "speed_kmh"}
+_BOOL_FIELDS = {"door_open", "compressor_running"}
+_LOCATION_FIELDS = ("latitude", "longitude", "speed_kmh")
+
+
+def encode_fields(state_data: dict) -> List[str]:
+    """State document as HASH_FIELDS values; '' marks a field that is not set."""
+    flat = dict(state_data)
+    flat.update(state_data.get("location") or {})
+    values = []
+    for field in HASH_FIELDS:
+        value = flat.get(field)
+        if value is None:
+            values.append("")
+        elif field == "reasons":
+            values.append(json.dumps(value))
+        elif field in _BOOL_FIELDS:
+            values.append("1" if value else "0")
+        else:
+            values.append(str(value))
+    return values
+
+
+def decode_fields(fields: Dict[str, Optional[str]], expected=HASH_FIELDS) -> dict:
+    """State document from hash fields (all of them or an HMGET projection).
+    Expected fields that are not set come back as None, as in the JSON layout."""
+    doc = {field: None for field in expected if field not in _LOCATION_FIELDS}
+    for field, value in fields.items():
+        if value is None or value == "":
+            continue
+        if field == "reasons":
+            doc[field] = json.loads(value)
+        elif field in _FLOAT_FIELDS:
+            doc[field] = float(value)
+        elif field in _BOOL_FIELDS:
+            doc[field] = value == "1"
+        else:
+            doc[field] = value
+    if "latitude" in doc:
+        doc["location"] = {field: doc.pop(field, None) for field in _LOCATION_FIELDS}
+    else:
+        for field in _LOCATION_FIELDS:
+            doc.pop(field, None)
+    return doc
+
+
+def final_candidates(timestamps: List[Optional[str]]) -> List[bool]:
+    """Which of an asset's readings can end up as its stored state.
+
+    The apply script skips a reading older than the last one it applied, so
+    a reading followed by one at least as new, or by one without a
+    timestamp (always applied), is never the last applied. Only candidates
+    carry their state document to Redis.
+    """
+    result = [False] * len(timestamps)
+    later_max, later_untimed = None, False
+    for i in range(len(timestamps) - 1, -1, -1):
+        ts = timestamps[i]
+        if later_untimed:
+            result[i] = False
+        elif not ts:
+            result[i] = True
+        else:
+            result[i] = later_max is None or ts > later_max
+        if not ts:
+            later_untimed = True
+        elif later_max is None or ts > later_max:
+            later_max = ts
+    return result
+
+
+# Applies one asset's readings from a batch atomically, so replicas racing on
+# the same asset during a rebalance agree on which reading was a transition.
+# KEYS: json state key, alert key, assets:index, alerts:active:index,
+#       alerts:active:expiry, hash state key
+# ARGV: asset_id, alert ttl, field count F, F hash field names (hash layout
+#       only), then per reading: state, timestamp, alert json, value count V
+#       and V values (the state json, the F field values, or none for a
+#       reading final_candidates() ruled out)
+# Readings older than the stored last_telemetry_at are skipped. The last
+# applied reading's state is stored; the alert is set on a transition into
+# WARNING/CRITICAL and cleared by a non-alert state, last outcome wins.
+# The asset moves between the state and type index sets when the stored
+# state or type changes (and is re-added each time, which repairs a set
+# that was evicted). Returns the 1-based positions of readings that were such transitions.
+_APPLY_PREVIOUS_JSON = """
+local prev_state, last_seen, stored_type = nil, nil, nil
+local prev = redis.call('GET', KEYS[1])
+if prev then
+  local doc = cjson.decode(prev)
+  prev_state, last_seen, stored_type = doc.state, doc.last_telemetry_at, doc.asset_type
+else
+  local fields = redis.call('HMGET', KEYS[6], 'state', 'last_telemetry_at', 'asset_type')
+  prev_state, last_seen, stored_type = fields[1], fields[2], fields[3]
+end
+"""
+
+_APPLY_PREVIOUS_HASH = """
+local fields = redis.call('HMGET', KEYS[6], 'state', 'last_telemetry_at', 'asset_type')
+local prev_state, last_seen, stored_type = fields[1], fields[2], fields[3]
+if not prev_state then
+  local prev = redis.call('GET', KEYS[1])
+  if prev then
+    local doc = cjson.decode(prev)
+    prev_state, last_seen, stored_type = doc.state, doc.last_telemetry_at, doc.asset_type
+  end
+end
+"""
+
+_APPLY_LOOP = """
+local stored_state = nil
+if type(prev_state) == 'string' then stored_state = prev_state else prev_state = 'NORMAL' end
+if type(stored_type) ~= 'string' or stored_type == '' then stored_type = nil end
+if type(last_seen) ~= 'string' or last_seen == '' then last_seen = nil end
+
+local nfields = tonumber(ARGV[3])
+local i, position = 4 + nfields, 0
+local final, alert, transitions = nil, nil, {}
+while i <= #ARGV do
+  position = position + 1
+  local state, ts = ARGV[i], ARGV[i + 1]
+  if not (last_seen and ts ~= '' and ts < last_seen) then
+    final = i + 4
+    if state == 'WARNING' or state == 'CRITICAL' then
+      if state ~= prev_state then
+        alert = i + 2
+        transitions[#transitions + 1] = position
+      end
+    else
+      alert = 0
+    end
+    prev_state = state
+    if ts ~= '' then last_seen = ts end
+  end
+  i = i + 4 + tonumber(ARGV[i + 3])
+end
+if not final then return transitions end
+"""
+
+_APPLY_WRITE_JSON = """
+redis.call('SET', KEYS[1], ARGV[final])
+redis.call('DEL', KEYS[6])
+local new_type = cjson.decode(ARGV[final]).asset_type
+"""
+
+_APPLY_WRITE_HASH = """
+local current = redis.call('HMGET', KEYS[6], unpack(ARGV, 4, 3 + nfields))
+local changed, cleared, new_type = {}, {}, nil
+for f = 1, nfields do
+  local value = ARGV[final + f - 1]
+  if ARGV[3 + f] == 'asset_type' then new_type = value end
+  if value == '' then
+    if current[f] then cleared[#cleared + 1] = ARGV[3 + f] end
+  elseif value ~= current[f] then
+    changed[#changed + 1] = ARGV[3 + f]
+    changed[#changed + 1] = value
+  end
+end
+if #changed > 0 then redis.call('HSET', KEYS[6], unpack(changed)) end
+if #cleared > 0 then redis.call('HDEL', KEYS[6], unpack(cleared)) end
+redis.call('DEL', KEYS[1])
+"""
+
+_APPLY_INDEXES = """
+if type(new_type) ~= 'string' or new_type == '' then new_type = nil end
+redis.call('SADD', KEYS[3], ARGV[1])
+if stored_state and stored_state ~= prev_state then
+  redis.call('SREM', 'assets:state:' .. stored_state, ARGV[1])
+end
+redis.call('SADD', 'assets:state:' .. prev_state, ARGV[1])
+if stored_state ~= prev_state then redis.call('SADD', 'assets:states', prev_state) end
+if stored_type and stored_type ~= new_type then
+  redis.call('SREM', 'assets:type:' .. stored_type, ARGV[1])
+end
+if new_type then
+  redis.call('SADD', 'assets:type:' .. new_type, ARGV[1])
+  if stored_type ~= new_type then redis.call('SADD', 'assets:types', new_type) end
+end
+if alert == 0 then
+  redis.call('DEL', KEYS[2])
+  redis.call('SREM', KEYS[4], ARGV[1])
+  redis.call('ZREM', KEYS[5], ARGV[1])
+elseif alert then
+  redis.call('SETEX', KEYS[2], ARGV[2], ARGV[alert])
+  redis.call('SADD', KEYS[4], ARGV[1])
+  redis.call('ZADD', KEYS[5], tonumber(redis.call('TIME')[1]) + tonumber(ARGV[2]), ARGV[1])
+end
+return transitions
+"""
+
+APPLY_READINGS_LUA = {
+    "json": _APPLY_PREVIOUS_JSON + _APPLY_LOOP + _APPLY_WRITE_JSON + _APPLY_INDEXES,
+    "hash": _APPLY_PREVIOUS_HASH + _APPLY_LOOP + _APPLY_WRITE_HASH + _APPLY_INDEXES,
+}
+
+# Clears an asset's alert only while it still belongs to the given incident,
+# or replaces it with the alert of another incident still open on the asset.
+# KEYS: alert key, alerts:active:index, alerts:active:expiry
+# ARGV: asset_id, incident_id, replacement alert json or '', ttl, expiry time
+CLEAR_INCIDENT_LUA = """
+local data = redis.call('GET', KEYS[1])
+if not data or cjson.decode(data).incident_id ~= ARGV[2] then return 0 end
+if ARGV[3] ~= '' then
+  redis.call('SETEX', KEYS[1], ARGV[4], ARGV[3])
+  redis.call('ZADD', KEYS[3], ARGV[5], ARGV[1])
+  return 1
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+# Puts one asset in the index sets matching its stored state and type and
+# takes it out of every other registered one; idempotent, so it can run
+# while the state engine writes. Used by set_asset_state and reindex().
+# KEYS: json state key, hash state key, assets:states, assets:types
+# ARGV: asset_id
+REINDEX_ASSET_LUA = """
+local state, asset_type
+local data = redis.call('GET', KEYS[1])
+if data then
+  local doc = cjson.decode(data)
+  state, asset_type = doc.state, doc.asset_type
+else
+  local fields = redis.call('HMGET', KEYS[2], 'state', 'asset_type')
+  state, asset_type = fields[1], fields[2]
+end
+if type(state) ~= 'string' or state == '' then state = nil end
+if type(asset_type) ~= 'string' or asset_type == '' then asset_type = nil end
+for _, name in ipairs(redis.call('SMEMBERS', KEYS[3])) do
+  if name ~= state then redis.call('SREM', 'assets:state:' .. name, ARGV[1]) end
+end
+for _, name in ipairs(redis.call('SMEMBERS', KEYS[4])) do
+  if name ~= asset_type then redis.call('SREM', 'assets:type:' .. name, ARGV[1]) end
+end
+if state then
+  redis.call('SADD', 'assets:state:' .. state, ARGV[1])
+  redis.call('SADD', KEYS[3], state)
+end
+if asset_type then
+  redis.call('SADD', 'assets:type:' .. asset_type, ARGV[1])
+  redis.call('SADD', KEYS[4], asset_type)
+end
+return 1
+"""
+
 
 class RedisClient:
-    def __init__(self):
+    def __init__(self, db: int = REDIS_DB, layout: str = REDIS_STATE_LAYOUT):
+        if layout not in APPLY_READINGS_LUA:
+            raise ValueError(f"Unknown REDIS_STATE_LAYOUT '{layout}' (json or hash)")
         self.client = redis.Redis(
             host=REDIS_HOST,
             port=REDIS_PORT,
-            db=REDIS_DB,
+            db=db,
             decode_responses=True
         )
-        logger.info(f"Connected to Redis at {REDIS_HOST}:{REDIS_PORT}")
+        self.layout = layout
+        self._apply_lua = APPLY_READINGS_LUA[layout]
+        self._apply_sha = sha1(self._apply_lua.encode()).hexdigest()
+        self._clear_incident = self.client.register_script(CLEAR_INCIDENT_LUA)
+        self._reindex_asset = self.client.register_script(REINDEX_ASSET_LUA)
+        logger.info(f"Connected to Redis at {REDIS_HOST}:{REDIS_PORT} ({layout} state layout)")
     
     def ping(self) -> bool:
         """Check Redis connection"""
@@ -47,15 +330,24 @@ class RedisClient:
     def set_asset_state(self, asset_id: str, state_data: dict) -> bool:
         """Store current state for an asset"""
         try:
-            key = f"{ASSET_STATE_PREFIX}{asset_id}"
             state_data["updated_at"] = datetime.now(timezone.utc).isoformat()
-            self.client.set(key, json.dumps(state_data))
-            
-            # Add to asset index
-            self.client.sadd("assets:index", asset_id)
+            pipe = self.client.pipeline(transaction=False)
+            if self.layout == "hash":
+                values = encode_fields(state_data)
+                changed = {f: v for f, v in zip(HASH_FIELDS, values) if v != ""}
+                cleared = [f for f, v in zip(HASH_FIELDS, values) if v == ""]
+                pipe.hset(f"{ASSET_HASH_PREFIX}{asset_id}", mapping=changed)
+                if cleared:
+                    pipe.hdel(f"{ASSET_HASH_PREFIX}{asset_id}", *cleared)
+                pipe.delete(f"{ASSET_STATE_PREFIX}{asset_id}")
+            else:
+                pipe.set(f"{ASSET_STATE_PREFIX}{asset_id}", json.dumps(state_data))
+                pipe.delete(f"{ASSET_HASH_PREFIX}{asset_id}")
             
-            # Update state counters
-            self._update_state_counter(state_data.get("state", "UNKNOWN"))
+            # Add to asset, state and type indexes
+            pipe.sadd("assets:index", asset_id)
+            self._reindex_asset(keys=self._reindex_keys(asset_id), args=[asset_id], client=pipe)
+            pipe.execute()
             
             return True
         except Exception as e:
@@ -65,41 +357,172 @@ class RedisClient:
     def get_asset_state(self, asset_id: str) -> Optional[dict]:
         """Get current state for an asset"""
         try:
-            key = f"{ASSET_STATE_PREFIX}{asset_id}"
-            data = self.client.get(key)
-            return json.loads(data) if data else None
+            return self.get_asset_states([asset_id])[0]
         except Exception as e:
             logger.error(f"Failed to get asset state: {e}")
             return None
     
+    def get_asset_states(self, asset_ids: List[str], fields: Optional[List[str]] = None) -> List[Optional[dict]]:
+        """State documents for asset_ids (None where missing), read from the
+        configured layout first and the other layout for misses. fields
+        projects hash reads to those HASH_FIELDS with HMGET; JSON reads
+        always decode the whole document."""
+        states = self._read_layout(self.layout, asset_ids, fields)
+        missing = [i for i, state in enumerate(states) if state is None]
+        if missing:
+            other = "json" if self.layout == "hash" else "hash"
+            for i, state in zip(missing, self._read_layout(other, [asset_ids[i] for i in missing], fields)):
+                states[i] = state
+        return states
+    
+    def _read_layout(self, layout: str, asset_ids: List[str], fields: Optional[List[str]]) -> List[Optional[dict]]:
+        pipe = self.client.pipeline(transaction=False)
+        for asset_id in asset_ids:
+            if layout == "json":
+                pipe.get(f"{ASSET_STATE_PREFIX}{asset_id}")
+            elif fields:
+                pipe.hmget(f"{ASSET_HASH_PREFIX}{asset_id}", fields)
+            else:
+                pipe.hgetall(f"{ASSET_HASH_PREFIX}{asset_id}")
+        states = []
+        for data in pipe.execute():
+            if layout == "json":
+                states.append(json.loads(data) if data else None)
+            elif fields:
+                states.append(decode_fields(dict(zip(fields, data)), fields) if any(v is not None for v in data) else None)
+            else:
+                states.append(decode_fields(data) if data else None)
+        return states
+    
+    def apply_readings(self, readings: Dict[str, list], ttl: int = 3600) -> Dict[str, List[int]]:
+        """Apply each asset's readings for a batch with the layout's
+        APPLY_READINGS_LUA script, one EVALSHA per asset in a single pipeline.
+        
+        readings maps asset_id to (state, timestamp, state_doc, alert_doc)
+        tuples in arrival order; alert_doc is None for non-alert states.
+        Returns, per asset, the positions of readings that moved the asset
+        into a new WARNING/CRITICAL state. Assets whose script failed are
+        left out and logged.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        header = [len(HASH_FIELDS), *HASH_FIELDS] if self.layout == "hash" else [0]
+        calls = []
+        for asset_id, items in readings.items():
+            args = [asset_id, ttl, *header]
+            candidates = final_candidates([timestamp for _, timestamp, _, _ in items])
+            for (state, timestamp, state_doc, alert_doc), candidate in zip(items, candidates):
+                if alert_doc is not None:
+                    alert_doc["created_at"] = now
+                args += [state, timestamp or "", json.dumps(alert_doc) if alert_doc is not None else ""]
+                if not candidate:
+                    args.append(0)
+                    continue
+                state_doc["updated_at"] = now
+                values = encode_fields(state_doc) if self.layout == "hash" else [json.dumps(state_doc)]
+                args += [len(values), *values]
+            keys = [f"{ASSET_STATE_PREFIX}{asset_id}", f"{ALERT_ACTIVE_PREFIX}{asset_id}",
+                    "assets:index", "alerts:active:index", ALERT_EXPIRY_KEY,
+                    f"{ASSET_HASH_PREFIX}{asset_id}"]
+            calls.append((asset_id, keys, args))
+        
+        results = self._evalsha_all(calls)
+        transitions = {}
+        for (asset_id, _, _), result in zip(calls, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to apply readings for {asset_id}: {result}")
+            else:
+                transitions[asset_id] = [int(i) for i in result]
+        return transitions
+    
+    def _evalsha_all(self, calls: list) -> list:
+        """Run the apply script for (asset_id, keys, args) calls in one round trip,
+        reloading the script once if Redis lost it (restart or SCRIPT FLUSH)."""
+        for attempt in range(2):
+            pipe = self.client.pipeline(transaction=False)
+            for _, keys, args in calls:
+                pipe.evalsha(self._apply_sha, len(keys), *keys, *args)
+            results = pipe.execute(raise_on_error=False)
+            if attempt == 0 and any(isinstance(r, NoScriptError) for r in results):
+                self._apply_sha = self.client.script_load(self._apply_lua)
+                continue
+            return results
+    
     def get_all_assets(self) -> List[dict]:
         """Get all asset states using pipeline"""
+        return self.get_assets()
+    
+    def get_assets(self, state: Optional[str] = None, asset_type: Optional[str] = None) -> List[dict]:
+        """Asset states, optionally filtered; only the matching index members are read"""
         try:
-            asset_ids = self.client.smembers("assets:index")
+            keys = ([f"{STATE_INDEX_PREFIX}{state}"] if state else []) + \
+                   ([f"{TYPE_INDEX_PREFIX}{asset_type}"] if asset_type else [])
+            if not keys:
+                asset_ids = list(self.client.smembers("assets:index"))
+            elif len(keys) == 1:
+                asset_ids = list(self.client.smembers(keys[0]))
+            else:
+                asset_ids = list(self.client.sinter(keys))
             if not asset_ids:
                 return []
             
-            keys = [f"{ASSET_STATE_PREFIX}{aid}" for aid in asset_ids]
-            pipe = self.client.pipeline(transaction=False)
-            for key in keys:
-                pipe.get(key)
-            results = pipe.execute()
-            
             assets = []
-            for asset_id, data in zip(asset_ids, results):
-                if data:
-                    state = json.loads(data)
-                    state["asset_id"] = asset_id
-                    assets.append(state)
+            for asset_id, doc in zip(asset_ids, self.get_asset_states(asset_ids)):
+                # An index can trail a concurrent write; the document decides
+                if doc and (not state or doc.get("state") == state) \
+                        and (not asset_type or doc.get("asset_type") == asset_type):
+                    doc["asset_id"] = asset_id
+                    assets.append(doc)
             return assets
         except Exception as e:
-            logger.error(f"Failed to get all assets: {e}")
+            logger.error(f"Failed to get assets: {e}")
             return []
     
     def get_assets_by_state(self, state: str) -> List[dict]:
         """Get all assets with a specific state"""
-        assets = self.get_all_assets()
-        return [a for a in assets if a.get("state") == state]
+        return self.get_assets(state=state)
+    
+    def reindex(self, batch_size: int = 1000) -> int:
+        """Rebuild the state/type index sets and the alert expiry index from
+        the stored states, then drop the old message-counting hash. Safe to
+        run alongside writers; marks INDEXED_KEY when done."""
+        count = 0
+        batch = []
+        for asset_id in self.client.sscan_iter("assets:index", count=batch_size):
+            batch.append(asset_id)
+            if len(batch) >= batch_size:
+                count += self._reindex_batch(batch)
+                batch = []
+        if batch:
+            count += self._reindex_batch(batch)
+        
+        alert_ids = list(self.client.smembers("alerts:active:index"))
+        pipe = self.client.pipeline(transaction=False)
+        for asset_id in alert_ids:
+            pipe.ttl(f"{ALERT_ACTIVE_PREFIX}{asset_id}")
+        now = time.time()
+        pipe2 = self.client.pipeline(transaction=False)
+        for asset_id, ttl in zip(alert_ids, pipe.execute() if alert_ids else []):
+            if ttl > 0:
+                pipe2.zadd(ALERT_EXPIRY_KEY, {asset_id: now + ttl}, nx=True)
+        pipe2.delete("stats:state_counts")
+        pipe2.set(INDEXED_KEY, datetime.now(timezone.utc).isoformat())
+        pipe2.execute()
+        return count
+    
+    def _reindex_batch(self, asset_ids: List[str]) -> int:
+        pipe = self.client.pipeline(transaction=False)
+        for asset_id in asset_ids:
+            self._reindex_asset(keys=self._reindex_keys(asset_id), args=[asset_id], client=pipe)
+        pipe.execute()
+        return len(asset_ids)
+    
+    @staticmethod
+    def _reindex_keys(asset_id: str) -> List[str]:
+        return [f"{ASSET_STATE_PREFIX}{asset_id}", f"{ASSET_HASH_PREFIX}{asset_id}",
+                STATE_NAMES_KEY, TYPE_NAMES_KEY]
+    
+    def is_indexed(self) -> bool:
+        return bool(self.client.exists(INDEXED_KEY))
     
     # -------------------------------------------------------------------------
     # Alert Operations
@@ -110,19 +533,38 @@ class RedisClient:
         try:
             key = f"{ALERT_ACTIVE_PREFIX}{asset_id}"
             alert_data["created_at"] = datetime.now(timezone.utc).isoformat()
-            self.client.setex(key, ttl, json.dumps(alert_data))
-            self.client.sadd("alerts:active:index", asset_id)
+            pipe = self.client.pipeline(transaction=False)
+            pipe.setex(key, ttl, json.dumps(alert_data))
+            pipe.sadd("alerts:active:index", asset_id)
+            pipe.zadd(ALERT_EXPIRY_KEY, {asset_id: time.time() + ttl})
+            pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Failed to set alert: {e}")
             return False
     
-    def clear_alert(self, asset_id: str) -> bool:
-        """Clear active alert for asset"""
+    def clear_alert(self, asset_id: str, incident_id: Optional[str] = None,
+                    replacement: Optional[dict] = None, ttl: int = 3600) -> bool:
+        """Clear active alert for asset (only if it belongs to incident_id, when given).
+
+        With incident_id, replacement is the alert of another incident still
+        open on the asset; it takes the cleared alert's place instead.
+        """
         try:
             key = f"{ALERT_ACTIVE_PREFIX}{asset_id}"
-            self.client.delete(key)
-            self.client.srem("alerts:active:index", asset_id)
+            if incident_id is not None:
+                if replacement is not None:
+                    replacement["created_at"] = datetime.now(timezone.utc).isoformat()
+                return bool(self._clear_incident(
+                    keys=[key, "alerts:active:index", ALERT_EXPIRY_KEY],
+                    args=[asset_id, incident_id, json.dumps(replacement) if replacement is not None else "",
+                          ttl, time.time() + ttl],
+                ))
+            pipe = self.client.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.srem("alerts:active:index", asset_id)
+            pipe.zrem(ALERT_EXPIRY_KEY, asset_id)
+            pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Failed to clear alert: {e}")
@@ -152,8 +594,8 @@ class RedisClient:
             
             if expired:
                 pipe = self.client.pipeline(transaction=False)
-                for asset_id in expired:
-                    pipe.srem("alerts:active:index", asset_id)
+                pipe.srem("alerts:active:index", *expired)
+                pipe.zrem(ALERT_EXPIRY_KEY, *expired)
                 pipe.execute()
             
             return alerts
@@ -165,36 +607,37 @@ class RedisClient:
     # Statistics Operations
     # -------------------------------------------------------------------------
     
-    def _update_state_counter(self, state: str):
-        """Update state counter for statistics"""
+    def count_active_alerts(self) -> int:
+        """Alerts that have not expired, from the expiry index"""
         try:
-            self.client.hincrby("stats:state_counts", state, 1)
-        except Exception:
-            pass
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zremrangebyscore(ALERT_EXPIRY_KEY, "-inf", time.time())
+            pipe.zcard(ALERT_EXPIRY_KEY)
+            return pipe.execute()[1]
+        except Exception as e:
+            logger.error(f"Failed to count active alerts: {e}")
+            return 0
     
     def get_stats(self) -> dict:
-        """Get dashboard statistics"""
+        """Get dashboard statistics from the index set cardinalities"""
         try:
-            assets = self.get_all_assets()
-            active_alerts = self.get_active_alerts()
-            
-            state_counts = {"NORMAL": 0, "WARNING": 0, "CRITICAL": 0}
-            asset_types = {"refrigerated_truck": 0, "cold_room": 0}
-            
-            for asset in assets:
-                state = asset.get("state", "UNKNOWN")
-                if state in state_counts:
-                    state_counts[state] += 1
-                
-                asset_type = asset.get("asset_type", "unknown")
-                if asset_type in asset_types:
-                    asset_types[asset_type] += 1
+            states = ("NORMAL", "WARNING", "CRITICAL")
+            asset_types = ("refrigerated_truck", "cold_room")
+            pipe = self.client.pipeline(transaction=False)
+            pipe.scard("assets:index")
+            for state in states:
+                pipe.scard(f"{STATE_INDEX_PREFIX}{state}")
+            for asset_type in asset_types:
+                pipe.scard(f"{TYPE_INDEX_PREFIX}{asset_type}")
+            pipe.zremrangebyscore(ALERT_EXPIRY_KEY, "-inf", time.time())
+            pipe.zcard(ALERT_EXPIRY_KEY)
+            counts = pipe.execute()
             
             return {
-                "total_assets": len(assets),
-                "state_counts": state_counts,
-                "asset_types": asset_types,
-                "active_alerts": len(active_alerts),
+                "total_assets": counts[0],
+                "state_counts": dict(zip(states, counts[1:4])),
+                "asset_types": dict(zip(asset_types, counts[4:6])),
+                "active_alerts": counts[-1],
                 "updated_at": datetime.utcnow().isoformat()
             }
         except Exception as e:
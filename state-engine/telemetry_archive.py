@@ -0,0 +1,115 @@
+"""
+Telemetry Archive Reader - Parquet cold storage written by ingestion/archive_telemetry.py
+
+Files live under ARCHIVE_URI (local path or s3://bucket/prefix) at
+telemetry/date=YYYY-MM-DD/asset_id=<asset_id>/part-*.parquet, sorted by
+created_at. A read lists only the day directories of the requested asset,
+skips row groups whose created_at statistics fall outside the window and
+reads only the requested columns.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_URI = os.getenv("ARCHIVE_URI", "")
+# Same horizon as the archiver: readings older than this are only in the archive
+ARCHIVE_HORIZON_HOURS = int(os.getenv("ARCHIVE_HORIZON_HOURS", 72))
+
+
+class TelemetryArchive:
+    def __init__(self, uri: str = ARCHIVE_URI):
+        self.fs, root = pafs.FileSystem.from_uri(uri)
+        self.root = root.rstrip("/")
+        logger.info(f"Telemetry archive at {uri} (horizon {ARCHIVE_HORIZON_HOURS}h)")
+
+    @staticmethod
+    def horizon() -> datetime:
+        return datetime.now(timezone.utc) - timedelta(hours=ARCHIVE_HORIZON_HOURS)
+
+    def read(
+        self,
+        asset_id: str,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        require: Optional[str] = None,
+    ) -> List[dict]:
+        """Archived readings with start <= created_at < end, oldest first.
+
+        columns=None reads every column and unpacks `extra`; require drops
+        rows where that column is null. Null columns are left out of a row,
+        and created_at comes back as a naive UTC datetime, as from pymongo.
+        """
+        if columns is not None:
+            columns = list(dict.fromkeys(["created_at", *columns, *([require] if require else [])]))
+        tables = []
+        for path in self._files(asset_id, start, end):
+            table = self._read_file(path, start, end, columns)
+            if table is not None:
+                tables.append(table)
+        if not tables:
+            return []
+
+        table = pa.concat_tables(tables, promote_options="default")
+        if require:
+            table = table.filter(pc.is_valid(table[require]))
+        table = table.sort_by("created_at")
+
+        rows = [{k: v for k, v in row.items() if v is not None} for row in table.to_pylist()]
+        for row in rows:
+            row["created_at"] = row["created_at"].astimezone(timezone.utc).replace(tzinfo=None)
+            extra = row.pop("extra", None)
+            if extra:
+                row.update(json.loads(extra))
+        return rows
+
+    def _files(self, asset_id: str, start: datetime, end: datetime) -> List[str]:
+        paths = []
+        day = start.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end:
+            directory = f"{self.root}/telemetry/date={day:%Y-%m-%d}/asset_id={asset_id}"
+            infos = self.fs.get_file_info(pafs.FileSelector(directory, allow_not_found=True))
+            paths.extend(sorted(i.path for i in infos
+                                if i.type == pafs.FileType.File and i.path.endswith(".parquet")))
+            day += timedelta(days=1)
+        return paths
+
+    def _read_file(self, path: str, start: datetime, end: datetime, columns):
+        with self.fs.open_input_file(path) as f:
+            parquet = pq.ParquetFile(f)
+            meta = parquet.metadata
+            ts_index = parquet.schema_arrow.get_field_index("created_at")
+            groups = []
+            for i in range(meta.num_row_groups):
+                stats = meta.row_group(i).column(ts_index).statistics
+                if stats is not None and stats.has_min_max and (stats.max < start or stats.min >= end):
+                    continue
+                groups.append(i)
+            if not groups:
+                return None
+            table = parquet.read_row_groups(groups, columns=columns)
+
+        ts = table["created_at"]
+        mask = pc.and_(pc.greater_equal(ts, pa.scalar(start, ts.type)), pc.less(ts, pa.scalar(end, ts.type)))
+        return table.filter(mask)
+
+
+def archive_from_env() -> Optional[TelemetryArchive]:
+    """The configured archive, or None when ARCHIVE_URI is unset or unreachable."""
+    if not ARCHIVE_URI:
+        return None
+    try:
+        return TelemetryArchive(ARCHIVE_URI)
+    except Exception as e:
+        logger.warning(f"Telemetry archive disabled: {e}")
+        return None
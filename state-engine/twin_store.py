@@ -0,0 +1,230 @@
+"""
+Twin Store - In-process copy of every asset's current state
+
+Read endpoints serve from here instead of GET + JSON-decoding each asset in
+Redis. One writer (the twin feed thread in main.py) applies state documents;
+readers take the current Snapshot, which is never modified after it is
+published, so reads need no lock.
+
+Per asset the store keeps one row in `array` columns (temperatures, location,
+flags, interned state / type codes, update time) and one slotted
+AssetRecord for the string fields. The writer works on its own columns and
+publishes a copy at most every TWIN_PUBLISH_INTERVAL seconds; arrays copy
+with a memcpy and records are replaced rather than mutated, so the copies
+share them. A million assets take about 400 MB including both copies.
+"""
+
+import os
+import math
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+TWIN_PUBLISH_INTERVAL = float(os.getenv("TWIN_PUBLISH_INTERVAL", 1.0))
+
+STATES = ("NORMAL", "WARNING", "CRITICAL", "UNKNOWN")
+NAN = float("nan")
+_FLOAT_COLUMNS = ("temperature_c", "humidity_pct", "latitude", "longitude", "speed_kmh", "updated_at")
+_FLAG_COLUMNS = ("door_open", "compressor_running")
+
+
+class AssetRecord:
+    """String fields of one asset; replaced, never mutated, once published"""
+    __slots__ = ("asset_id", "reasons", "mqtt_topic", "last_telemetry_at")
+
+    def __init__(self, asset_id: str, reasons: tuple, mqtt_topic: Optional[str], last_telemetry_at: Optional[str]):
+        self.asset_id = asset_id
+        self.reasons = reasons
+        self.mqtt_topic = mqtt_topic
+        self.last_telemetry_at = last_telemetry_at
+
+
+def _flag(value) -> int:
+    return -1 if value is None else int(bool(value))
+
+
+def _float(value) -> float:
+    return NAN if value is None else float(value)
+
+
+def _epoch(value) -> float:
+    if not value:
+        return NAN
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return NAN
+
+
+class Snapshot:
+    """Immutable view of the store at one publish"""
+    __slots__ = ("index", "records", "columns", "state", "asset_type", "types", "state_counts", "type_counts")
+
+    def __init__(self, index, records, columns, state, asset_type, types, state_counts, type_counts):
+        self.index = index
+        self.records = records
+        self.columns = columns
+        self.state = state
+        self.asset_type = asset_type
+        self.types = types
+        self.state_counts = state_counts
+        self.type_counts = type_counts
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, asset_id: str) -> Optional[dict]:
+        row = self.index.get(asset_id)
+        return None if row is None else self._doc(row)
+
+    def assets(self, state: Optional[str] = None, asset_type: Optional[str] = None) -> List[dict]:
+        """All assets, optionally filtered on state and type codes before any dict is built."""
+        rows = range(len(self.records))
+        if state is not None:
+            if state not in STATES:
+                return []
+            code = STATES.index(state)
+            rows = [r for r in rows if self.state[r] == code]
+        if asset_type is not None:
+            if asset_type not in self.types:
+                return []
+            code = self.types.index(asset_type)
+            rows = [r for r in rows if self.asset_type[r] == code]
+        return [self._doc(r) for r in rows]
+
+    def _doc(self, row: int) -> dict:
+        """The state document as stored in Redis, plus asset_id"""
+        record, c = self.records[row], self.columns
+        doc = {
+            "asset_id": record.asset_id,
+            "asset_type": self.types[self.asset_type[row]],
+            "state": STATES[self.state[row]],
+            "reasons": list(record.reasons),
+            "temperature_c": _value(c["temperature_c"][row]),
+            "humidity_pct": _value(c["humidity_pct"][row]),
+            "door_open": _bool(c["door_open"][row]),
+            "compressor_running": _bool(c["compressor_running"][row]),
+            "mqtt_topic": record.mqtt_topic,
+            "last_telemetry_at": record.last_telemetry_at,
+        }
+        latitude = c["latitude"][row]
+        if not math.isnan(latitude):
+            doc["location"] = {
+                "latitude": latitude,
+                "longitude": _value(c["longitude"][row]),
+                "speed_kmh": _value(c["speed_kmh"][row]),
+            }
+        updated = c["updated_at"][row]
+        if not math.isnan(updated):
+            doc["updated_at"] = datetime.fromtimestamp(updated, timezone.utc).isoformat()
+        return doc
+
+
+def _value(x: float) -> Optional[float]:
+    return None if math.isnan(x) else x
+
+
+def _bool(x: int) -> Optional[bool]:
+    return None if x < 0 else bool(x)
+
+
+class TwinStore:
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._records: List[AssetRecord] = []
+        self._columns = {name: array("d") for name in _FLOAT_COLUMNS}
+        self._columns.update({name: array("b") for name in _FLAG_COLUMNS})
+        self._state = array("B")
+        self._asset_type = array("B")
+        self._types: List[Optional[str]] = [None]
+        self._state_counts = {name: 0 for name in STATES}
+        self._type_counts: Dict[Optional[str], int] = {}
+        self._index_changed = True
+        self._dirty = False
+        self._published_at = 0.0
+        self.ready = False
+        self.snapshot = self._copy()
+
+    def update(self, asset_id: str, doc: dict) -> bool:
+        """Apply a state document; False if it is older than the stored reading."""
+        row = self._index.get(asset_id)
+        incoming = doc.get("last_telemetry_at")
+        if row is not None:
+            stored = self._records[row].last_telemetry_at
+            if stored and incoming and incoming < stored:
+                return False
+        else:
+            row = self._add(asset_id)
+
+        state = doc.get("state")
+        state_code = STATES.index(state) if state in STATES else STATES.index("UNKNOWN")
+        type_code = self._type_code(doc.get("asset_type"))
+        self._state_counts[STATES[self._state[row]]] -= 1
+        self._state_counts[STATES[state_code]] += 1
+        self._type_counts[self._types[self._asset_type[row]]] -= 1
+        self._type_counts[self._types[type_code]] = self._type_counts.get(self._types[type_code], 0) + 1
+        self._state[row] = state_code
+        self._asset_type[row] = type_code
+
+        location = doc.get("location") or {}
+        c = self._columns
+        c["temperature_c"][row] = _float(doc.get("temperature_c"))
+        c["humidity_pct"][row] = _float(doc.get("humidity_pct"))
+        c["latitude"][row] = _float(location.get("latitude"))
+        c["longitude"][row] = _float(location.get("longitude"))
+        c["speed_kmh"][row] = _float(location.get("speed_kmh"))
+        c["updated_at"][row] = _epoch(doc.get("updated_at")) if doc.get("updated_at") else time.time()
+        c["door_open"][row] = _flag(doc.get("door_open"))
+        c["compressor_running"][row] = _flag(doc.get("compressor_running"))
+        self._records[row] = AssetRecord(asset_id, tuple(doc.get("reasons") or ()),
+                                         doc.get("mqtt_topic"), incoming)
+        self._dirty = True
+        return True
+
+    def publish(self, force: bool = False):
+        """Make updates visible to readers, at most every TWIN_PUBLISH_INTERVAL seconds."""
+        now = time.monotonic()
+        if not self._dirty or (not force and now - self._published_at < TWIN_PUBLISH_INTERVAL):
+            return
+        self.snapshot = self._copy()
+        self._dirty = False
+        self._published_at = now
+
+    def _add(self, asset_id: str) -> int:
+        row = len(self._records)
+        self._index[asset_id] = row
+        self._records.append(None)
+        for name, column in self._columns.items():
+            column.append(-1 if column.typecode == "b" else NAN)
+        self._state.append(STATES.index("UNKNOWN"))
+        self._asset_type.append(0)
+        self._state_counts["UNKNOWN"] += 1
+        self._type_counts[None] = self._type_counts.get(None, 0) + 1
+        self._index_changed = True
+        return row
+
+    def _type_code(self, asset_type: Optional[str]) -> int:
+        try:
+            return self._types.index(asset_type)
+        except ValueError:
+            if len(self._types) == 255:
+                return 0
+            self._types.append(asset_type)
+            return len(self._types) - 1
+
+    def _copy(self) -> Snapshot:
+        # The index only grows; readers keep the old dict until an asset is added
+        if self._index_changed:
+            self._published_index = dict(self._index)
+            self._index_changed = False
+        return Snapshot(
+            self._published_index,
+            list(self._records),
+            {name: column[:] for name, column in self._columns.items()},
+            self._state[:],
+            self._asset_type[:],
+            tuple(self._types),
+            {k: v for k, v in self._state_counts.items() if k != "UNKNOWN" or v},
+            {k: v for k, v in self._type_counts.items() if k is not None and v},
+        )
@@ -0,0 +1,48 @@
+# =============================================================================
+# Cold Chain Digital Twin - Telemetry Cold Archive (S3)
+# Parquet files written by the ingestion archiver CronJob and read by the
+# state engine for history older than the MongoDB hot horizon.
+# =============================================================================
+
+resource "aws_s3_bucket" "telemetry_archive" {
+  bucket = "${var.project_name}-telemetry-archive-${data.aws_caller_identity.current.account_id}"
+  tags   = var.common_tags
+}
+
+resource "aws_s3_bucket_public_access_block" "telemetry_archive" {
+  bucket                  = aws_s3_bucket.telemetry_archive.id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_iam_policy" "telemetry_archive" {
+  name        = "coldchain-telemetry-archive"
+  description = "Allow the archiver and state engine to read and write the telemetry archive"
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["s3:ListBucket"]
+        Resource = aws_s3_bucket.telemetry_archive.arn
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["s3:GetObject", "s3:PutObject", "s3:DeleteObject"]
+        Resource = "${aws_s3_bucket.telemetry_archive.arn}/*"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "telemetry_archive_attach" {
+  role       = aws_iam_role.eks_nodes.name
+  policy_arn = aws_iam_policy.telemetry_archive.arn
+}
+
+output "telemetry_archive_uri" {
+  value       = "s3://${aws_s3_bucket.telemetry_archive.bucket}"
+  description = "Set as ARCHIVE_URI for the ingestion archiver and the state engine"
+}
@@ -42,14 +42,13 @@ sleep 10
 
 mongosh $MONGO_DB_NAME << MONGOSCRIPT
 db.telemetry.createIndex({ "created_at": 1 }, { expireAfterSeconds: 604800 })
-db.telemetry.createIndex({ "sensor_id": 1, "timestamp": -1 })
-db.telemetry.createIndex({ "truck_id": 1, "timestamp": -1 })
+db.telemetry.createIndex({ "asset_id": 1, "created_at": -1 })
 db.telemetry.createIndex({ "asset_type": 1 })
 db.assets.createIndex({ "type": 1 })
 db.assets.createIndex({ "last_updated": 1 })
-db.alerts.createIndex({ "asset_id": 1, "detected_at": -1 })
+db.alerts.createIndex({ "asset_id": 1, "created_at": -1 })
 db.alerts.createIndex({ "acknowledged": 1 })
-db.alerts.createIndex({ "created_at": 1 })
+db.alerts.createIndex({ "created_at": 1 }, { expireAfterSeconds: 2592000 })
 print("Indexes created!")
 MONGOSCRIPT
 